@@ -3,13 +3,20 @@ import tkinter as tk
 from tkinter import messagebox
 import sys
 import time
-import cv2
-import glob
 import threading
 from PIL import Image, ImageTk
 import subprocess
 import os
 import platform
+import multiprocessing
+
+import camera_io
+import capture_storage
+import thumbnails
+from camera_profiles import DEFAULT_PROFILE_NAME
+from capture_engine import CaptureEngine
+from preview_display import PreviewDisplay
+from preview_overlays import OverlayAnalyzer
 
 # Set appearance
 ctk.set_appearance_mode("dark")
@@ -17,22 +24,24 @@ ctk.set_default_color_theme("blue")
 
 
 class CameraZoomController:
-    def __init__(self, root, cam_index=None, auto_start=True):
+    def __init__(self, root, cam_index=None, auto_start=True, process_engine=None, engine=None):
         self.root = root
+        # Camera, view state and the capture pipeline live in the Tk-free engine
+        self.engine = engine if engine is not None else CaptureEngine(process_engine=process_engine)
+        self.engine.add_preview_callback(self.show_preview_frame)
+        self.engine.add_status_callback(self.show_engine_status)
+        self.settings = self.engine.settings
+        self.capture_root = self.engine.capture_root
         self.root.title("Logitech Brio Camera Zoom Control")
         
         # Set default geometry - will update after window is realized
         self.root.geometry("960x1050+0+0")
         self.root.resizable(False, False)
         
-        self.camera = None
-        self.cap = None
-        self.digital_zoom_level = 1.0
-        self.focus_level = 0
-        self.is_running = False
-        self.camera_thread = None
         self.init_thread = None
         self.is_loading = False
+        # Captures run off the Tk thread, one at a time
+        self.capture_thread = None
         # Use provided camera index if given (mirrors logi_try launch behavior)
         if cam_index is not None:
             try:
@@ -42,33 +51,33 @@ class CameraZoomController:
         else:
             self.selected_camera_index = 0
         self.available_cameras = {}
-        self.camera_width = 0
-        self.camera_height = 0
-        # Preview defaults for fast startup (may be changed when camera opens)
-        self.preview_width = 960
-        self.preview_height = 540
-        # Lock to protect camera operations when switching resolutions for capture
-        self.cap_lock = threading.Lock()
-
-        # Focus control properties (use cv2 constants if available, else fall back to common values)
-        self.focus_prop = getattr(cv2, 'CAP_PROP_FOCUS', 28)
-        self.autofocus_prop = getattr(cv2, 'CAP_PROP_AUTOFOCUS', 39)
+        self.camera_property_ranges = self.settings.get("camera_properties", {})
+        # Preview-only histogram / focus peaking / sharpness (never in saved captures)
+        self.overlays = OverlayAnalyzer(**self.settings.get("overlays", {}))
+        self.overlays.start()
+        self._overlay_seq_shown = 0
+        # Latest preview frame waiting for the Tk thread (one slot: older frames are dropped)
+        self._preview_lock = threading.Lock()
+        self._pending_preview = None
+        self._preview_scheduled = False
+        # Recent-captures gallery (thumbnails come from the engine's cache)
+        self.gallery_recent_count = self.settings.get("gallery", {}).get("recent_count", 4)
+        self._gallery_photos = {}
 
         self.sn_history = []
         self.sn_history_index = -1
         # Orientation appended to filename: either 'TOP' or 'BOTTOM'
-        self.orientation = "TOP"
-        self.frame_skip_counter = 0
+        self.orientation = self.engine.orientation
         self.capture_flicker_counter = 0  # For white flicker on capture
         self.show_white_flicker = False  # Flag to show white flicker
-        self.pan_x = 0  # Pan offset X (0 = center)
-        self.pan_y = 0  # Pan offset Y (0 = center)
         
         # Create UI
         self.create_ui()
         
         # Bind window realization to set proper geometry
         self.root.after(100, self.setup_window_geometry)
+        # Pick the preview display backend once the window is on screen
+        self.root.after(300, self.preview_display.auto_select)
         
         # Bind keyboard arrows for panning
         self.root.bind("<Up>", self.pan_up_key)
@@ -185,6 +194,51 @@ class CameraZoomController:
         )
         refresh_btn.pack(side="right", padx=5)
         
+        # Settings profile frame
+        profile_frame = ctk.CTkFrame(main_frame, fg_color="#1a1a1a", corner_radius=10)
+        profile_frame.pack(fill="x", pady=(0, 15))
+
+        profile_label = ctk.CTkLabel(
+            profile_frame,
+            text="Profile:",
+            font=ctk.CTkFont(size=12),
+            text_color="#888888"
+        )
+        profile_label.pack(side="left", padx=15, pady=10)
+
+        self.profile_combo = ctk.CTkComboBox(
+            profile_frame,
+            values=[DEFAULT_PROFILE_NAME],
+            command=self.on_profile_selected,
+            font=ctk.CTkFont(size=11),
+            dropdown_font=ctk.CTkFont(size=10)
+        )
+        self.profile_combo.pack(side="left", padx=5, fill="x", expand=True)
+        self.profile_combo.set(DEFAULT_PROFILE_NAME)
+
+        save_profile_btn = ctk.CTkButton(
+            profile_frame,
+            text="💾 Save Profile",
+            width=110,
+            command=self.save_profile,
+            fg_color="#00B4FF",
+            hover_color="#0090CC",
+            font=ctk.CTkFont(size=11, weight="bold")
+        )
+        save_profile_btn.pack(side="right", padx=5)
+
+        # Checkerboard stills for lens calibration (calibrates once enough are collected)
+        self.lens_btn = ctk.CTkButton(
+            profile_frame,
+            text="📐 Lens",
+            width=80,
+            command=self.add_lens_calibration_frame,
+            fg_color="#333333",
+            hover_color="#444444",
+            font=ctk.CTkFont(size=11, weight="bold")
+        )
+        self.lens_btn.pack(side="right", padx=5)
+
         # Serial Number input frame
         sn_frame = ctk.CTkFrame(main_frame, fg_color="#1a1a1a", corner_radius=10)
         sn_frame.pack(fill="x", pady=(0, 15))
@@ -257,7 +311,13 @@ class CameraZoomController:
             text_color="#888888",
             corner_radius=10
         )
-        self.preview_label.pack(fill="both", expand=True, padx=5, pady=5)
+        preview_pack = {"fill": "both", "expand": True, "padx": 5, "pady": 5}
+        self.preview_label.pack(**preview_pack)
+        # Label / Canvas+PhotoImage / raw PPM display paths (see preview_display.py)
+        self.preview_display = PreviewDisplay(self.root, self.preview_label, self.settings.get("preview_display"),
+                                              pack_options=preview_pack)
+        self.engine.metrics.gauge("brio_preview_draw_seconds", "Time to put one preview frame on screen",
+                                  fn=lambda: self.preview_display.draw_ms / 1000.0)
         
         # Control panel
         control_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
@@ -341,6 +401,74 @@ class CameraZoomController:
         )
         self.focus_slider.pack(side="left", fill="x", expand=True)
         self.focus_slider.set(0)
+
+        # Exposure / gain / white balance sliders (only written once moved)
+        props_frame = ctk.CTkFrame(control_frame, fg_color="transparent")
+        props_frame.pack(fill="x", pady=(0, 10))
+
+        self.property_sliders = {}
+        for name, label in (("exposure", "Exposure:"), ("gain", "Gain:"), ("white_balance", "WB:")):
+            low, high = self.camera_property_ranges.get(name, (0, 255))
+            ctk.CTkLabel(
+                props_frame,
+                text=label,
+                font=ctk.CTkFont(size=12),
+                text_color="#888888"
+            ).pack(side="left", padx=(0, 5))
+            slider = ctk.CTkSlider(
+                props_frame,
+                from_=low,
+                to=high,
+                width=140,
+                command=lambda value, n=name: self.set_camera_property(n, float(value)),
+                progress_color="#888888",
+                button_color="#AAAAAA",
+                button_hover_color="#CCCCCC"
+            )
+            slider.pack(side="left", padx=(0, 15), fill="x", expand=True)
+            slider.set((low + high) / 2)
+            self.property_sliders[name] = slider
+
+        # Preview overlays: histogram, focus peaking and a sharpness readout (plus the multi-frame switch)
+        overlay_frame = ctk.CTkFrame(control_frame, fg_color="transparent")
+        overlay_frame.pack(fill="x", pady=(0, 10))
+
+        self.histogram_check = ctk.CTkCheckBox(
+            overlay_frame,
+            text="Histogram",
+            command=self.toggle_overlays,
+            font=ctk.CTkFont(size=11)
+        )
+        self.histogram_check.pack(side="left", padx=(0, 15))
+
+        self.peaking_check = ctk.CTkCheckBox(
+            overlay_frame,
+            text="Focus Peaking",
+            command=self.toggle_overlays,
+            font=ctk.CTkFont(size=11)
+        )
+        self.peaking_check.pack(side="left", padx=(0, 15))
+
+        # Multi-frame capture: average several frames into one low-noise still
+        self.denoise_check = ctk.CTkCheckBox(
+            overlay_frame,
+            text=f"Multi-frame ×{self.engine.denoise.frames}",
+            command=self.toggle_denoise,
+            font=ctk.CTkFont(size=11)
+        )
+        self.denoise_check.pack(side="left", padx=(0, 15))
+        if self.engine.denoise.config["enabled"]:
+            self.denoise_check.select()
+        if self.engine.use_process_engine:
+            self.denoise_check.configure(state="disabled")
+
+        self.sharpness_display = ctk.CTkLabel(
+            overlay_frame,
+            text="Sharpness: —",
+            font=ctk.CTkFont(size=12),
+            text_color="#888888"
+        )
+        self.sharpness_display.pack(side="right", padx=15)
         
         # Button frame
         button_frame = ctk.CTkFrame(control_frame, fg_color="transparent")
@@ -425,6 +553,43 @@ class CameraZoomController:
         )
         open_folder_btn.pack(side="left", padx=5)
         
+        # Recent captures: TOP / BOTTOM of the current SN, then the last captures
+        gallery_frame = ctk.CTkFrame(control_frame, fg_color="#1a1a1a", corner_radius=10)
+        gallery_frame.pack(fill="x")
+
+        self.gallery_sn_slots = {}
+        for ori in capture_storage.ORIENTATIONS:
+            slot = ctk.CTkLabel(
+                gallery_frame,
+                text=ori,
+                width=thumbnails.THUMBNAIL_SIZE[0],
+                height=thumbnails.THUMBNAIL_SIZE[1],
+                font=ctk.CTkFont(size=10),
+                fg_color="#262626",
+                text_color="#888888",
+                compound="top"
+            )
+            slot.pack(side="left", padx=(10, 0), pady=8)
+            slot.bind("<Button-1>", lambda e, s=slot: self.open_gallery_entry(s))
+            self.gallery_sn_slots[ori] = slot
+
+        self.gallery_recent_slots = []
+        for _ in range(self.gallery_recent_count):
+            slot = ctk.CTkLabel(
+                gallery_frame,
+                text="",
+                width=thumbnails.THUMBNAIL_SIZE[0],
+                height=thumbnails.THUMBNAIL_SIZE[1],
+                font=ctk.CTkFont(size=10),
+                fg_color="#262626",
+                text_color="#666666",
+                compound="top"
+            )
+            slot.pack(side="right", padx=(0, 10), pady=8)
+            slot.bind("<Button-1>", lambda e, s=slot: self.open_gallery_entry(s))
+            self.gallery_recent_slots.append(slot)
+        self.refresh_gallery()
+
         # Status frame
         status_frame = ctk.CTkFrame(control_frame, fg_color="#1a1a1a", corner_radius=10)
         status_frame.pack(fill="x", pady=15)
@@ -453,6 +618,7 @@ class CameraZoomController:
             if not self.sn_history or self.sn_history[-1] != sn_value:
                 self.sn_history.append(sn_value)
             self.sn_history_index = -1  # Reset index after entering new SN
+            self.refresh_gallery()
     
     def on_sn_up_arrow(self, event):
         """Browse up through SN history"""
@@ -489,6 +655,7 @@ class CameraZoomController:
             return
 
         self.orientation = value
+        self.engine.orientation = value
 
         # Update visual state of buttons
         if self.orientation == "TOP":
@@ -504,45 +671,100 @@ class CameraZoomController:
         except Exception:
             pass
     
+    def sync_view_controls(self):
+        """Update sliders, orientation and profile box from the engine state (UI thread)"""
+        engine = self.engine
+        self.zoom_slider.set(engine.zoom)
+        self.zoom_display.configure(text=f"Zoom: {engine.zoom:.1f}x")
+        self.focus_slider.set(engine.focus_level)
+        self.set_orientation(engine.orientation)
+        self.profile_combo.configure(values=engine.profile_names())
+        self.profile_combo.set(engine.profile_name)
+
+    def on_profile_selected(self, choice):
+        """Switch to another saved profile without restarting the stream"""
+        if not self.engine.device_id:
+            self.status_display.configure(text="Camera not connected", text_color="#FF0000")
+            return
+        self.engine.select_profile(choice)
+        self.resolution_display.configure(text=f"Resolution: {self.engine.camera_width}×{self.engine.camera_height}")
+        self.sync_view_controls()
+        self.status_display.configure(text=f"Profile: {choice}", text_color="#00B4FF")
+
+    def save_profile(self):
+        """Save the current settings under the name typed in the profile box"""
+        if not self.engine.device_id:
+            self.status_display.configure(text="Camera not connected", text_color="#FF0000")
+            return
+        name = self.profile_combo.get().strip() or DEFAULT_PROFILE_NAME
+        self.engine.save_profile(name)
+        self.profile_combo.configure(values=self.engine.profile_names())
+        self.profile_combo.set(name)
+        self.status_display.configure(text=f"Profile saved: {name}", text_color="#00FF00")
+
+    def add_lens_calibration_frame(self):
+        """Take a checkerboard still for lens calibration; calibrate once enough are collected"""
+        if not self.camera_ready():
+            self.status_display.configure(text="Camera not connected", text_color="#FF0000")
+            return
+        if not self.engine.full_sensor_view():
+            self.status_display.configure(text="Lens calibration needs hardware zoom at 1.0x", text_color="#FFA500")
+            return
+        found, count = self.engine.add_calibration_frame()
+        needed = self.engine.lens_config["min_images"]
+        if not found:
+            self.status_display.configure(text=f"No checkerboard found ({count}/{needed} stills)",
+                                          text_color="#FFA500")
+            return
+        if count < needed:
+            self.status_display.configure(text=f"Checkerboard {count}/{needed} - move the board and repeat",
+                                          text_color="#00B4FF")
+            return
+
+        self.lens_btn.configure(state="disabled")
+        self.status_display.configure(text=f"Calibrating lens from {count} stills...", text_color="#00B4FF")
+
+        def calibrate():
+            try:
+                calibration = self.engine.calibrate_lens()
+                applied = "" if self.engine.lens is not None else " (disabled in settings)"
+                text, color = f"Lens calibrated ✓ RMS {calibration.rms:.2f} px{applied}", "#00FF00"
+            except Exception as e:
+                print(f"Lens calibration failed: {e}")
+                text, color = f"Lens calibration failed: {str(e)[:40]}", "#FF0000"
+
+            def update_ui():
+                self.lens_btn.configure(state="normal")
+                self.status_display.configure(text=text, text_color=color)
+            self.root.after(0, update_ui)
+
+        threading.Thread(target=calibrate, daemon=True).start()
+
     def detect_cameras(self):
         """Detect all available cameras and identify Brio (runs in background thread)"""
+        # Cameras the engine holds open (active / standby) are kept, not probed again
+        held = self.engine.held_cameras()
+        previous = {index: name for name, index in self.available_cameras.items()}
         self.available_cameras = {}
         detected = []
-        import time
+        for index in sorted(held):
+            name = previous.get(index, f"Camera {index}")
+            self.available_cameras[name] = index
+            detected.append(name)
 
         # Scan for cameras (optimized range with timeout per camera)
-        for index in range(3):  # Reduced range to 0-2 for faster detection
-            try:
-                # Set a timeout for opening each camera
-                start_time = time.time()
-                cap = cv2.VideoCapture(index)
-                
-                # Give it max 1 second to open
-                open_timeout = 1.0
-                while not cap.isOpened() and (time.time() - start_time) < open_timeout:
-                    import time as t
-                    t.sleep(0.05)
-
-                if cap.isOpened():
-                    # Get camera resolution only (fastest properties)
-                    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-                    # Try to identify camera name
-                    camera_name = f"Camera {index}"
-
-                    # Check if it's a Brio (typically higher resolution like 4K capable)
-                    if width >= 1920 and height >= 1080:
-                        camera_name = f"🎥 Brio (Index {index})"
-                        self.selected_camera_index = index  # Auto-select Brio if found
-
-                    self.available_cameras[camera_name] = index
-                    detected.append(camera_name)
-                    print(f"Found: {camera_name}")
-                
-                cap.release()
-            except Exception as e:
-                print(f"Error detecting camera at index {index}: {e}")
+        for index, width, height in camera_io.detect_cameras(3, skip=held):
+            camera_name = f"Camera {index}"
+            # Check if it's a Brio (typically higher resolution like 4K capable)
+            if width >= 1920 and height >= 1080:
+                camera_name = f"🎥 Brio (Index {index})"
+                self.selected_camera_index = index  # Auto-select Brio if found
+            self.available_cameras[camera_name] = index
+            detected.append(camera_name)
+            print(f"Found: {camera_name}")
+
+        # Keep the other cameras opened in standby for fast switching (if enabled)
+        self.engine.configure_standby(sorted(self.available_cameras.values()))
 
         # Update UI on main thread
         def update_ui():
@@ -581,211 +803,150 @@ class CameraZoomController:
     def initialize_camera(self):
         """Initialize the camera in background thread"""
         # Avoid starting multiple initialization attempts
-        if self.is_running or (self.cap and getattr(self.cap, "isOpened", lambda: False)()) or (self.init_thread and self.init_thread.is_alive()):
+        if self.engine.is_running or self.camera_ready() or (self.init_thread and self.init_thread.is_alive()):
             print("Initialize skipped: already initializing or running")
             return
         self.is_loading = True
         self.init_thread = threading.Thread(target=self._initialize_camera_background, daemon=True)
         self.init_thread.start()
     
+    def camera_ready(self):
+        """True when the engine has a usable camera"""
+        return self.engine.is_open()
+
     def _initialize_camera_background(self):
-        """Initialize the camera (runs in background)"""
+        """Open the selected camera in the engine and start the preview (runs in background)"""
         try:
-            # Use DirectShow on Windows for faster startup
-            if platform.system() == "Windows":
-                self.cap = cv2.VideoCapture(self.selected_camera_index, cv2.CAP_DSHOW)
-            else:
-                self.cap = cv2.VideoCapture(self.selected_camera_index)
-            
-            # Fast timeout for camera to be ready
-            timeout = 0
-            while not self.cap.isOpened() and timeout < 10:
-                timeout += 1
-                threading.Event().wait(0.1)
-            
-            if self.cap.isOpened():
-                # Set camera buffer size to 1 (grab latest frame immediately)
-                self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                
-                # Use lower preview resolution for fast startup
-                self.preview_width = 1920
-                self.preview_height = 1080
-                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.preview_width)
-                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.preview_height)
-                
-                # Try to grab an immediate frame to show quick preview
-                try:
-                    with self.cap_lock:
-                        ret, frame = self.cap.read()
-                    if ret:
-                        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        frame_rgb = cv2.resize(frame_rgb, (960, 540))
-                        image = Image.fromarray(frame_rgb)
-                        photo = ImageTk.PhotoImage(image)
-                        # Update preview_label on main thread
-                        self.root.after(0, lambda p=photo: (self.preview_label.configure(image=p, text=""), setattr(self.preview_label, "image", p)))
-                except Exception:
-                    pass
-
-                # Determine actual preview resolution
-                self.camera_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                self.camera_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-                print(f"Camera opened (preview): {self.camera_width}×{self.camera_height}")
-                
-                # Update resolution display
-                self.resolution_display.configure(
-                    text=f"Resolution: {self.camera_width}×{self.camera_height}",
-                    text_color="#00B4FF"
-                )
-                
-                # Minimal warm-up: discard only 3 frames quickly for faster startup
-                print("Warming up camera...")
-                frame_count = 0
-                for i in range(3):
-                    with self.cap_lock:
-                        ret, frame = self.cap.read()
-                    if ret:
-                        frame_count += 1
-                
-                print(f"Warm-up complete: read {frame_count}/3 frames")
-
-                # Reapply any user focus setting after resolution negotiation
-                try:
-                    self.reapply_focus()
-                except Exception:
-                    pass
-                
-                self.status_display.configure(text="Camera Connected ✓", text_color="#00FF00")
-                self.is_running = True
-                self.camera_thread = threading.Thread(target=self.update_preview, daemon=True)
-                self.camera_thread.start()
-            else:
-                self.status_display.configure(text="Camera Not Found", text_color="#FF0000")
+            # engine.open() stops and releases any previously opened camera first
+            if not self.engine.open(self.selected_camera_index):
+                self.status_display.configure(text=self.engine.error or "Camera Not Found", text_color="#FF0000")
+                return
+            self.resolution_display.configure(
+                text=f"Resolution: {self.engine.camera_width}×{self.engine.camera_height}",
+                text_color="#00B4FF"
+            )
+            # Restore the profile's view (zoom, pan, orientation, focus) in the controls
+            self.root.after(0, self.sync_view_controls)
+            how = "switched from standby" if self.engine.last_open_warm else "opened"
+            self.status_display.configure(text=f"Camera Connected ✓ ({how} in {self.engine.last_open_ms:.0f} ms)",
+                                          text_color="#00FF00")
+            self.engine.start_stream()
         except Exception as e:
             self.status_display.configure(text=f"Error: {str(e)}", text_color="#FF0000")
-        
         finally:
             self.is_loading = False
             self.loading_label.configure(text="")
+            try:
+                self.camera_combo.configure(state="readonly")
+            except Exception:
+                pass
             self.hide_loading_overlay()  # Hide overlay when initialization completes
-    
-    def update_preview(self):
-        """Update camera preview with digital zoom"""
-        retry_count = 0
-        max_retries = 10
-        frame_display_count = 0
-        
-        while self.is_running and self.cap:
+
+    def show_engine_status(self, text, level):
+        """Show an engine status message (called from engine threads, marshalled to Tk)"""
+        colors = {"info": "#00B4FF", "ok": "#00FF00", "warn": "#FFA500", "error": "#FF0000"}
+
+        def update_ui():
             try:
-                with self.cap_lock:
-                    ret, frame = self.cap.read()
-                if not ret or frame is None:
-                    retry_count += 1
-                    if retry_count > max_retries:
-                        print(f"Preview: No valid frames received after {max_retries} retries")
-                        self.status_display.configure(text="Preview Error: No frames", text_color="#FF0000")
-                        break
-                    threading.Event().wait(0.1)
-                    continue
-                
-                retry_count = 0  # Reset retry counter on successful read
-                
-                # Check if we should show white flicker (capture feedback)
-                if self.show_white_flicker:
-                    self.capture_flicker_counter += 1
-                    if self.capture_flicker_counter < 3:  # Show white for ~3 frames
-                        # Create white frame
-                        white_frame = cv2.resize(frame, (960, 540))
-                        white_frame[:] = (255, 255, 255)  # White in BGR
-                        white_frame = cv2.cvtColor(white_frame, cv2.COLOR_BGR2RGB)
-                        
-                        image = Image.fromarray(white_frame)
-                        photo = ImageTk.PhotoImage(image)
-                        
-                        self.preview_label.configure(image=photo, text="")
-                        self.preview_label.image = photo
-                        continue
-                    else:
-                        # Flicker done, reset flag
-                        self.show_white_flicker = False
-                
-                # Skip frames for performance (only update UI every 2nd frame for faster preview)
-                self.frame_skip_counter += 1
-                if self.frame_skip_counter < 2:
-                    continue
-                self.frame_skip_counter = 0
-                frame_display_count += 1
-                
-                if frame_display_count == 1:
-                    print(f"First preview frame rendered: {frame.shape}")
-                
-                # Apply digital zoom with pan offset
-                if self.digital_zoom_level > 1.0:
-                    h, w = frame.shape[:2]
-                    crop_w = int(w / self.digital_zoom_level)
-                    crop_h = int(h / self.digital_zoom_level)
-                    
-                    # Calculate center with pan offset
-                    center_x = (w - crop_w) // 2 + self.pan_x
-                    center_y = (h - crop_h) // 2 + self.pan_y
-                    
-                    # Clamp to valid bounds
-                    center_x = max(0, min(center_x, w - crop_w))
-                    center_y = max(0, min(center_y, h - crop_h))
-                    
-                    x = center_x
-                    y = center_y
-                    frame = frame[y:y+crop_h, x:x+crop_w]
-                
-                # Resize frame for preview (optimize: use smaller preview size)
-                frame = cv2.resize(frame, (960, 540))
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-                # Convert to PhotoImage
-                image = Image.fromarray(frame)
-                photo = ImageTk.PhotoImage(image)
-                
-                # Update label
-                self.preview_label.configure(image=photo, text="")
-                self.preview_label.image = photo
-            except Exception as e:
-                print(f"Preview exception: {str(e)}")
-                self.status_display.configure(text=f"Preview Error: {str(e)[:30]}", text_color="#FF0000")
-                threading.Event().wait(0.5)
-                continue
-    
+                self.status_display.configure(text=text, text_color=colors.get(level, "#00B4FF"))
+            except Exception:
+                pass
+
+        try:
+            self.root.after(0, update_ui)
+        except Exception:
+            pass
+
+    def toggle_overlays(self):
+        """Enable or disable the preview overlays from the checkboxes"""
+        self.overlays.show_histogram = bool(self.histogram_check.get())
+        self.overlays.show_peaking = bool(self.peaking_check.get())
+        if not self.overlays.active:
+            self.sharpness_display.configure(text="Sharpness: —")
+
+    def toggle_denoise(self):
+        """Switch multi-frame (temporal denoise) capture on or off"""
+        self.engine.denoise.config["enabled"] = bool(self.denoise_check.get())
+
+    def show_preview_frame(self, frame_rgb):
+        """Display an RGB preview frame, or the white capture flicker while it is active
+
+        Runs on the engine stream thread: the frame is handed to the Tk thread.
+        """
+        sharpness = None
+        if self.overlays.active:
+            self.overlays.submit(frame_rgb)
+            frame_rgb = self.overlays.draw(frame_rgb)
+            result = self.overlays.result
+            if result is not None and result.seq != self._overlay_seq_shown:
+                self._overlay_seq_shown = result.seq
+                sharpness = result.sharpness
+
+        if self.show_white_flicker:
+            self.capture_flicker_counter += 1
+            if self.capture_flicker_counter < 3:  # Show white for ~3 frames
+                frame_rgb = frame_rgb.copy()
+                frame_rgb[:] = 255
+            else:
+                # Flicker done, reset flag
+                self.show_white_flicker = False
+
+        with self._preview_lock:
+            if sharpness is None and self._pending_preview is not None:
+                sharpness = self._pending_preview[1]  # keep a reading from a dropped frame
+            self._pending_preview = (frame_rgb, sharpness)
+            if self._preview_scheduled:
+                return
+            self._preview_scheduled = True
+        try:
+            self.root.after(0, self._draw_pending_preview)
+        except Exception:
+            # Window already destroyed
+            with self._preview_lock:
+                self._preview_scheduled = False
+
+    def _draw_pending_preview(self):
+        """Draw the latest preview frame (Tk thread)"""
+        with self._preview_lock:
+            pending = self._pending_preview
+            self._pending_preview = None
+            self._preview_scheduled = False
+        if pending is None:
+            return
+        frame_rgb, sharpness = pending
+        if sharpness is not None:
+            self.sharpness_display.configure(text=f"Sharpness: {sharpness:.0f}")
+        self.preview_display.draw(frame_rgb)
+
     def update_digital_zoom(self, value):
         """Update digital zoom level from slider"""
-        self.digital_zoom_level = float(value)
-        self.zoom_display.configure(text=f"Zoom: {self.digital_zoom_level:.1f}x")
+        self.engine.set_zoom(float(value))
+        self.zoom_display.configure(text=f"Zoom: {self.engine.zoom:.1f}x")
     
     def set_digital_zoom(self, zoom_value):
         """Set preset digital zoom level"""
-        self.digital_zoom_level = zoom_value
         self.zoom_slider.set(zoom_value)
-        self.zoom_display.configure(text=f"Zoom: {self.digital_zoom_level:.1f}x")
+        self.update_digital_zoom(zoom_value)
     
     def pan_up(self):
         """Pan preview up"""
-        self.pan_y = max(self.pan_y - 30, -500)
+        self.engine.pan_by(0, -30)
     
     def pan_down(self):
         """Pan preview down"""
-        self.pan_y = min(self.pan_y + 30, 500)
+        self.engine.pan_by(0, 30)
     
     def pan_left(self):
         """Pan preview left"""
-        self.pan_x = max(self.pan_x - 30, -500)
+        self.engine.pan_by(-30, 0)
     
     def pan_right(self):
         """Pan preview right"""
-        self.pan_x = min(self.pan_x + 30, 500)
+        self.engine.pan_by(30, 0)
     
     def reset_pan(self):
         """Reset pan to center"""
-        self.pan_x = 0
-        self.pan_y = 0
+        self.engine.set_pan(0, 0)
     
     def pan_up_key(self, event):
         """Keyboard event for pan up"""
@@ -805,268 +966,124 @@ class CameraZoomController:
     
     def update_focus(self, value):
         """Update camera focus"""
-        self.focus_level = int(float(value))
         try:
-            # Apply focus settings safely
-            self.reapply_focus()
-            self.status_display.configure(text=f"Focus: {self.focus_level}", text_color="#FFA500")
+            # Queued for the property worker; only the latest slider value is written
+            self.engine.set_focus(int(float(value)))
+            self.status_display.configure(text=f"Focus: {self.engine.focus_level}", text_color="#FFA500")
         except Exception:
             pass
 
-    def reapply_focus(self):
-        """Disable autofocus if available and set manual focus to the current level."""
-        try:
-            with self.cap_lock:
-                if not (self.cap and self.cap.isOpened()):
-                    return
-
-                # Try to disable autofocus first (if supported)
-                try:
-                    if self.autofocus_prop is not None:
-                        self.cap.set(self.autofocus_prop, 0)
-                except Exception:
-                    pass
-
-                # Try to set focus value
-                try:
-                    self.cap.set(self.focus_prop, self.focus_level)
-                except Exception:
-                    pass
-        except Exception:
-            pass
-    
-    def apply_zoom(self):
-        """Apply zoom to Logitech Brio camera"""
-        if not self.cap or not self.cap.isOpened():
-            self.status_display.configure(text="Camera not connected", text_color="#FF0000")
-            return
-        
-        try:
-            # Logitech Brio zoom control using v4l2-ctl (works on Windows with WSL or direct)
-            zoom_value = int(self.digital_zoom_level * 128)  # Scale to 0-1280 (1x=128, 10x=1280)
-            
-            if platform.system() == "Windows":
-                # Try multiple approaches for Windows
-                try:
-                    # Approach 1: Direct property set
-                    self.cap.set(28, zoom_value)  # Try setting through OpenCV
-                    self.status_display.configure(text=f"Zoom: {self.digital_zoom_level:.1f}x ✓", text_color="#00FF00")
-                    return
-                except:
-                    pass
-                
-                try:
-                    # Approach 2: Use PowerShell with WinRT or Win32 API
-                    # This is for Logitech camera control
-                    cmd = f'powershell -Command "Add-Type -AssemblyName System.Windows.Forms; [System.Windows.Forms.SendKeys]::SendWait(\\"{{+}}{{+}}{int(self.digital_zoom_level * 5)}\\")"'
-                    subprocess.run(cmd, shell=True, capture_output=True, timeout=1)
-                    self.status_display.configure(text=f"Zoom: {self.digital_zoom_level:.1f}x", text_color="#00B4FF")
-                    return
-                except:
-                    pass
-                
-            else:  # Linux/WSL
-                try:
-                    cmd = f"v4l2-ctl -d /dev/video{self.selected_camera_index} -c zoom_absolute={zoom_value}"
-                    subprocess.run(cmd, shell=True, capture_output=True, timeout=1)
-                    self.status_display.configure(text=f"Zoom: {self.digital_zoom_level:.1f}x ✓", text_color="#00FF00")
-                    return
-                except:
-                    pass
-            
-            self.status_display.configure(text=f"Zoom: {self.digital_zoom_level:.1f}x (Set)", text_color="#00B4FF")
-            
-        except Exception as e:
-            self.status_display.configure(text=f"Zoom pending...", text_color="#FFA500")
+    def set_camera_property(self, name, value):
+        """Queue an exposure / gain / white balance write in the engine"""
+        self.engine.set_property(name, value)
     
     def on_closing(self):
         """Clean up resources on close"""
-        self.is_running = False
+        # engine.shutdown() also saves the view in the active profile for the next warm start
         if self.init_thread and self.init_thread.is_alive():
             self.init_thread.join(timeout=1)
-        if self.camera_thread and self.camera_thread.is_alive():
-            self.camera_thread.join(timeout=1)
-        if self.cap:
-            self.cap.release()
+        self.overlays.stop()
+        self.engine.shutdown()
         self.root.destroy()
     
     def capture_image(self):
         """Capture and save full resolution image with zoom and focus applied"""
-        if not self.cap or not self.cap.isOpened():
+        if not self.camera_ready():
             self.status_display.configure(text="Camera not connected", text_color="#FF0000")
             return
-        
-        try:
-            # Get SN from entry field
-            sn = self.sn_entry.get().strip()
-            if not sn:
-                self.status_display.configure(text="Enter SN before capturing", text_color="#FF0000")
-                return
-            
-            # Create captures directory if it doesn't exist
-            capture_dir = ("C:/brio_captures/captures")
-            os.makedirs(capture_dir, exist_ok=True)
-
-            # Prepare SN folder
-            orientation = (getattr(self, "orientation", "TOP") or "TOP").upper()
-            safe_sn = sn.replace(" ", "_")
-            sn_dir = os.path.join(capture_dir, safe_sn)
-
-            # If SN folder exists and contains files for this orientation, ask to overwrite
-            try:
-                if os.path.exists(sn_dir):
-                    # Check for existing files for this orientation
-                    existing = glob.glob(os.path.join(sn_dir, f"{safe_sn}_{orientation}_*.png"))
-                    if existing:
-                        answer = messagebox.askyesno(
-                            title="Overwrite image?",
-                            message=(f"An existing {orientation} image for SN '{sn}' was found.\n"
-                                     "Do you want to overwrite it?")
-                        )
-                        if not answer:
-                            self.status_display.configure(text="Capture cancelled (overwrite declined)", text_color="#FFA500")
-                            return
-                        else:
-                            # Remove all existing files for this orientation
-                            for f in existing:
-                                try:
-                                    os.remove(f)
-                                except Exception:
-                                    pass
-                else:
-                    os.makedirs(sn_dir, exist_ok=True)
-            except Exception as e:
-                # If anything goes wrong during folder checks, abort
-                self.status_display.configure(text=f"Folder error: {str(e)[:30]}", text_color="#FF0000")
-                return
-
-            # Attempt to capture at full resolution (3840x2160) by temporarily switching the camera
-            full_w, full_h = 3840, 2160
-            captured = False
-            frame = None
-            try:
-                with self.cap_lock:
-                    # Save current resolution
-                    prev_w = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                    prev_h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-                    # Request full resolution for capture
-                    self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, full_w)
-                    self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, full_h)
-
-                    # Give camera a moment to re-negotiate
-                    threading.Event().wait(0.2)
-
-                    # Read a couple frames to settle
-                    for _ in range(2):
-                        ret, _ = self.cap.read()
-
-                    # Final read for capture
-                    ret, frame = self.cap.read()
-                    if ret and frame is not None:
-                        captured = True
-
-                    # Restore preview resolution
-                    self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.preview_width)
-                    self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.preview_height)
-            except Exception:
-                captured = False
-
-            if not captured:
-                # Fallback to current preview resolution for capture
-                with self.cap_lock:
-                    ret, frame = self.cap.read()
-                if not ret or frame is None:
-                    self.status_display.configure(text="Failed to capture frame", text_color="#FF0000")
-                    return
+        if self.capture_thread is not None and self.capture_thread.is_alive():
+            return  # one capture at a time (e.g. a held space bar)
 
-            # After any temporary resolution changes, make sure focus is re-applied
-            try:
-                self.reapply_focus()
-            except Exception:
-                pass
+        # Ask about overwriting here on the Tk thread; the capture itself runs on a worker
+        sn, orientation = self.sn_entry.get(), self.orientation
+        overwrite = True
+        if sn.strip() and self.engine.existing_capture(sn.strip(), orientation):
+            overwrite = messagebox.askyesno(
+                title="Overwrite image?",
+                message=(f"An existing {orientation} image for SN '{sn.strip()}' was found.\n"
+                         "Do you want to overwrite it?")
+            )
 
-            # Apply digital zoom with pan offset to full resolution frame
-            if self.digital_zoom_level > 1.0:
-                h, w = frame.shape[:2]
-                crop_w = int(w / self.digital_zoom_level)
-                crop_h = int(h / self.digital_zoom_level)
+        def capture():
+            result = self.engine.capture(sn, orientation, overwrite=overwrite)
+            self.root.after(0, lambda: self.show_capture_result(result))
 
-                # Calculate center with pan offset
-                center_x = (w - crop_w) // 2 + self.pan_x
-                center_y = (h - crop_h) // 2 + self.pan_y
+        self.status_display.configure(text="Capturing...", text_color="#00B4FF")
+        self.capture_thread = threading.Thread(target=capture, daemon=True)
+        self.capture_thread.start()
 
-                # Clamp to valid bounds
-                center_x = max(0, min(center_x, w - crop_w))
-                center_y = max(0, min(center_y, h - crop_h))
+    def show_capture_result(self, result):
+        """Report a finished capture (Tk thread)"""
+        print(f"Capture {result.level}: {result.message} "
+              + " ".join(f"{k}={v:.0f}" for k, v in result.timings.items()))
+        if result.ok:
+            # Trigger white flicker effect
+            self.show_white_flicker = True
+            self.capture_flicker_counter = 0
+            self.refresh_gallery()
+        colors = {"ok": "#00FF00", "warn": "#FFA500", "cancelled": "#FFA500"}
+        message = result.message if result.ok else result.message[:60]
+        self.status_display.configure(text=message, text_color=colors.get(result.level, "#FF0000"))
 
-                x = center_x
-                y = center_y
-                frame = frame[y:y+crop_h, x:x+crop_w]
-                # Upscale back to original resolution if zoomed
-                frame = cv2.resize(frame, (w, h))
+    def _gallery_photo(self, rel):
+        """PhotoImage for a gallery entry (thumbnail cache only, never the capture file)"""
+        photo = self._gallery_photos.get(rel)
+        if photo is None:
+            thumb = self.engine.thumbnails.get(rel)
+            if thumb is None:
+                return None
+            photo = ImageTk.PhotoImage(Image.fromarray(thumb))
+        return photo
 
-            # Create filename with SN, orientation and timestamp
-            from datetime import datetime
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{safe_sn}_{orientation}_{timestamp}.png"
-            filepath = os.path.join(sn_dir, filename)
+    def refresh_gallery(self):
+        """Show the current SN's TOP / BOTTOM thumbnails and the most recent captures"""
+        safe_sn = capture_storage.safe_sn_name(self.sn_entry.get()) if self.sn_entry.get().strip() else None
+        by_orientation = self.engine.thumbnails.for_sn(safe_sn) if safe_sn else {}
+        shown = [(self.gallery_sn_slots[ori], by_orientation.get(ori), ori)
+                 for ori in capture_storage.ORIENTATIONS]
+        recent = self.engine.thumbnails.recent(len(self.gallery_recent_slots))
+        shown += [(slot, entry, "") for slot, entry in
+                  zip(self.gallery_recent_slots, recent + [None] * len(self.gallery_recent_slots))]
 
-            # Save the image
-            cv2.imwrite(filepath, frame)
+        photos = {}
+        for slot, entry, empty_text in shown:
+            photo = self._gallery_photo(entry["rel"]) if entry else None
+            slot.capture_path = os.path.join(self.capture_root, entry["rel"]) if entry else None
+            if photo is None:
+                slot.configure(image="", text=empty_text)
+                continue
+            photos[entry["rel"]] = photo
+            slot.configure(image=photo, text=f"{entry['sn']} {entry['orientation']}"[:24])
+        # Keep references only to what is on screen
+        self._gallery_photos = photos
 
-            # Ensure SN folder contains strictly only one TOP and one BOTTOM image each
-            try:
-                for ori in ("TOP", "BOTTOM"):
-                    matches = glob.glob(os.path.join(sn_dir, f"{safe_sn}_{ori}_*.png"))
-                    if len(matches) > 1:
-                        # Keep newest, remove older
-                        newest = max(matches, key=os.path.getmtime)
-                        for m in matches:
-                            if m != newest:
-                                try:
-                                    os.remove(m)
-                                except Exception:
-                                    pass
-                # Remove any stray files that don't match the expected patterns
-                for f in os.listdir(sn_dir):
-                    full = os.path.join(sn_dir, f)
-                    if os.path.isfile(full) and not (
-                        f.startswith(f"{safe_sn}_TOP_") or f.startswith(f"{safe_sn}_BOTTOM_")):
-                        try:
-                            os.remove(full)
-                        except Exception:
-                            pass
-            except Exception:
-                pass
+    def open_gallery_entry(self, slot):
+        """Open a gallery capture in the system image viewer"""
+        path = getattr(slot, "capture_path", None)
+        if not path:
+            return
+        if not os.path.exists(path):
+            self.status_display.configure(text="Capture no longer on disk", text_color="#FFA500")
+            return
+        try:
+            self._open_path(path)
+        except Exception as e:
+            self.status_display.configure(text=f"Error: {str(e)[:30]}", text_color="#FF0000")
 
-            # Trigger white flicker effect
-            self.show_white_flicker = True
-            self.capture_flicker_counter = 0
+    def _open_path(self, path):
+        if platform.system() == "Windows":
+            os.startfile(path)
+        elif platform.system() == "Darwin":  # macOS
+            subprocess.Popen(["open", path])
+        else:  # Linux
+            subprocess.Popen(["xdg-open", path])
 
-            self.status_display.configure(
-                text=f"✓ Captured: {filename}",
-                text_color="#00FF00"
-            )
-        
-        except Exception as e:
-            self.status_display.configure(
-                text=f"Capture error: {str(e)[:30]}",
-                text_color="#FF0000"
-            )
-    
     def open_captures_folder(self):
         """Open captures folder in Explorer"""
         try:
-            capture_dir = ("C:/brio_captures/captures")
+            capture_dir = self.capture_root
             os.makedirs(capture_dir, exist_ok=True)
-            
-            if platform.system() == "Windows":
-                os.startfile(capture_dir)
-            elif platform.system() == "Darwin":  # macOS
-                subprocess.Popen(["open", capture_dir])
-            else:  # Linux
-                subprocess.Popen(["xdg-open", capture_dir])
+            self._open_path(capture_dir)
             
             self.status_display.configure(
                 text="Opening captures folder...",
@@ -1080,15 +1097,25 @@ class CameraZoomController:
 
 
 def main():
+    # Required for the engine child process in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+
+    args = sys.argv[1:]
+    # --process-engine runs camera I/O and frame processing in a child process
+    process_engine = None
+    if "--process-engine" in args:
+        args.remove("--process-engine")
+        process_engine = True
+
     cam_index = None
-    if len(sys.argv) > 1:
+    if args:
         try:
-            cam_index = int(sys.argv[1])
+            cam_index = int(args[0])
         except ValueError:
             print("Invalid camera index argument, using defaults.")
 
     root = ctk.CTk()
-    app = CameraZoomController(root, cam_index=cam_index, auto_start=True)
+    app = CameraZoomController(root, cam_index=cam_index, auto_start=True, process_engine=process_engine)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     # Bind space key globally
     root.bind("<space>", lambda e: app.capture_image())
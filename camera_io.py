@@ -0,0 +1,180 @@
+"""Tk-free helpers for opening and driving OpenCV capture devices."""
+import platform
+import threading
+import time
+
+import cv2
+
+# Resolutions requested from the Brio for live preview and for stills
+PREVIEW_RESOLUTION = (1920, 1080)
+CAPTURE_RESOLUTION = (3840, 2160)
+
+# Focus control properties (use cv2 constants if available, else fall back to common values)
+FOCUS_PROP = getattr(cv2, 'CAP_PROP_FOCUS', 28)
+AUTOFOCUS_PROP = getattr(cv2, 'CAP_PROP_AUTOFOCUS', 39)
+
+
+def open_video_capture(index, timeout=1.0):
+    """Open camera `index` and wait up to `timeout` seconds for it to be ready."""
+    # Use DirectShow on Windows for faster startup
+    if platform.system() == "Windows":
+        cap = cv2.VideoCapture(index, cv2.CAP_DSHOW)
+    else:
+        cap = cv2.VideoCapture(index)
+
+    waited = 0.0
+    while not cap.isOpened() and waited < timeout:
+        threading.Event().wait(0.1)
+        waited += 0.1
+
+    if cap.isOpened():
+        # Set camera buffer size to 1 (grab latest frame immediately)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+def detect_cameras(max_index=3, open_timeout=1.0, skip=()):
+    """Probe camera indexes 0..max_index-1; returns [(index, width, height)] of those that open.
+
+    Indexes in skip (devices this process already holds open) are not probed.
+    """
+    found = []
+    for index in range(max_index):
+        if index in skip:
+            continue
+        try:
+            start_time = time.time()
+            cap = cv2.VideoCapture(index)
+            while not cap.isOpened() and (time.time() - start_time) < open_timeout:
+                time.sleep(0.05)
+            if cap.isOpened():
+                # Frame size only (fastest property to read)
+                found.append((index, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                              int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))))
+            cap.release()
+        except Exception as e:
+            print(f"Error detecting camera at index {index}: {e}")
+    return found
+
+
+def set_resolution(cap, width, height):
+    """Request a frame size from the device."""
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+
+def configure_stream(cap, width, height, fps=None):
+    """Apply the preview stream mode (frame size and, if known, frame rate)."""
+    set_resolution(cap, width, height)
+    if fps:
+        cap.set(cv2.CAP_PROP_FPS, fps)
+
+
+def device_identity(cap, index):
+    """Stable-ish identity for a device: capture backend plus camera index."""
+    try:
+        backend = cap.getBackendName()
+    except Exception:
+        backend = "camera"
+    return f"{backend}:{index}"
+
+
+def decode_fourcc(value):
+    """Turn a CAP_PROP_FOURCC value into its 4-character code ('' if unknown)."""
+    value = int(value or 0)
+    if value <= 0:
+        return ""
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00")
+
+
+def read_stream_mode(cap):
+    """Return the negotiated stream mode as {width, height, fps, fourcc}."""
+    return {
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": float(cap.get(cv2.CAP_PROP_FPS) or 0),
+        "fourcc": decode_fourcc(cap.get(cv2.CAP_PROP_FOURCC)),
+    }
+
+
+def apply_stream_mode(cap, width, height, fps=None, fourcc=""):
+    """Request a complete stream mode in one batch (pixel format before frame size)."""
+    if fourcc and len(fourcc) == 4:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    configure_stream(cap, width, height, fps)
+
+
+def apply_manual_focus(cap, focus_level):
+    """Disable autofocus if available and set manual focus to focus_level."""
+    try:
+        cap.set(AUTOFOCUS_PROP, 0)
+    except Exception:
+        pass
+    try:
+        cap.set(FOCUS_PROP, focus_level)
+    except Exception:
+        pass
+
+
+def read_full_resolution(cap, full_w, full_h, restore_w, restore_h, settle_frames=2,
+                         accept=None, max_retries=0):
+    """Temporarily switch to full_w x full_h, read one frame and switch back.
+
+    If `accept` is given it is called with the frame; while it returns False up to
+    `max_retries` further frames are read before the resolution is restored.
+    Returns the last frame read or None. The caller is responsible for locking `cap`.
+    """
+    frame = None
+    try:
+        set_resolution(cap, full_w, full_h)
+
+        # Give camera a moment to re-negotiate
+        threading.Event().wait(0.2)
+
+        # Read a couple frames to settle
+        for _ in range(settle_frames):
+            cap.read()
+
+        # Final read for capture
+        ret, frame = cap.read()
+        if not ret:
+            frame = None
+
+        # Quality retries: try the next frames while the check fails
+        attempts = 0
+        while frame is not None and accept is not None and not accept(frame) and attempts < max_retries:
+            attempts += 1
+            ret, next_frame = cap.read()
+            if not ret or next_frame is None:
+                break
+            frame = next_frame
+    finally:
+        # Restore preview resolution
+        set_resolution(cap, restore_w, restore_h)
+    return frame
+
+
+def read_full_resolution_frames(cap, full_w, full_h, restore_w, restore_h, consume, max_frames,
+                                settle_frames=2):
+    """Temporarily switch to full_w x full_h and pass consecutive frames to consume().
+
+    Reading stops when consume(frame) returns True, a read fails or max_frames were
+    read; the resolution is restored either way. Returns the number of frames read.
+    The caller is responsible for locking `cap`.
+    """
+    count = 0
+    try:
+        set_resolution(cap, full_w, full_h)
+        threading.Event().wait(0.2)
+        for _ in range(settle_frames):
+            cap.read()
+        while count < max_frames:
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                break
+            count += 1
+            if consume(frame):
+                break
+    finally:
+        set_resolution(cap, restore_w, restore_h)
+    return count
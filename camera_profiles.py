@@ -0,0 +1,105 @@
+"""Named camera settings profiles, stored per device identity.
+
+Profiles live in C:/brio_captures/profiles.json:
+
+    {"devices": {"DSHOW:0": {"active": "PCB-A",
+                             "profiles": {"PCB-A": {...}, "default": {...}}}}}
+
+A profile holds the operator view (zoom, pan, focus, orientation) and the stream
+mode negotiated for the device (preview size, fps, pixel format, capture size),
+so a warm start can request exactly that mode in one batch instead of
+renegotiating. Profile names are usually product names.
+"""
+import copy
+import json
+import os
+import threading
+
+from settings import BASE_DIR
+
+PROFILES_PATH = os.path.join(BASE_DIR, "profiles.json")
+DEFAULT_PROFILE_NAME = "default"
+
+DEFAULT_PROFILE = {
+    "focus_level": 0,
+    "zoom": 1.0,
+    "pan_x": 0,
+    "pan_y": 0,
+    "orientation": "TOP",
+    "preview_width": 1920,
+    "preview_height": 1080,
+    "preview_fps": 0,
+    "fourcc": "",
+    "capture_width": 3840,
+    "capture_height": 2160,
+}
+
+
+class ProfileStore:
+    """Load, query and atomically save camera profiles."""
+
+    def __init__(self, path=PROFILES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {"devices": {}}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and isinstance(data.get("devices"), dict):
+                self.data = data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Profiles: could not read {self.path}: {e}")
+
+    def _device(self, device_id):
+        return self.data["devices"].setdefault(device_id, {"active": DEFAULT_PROFILE_NAME, "profiles": {}})
+
+    def names(self, device_id):
+        """Profile names saved for a device (the default profile is always listed)."""
+        with self._lock:
+            names = list(self._device(device_id)["profiles"])
+        if DEFAULT_PROFILE_NAME not in names:
+            names.insert(0, DEFAULT_PROFILE_NAME)
+        return names
+
+    def active_name(self, device_id):
+        with self._lock:
+            return self._device(device_id).get("active") or DEFAULT_PROFILE_NAME
+
+    def get(self, device_id, name=None):
+        """Return a complete profile dict (missing keys filled from DEFAULT_PROFILE)."""
+        profile = copy.deepcopy(DEFAULT_PROFILE)
+        with self._lock:
+            device = self._device(device_id)
+            name = name or device.get("active") or DEFAULT_PROFILE_NAME
+            profile.update(device["profiles"].get(name, {}))
+        return profile
+
+    def save(self, device_id, name, profile, activate=True):
+        """Store profile under name for device_id and write the file."""
+        with self._lock:
+            device = self._device(device_id)
+            device["profiles"][name] = {k: profile[k] for k in DEFAULT_PROFILE if k in profile}
+            if activate:
+                device["active"] = name
+            self._write()
+
+    def set_active(self, device_id, name):
+        with self._lock:
+            self._device(device_id)["active"] = name
+            self._write()
+
+    def _write(self):
+        """Write via a temp file so a crash never leaves a truncated profiles.json."""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Profiles: could not write {self.path}: {e}")
@@ -0,0 +1,123 @@
+"""Pre-opened standby cameras for fast switching.
+
+Opening a Brio, negotiating its stream mode and warming it up takes seconds.
+StandbyPool keeps the other configured cameras open with their stream mode
+already applied, so switching to one is just handing over the VideoCapture.
+A keepalive thread grab()s each standby device now and then (no decode) so
+stale buffers are flushed and a device that dropped off is reopened in the
+background. Every open stream uses USB bandwidth, so only list cameras on
+separate controllers or with modest preview modes.
+"""
+import threading
+import time
+
+
+class StandbyPool:
+    """Holds opened, negotiated VideoCaptures keyed by camera index."""
+
+    def __init__(self, open_device, keepalive_interval=1.0):
+        # open_device(index) -> opened and negotiated VideoCapture, or None
+        self.open_device = open_device
+        self.keepalive_interval = keepalive_interval
+        self.wanted = set()
+        # Index of the camera in use; never opened by the pool
+        self.active = None
+        self._caps = {}
+        self._opening = None
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+        with self._cond:
+            caps, self._caps = self._caps, {}
+        for cap in caps.values():
+            cap.release()
+
+    def set_wanted(self, indexes):
+        """Cameras to keep in standby; others are released on the next keepalive pass."""
+        with self._cond:
+            self.wanted = set(indexes)
+        self._wake.set()
+
+    def held(self):
+        with self._cond:
+            return set(self._caps)
+
+    def take(self, index, timeout=5.0):
+        """Make index the active camera and return its standby capture (None if not held).
+
+        If the pool is opening that camera right now, waits for it rather than
+        racing it for the device.
+        """
+        with self._cond:
+            self.active = index
+            self._cond.wait_for(lambda: self._opening != index, timeout)
+            cap = self._caps.pop(index, None)
+        if cap is not None and not cap.isOpened():
+            cap.release()
+            return None
+        return cap
+
+    def give(self, index, cap):
+        """Park the capture that was active; releases it if index isn't wanted."""
+        with self._cond:
+            if self.active == index:
+                self.active = None
+            if self._running and index in self.wanted and index not in self._caps:
+                self._caps[index] = cap
+                return True
+        cap.release()
+        return False
+
+    def _run(self):
+        while self._running:
+            with self._cond:
+                wanted = self.wanted - {self.active}
+                held = dict(self._caps)
+            for index, cap in held.items():
+                # Under the lock so take() never hands out a capture mid-grab
+                with self._cond:
+                    if self._caps.get(index) is not cap:
+                        continue
+                    if index in wanted and cap.grab():
+                        continue
+                    del self._caps[index]
+                if index in wanted:
+                    print(f"Standby camera {index} stopped responding, reopening")
+                cap.release()
+
+            for index in sorted(wanted - self.held()):
+                with self._cond:
+                    if not self._running or index == self.active:
+                        continue
+                    self._opening = index
+                start = time.perf_counter()
+                cap = None
+                try:
+                    cap = self.open_device(index)
+                finally:
+                    with self._cond:
+                        self._opening = None
+                        keep = cap is not None and index in self.wanted and self._running
+                        if keep:
+                            self._caps[index] = cap
+                        self._cond.notify_all()
+                if cap is not None and not keep:
+                    cap.release()
+                elif keep:
+                    print(f"Standby camera {index} ready in {(time.perf_counter() - start) * 1000:.0f} ms")
+            self._wake.wait(self.keepalive_interval)
+            self._wake.clear()
@@ -0,0 +1,1089 @@
+"""Headless capture engine: camera, view state and the capture / save pipeline.
+
+CaptureEngine owns everything that does not need a window: opening the camera
+(in-process, or in a child process through frame_transport), the preview read
+loop with the stream watchdog, digital and hardware zoom / pan, focus and other
+camera properties, per-device profiles, and capture(sn, orientation), which runs
+the quality gate, lens correction and placement check, saves through the SN folder rules and
+hands the file to storage accounting, the thumbnail cache and replication. The CustomTkinter app
+is a thin client of this class; headless stations and test harnesses use it
+directly:
+
+    engine = CaptureEngine()
+    if engine.open(0):
+        engine.start_stream()
+        result = engine.capture("SN123", "TOP")
+        print(result.ok, result.path, result.timings)
+        engine.shutdown()
+
+Callbacks run on engine threads; a GUI has to marshal them to its own thread.
+Status callbacks get (text, level) with level 'info', 'ok', 'warn' or 'error'.
+"""
+import math
+import os
+import platform
+import threading
+import time
+from datetime import datetime
+
+import cv2
+
+import camera_io
+import capture_metadata
+import capture_storage
+import imaging
+import lens_correction
+import ptz_control
+import thumbnails
+from camera_profiles import DEFAULT_PROFILE_NAME, ProfileStore
+from camera_standby import StandbyPool
+from capture_quality import CaptureQualityGate, QualityReport
+from frame_transport import ProcessCaptureEngine
+from lens_correction import DEFAULT_LENS_CONFIG, Calibration, LensCorrector
+from placement_check import PlacementChecker
+from property_control import PropertyController
+from replication import ReplicationWorker
+from temporal_denoise import FrameStack
+from station_metrics import MetricsExporter, MetricsRegistry
+from settings import (LENS_CALIBRATION_FRAMES_DIR, LENS_CALIBRATION_PATH, PLACEMENT_REFERENCE_DIR, REPLICATION_OUTBOX_PATH, STORAGE_LEDGER_PATH,
+                      THUMBNAIL_CACHE_DIR, load_settings)
+from storage_manager import StorageManager
+from stream_watchdog import StreamWatchdog, reconnect_with_backoff
+
+MAX_ZOOM = 5.0
+MAX_PAN = 500
+
+
+class CaptureResult:
+    """Outcome of CaptureEngine.capture().
+
+    level is 'ok', 'warn' (saved, but QC or disk space flagged), 'error' or
+    'cancelled'; timings holds milliseconds per stage.
+    """
+
+    def __init__(self, sn, orientation):
+        self.sn = sn
+        self.orientation = orientation
+        self.ok = False
+        self.level = "error"
+        self.message = ""
+        self.path = None
+        self.filename = None
+        self.report = None
+        # PlacementReport when a reference image exists for the product
+        self.placement = None
+        # DenoiseReport for multi-frame captures
+        self.denoise = None
+        self.bytes_written = 0
+        self.removed = []
+        self.timings = {}
+        # The saved image (BGR), e.g. for thumbnails; not kept by the engine
+        self.frame = None
+
+    def __repr__(self):
+        return f"CaptureResult({self.level}, {self.path or self.message})"
+
+
+class CaptureEngine:
+    """Tk-free camera control and capture pipeline."""
+
+    def __init__(self, settings=None, process_engine=None, open_capture=None):
+        self.settings = settings if settings is not None else load_settings()
+        # open_capture(index) -> VideoCapture-like source; injectable so a fake
+        # source can drive the watchdog and reconnect path without a camera
+        self.open_capture = open_capture or camera_io.open_video_capture
+        self.capture_root = self.settings["capture_root"]
+        # Optional child-process capture engine (frames arrive via shared memory)
+        if process_engine is None:
+            process_engine = bool(self.settings.get("process_engine"))
+        self.use_process_engine = process_engine
+        self.engine_process = None
+
+        self.camera_index = 0
+        self.cap = None
+        # Lock to protect camera operations when switching resolutions for capture
+        self.cap_lock = threading.Lock()
+        self.error = None
+        # Milliseconds the last open() took and whether it came from standby
+        self.last_open_ms = 0.0
+        self.last_open_warm = False
+        self.camera_width = 0
+        self.camera_height = 0
+        # Preview defaults for fast startup (may be changed when camera opens)
+        self.preview_width = 960
+        self.preview_height = 540
+        # Frame rate / pixel format negotiated at open; restored after a watchdog reconnect
+        self.stream_fps = 0
+        self.stream_fourcc = ""
+        # Still capture size (from the active profile)
+        self.capture_width, self.capture_height = camera_io.CAPTURE_RESOLUTION
+
+        # View state as requested by the operator (hardware PTZ takes its share first)
+        self.zoom = 1.0
+        self.pan_x = 0
+        self.pan_y = 0
+        self.focus_level = 0
+        self.orientation = "TOP"
+
+        # Per-device settings profiles (view, focus and negotiated stream mode)
+        self.profile_store = ProfileStore()
+        self.device_id = None
+        self.profile_name = DEFAULT_PROFILE_NAME
+        self.profile = None
+
+        # Frame cadence / stall tracking for the preview stream
+        self.stream_watchdog = StreamWatchdog(**self.settings.get("watchdog", {}))
+        self.is_running = False
+        self.stream_thread = None
+        # Set when the current stream thread has to stop; each start_stream() gets a new
+        # one, so a thread left over from an earlier stream can tell it was replaced
+        self._stream_stopped = threading.Event()
+        # Only every preview_every-th frame is rendered for preview callbacks
+        self.preview_every = 2
+
+        # Camera property writes are coalesced and applied between preview reads
+        self.property_control = PropertyController(lambda: self.cap, self.cap_lock,
+                                                   on_applied=self._on_property_applied)
+        self.property_control.start()
+        # Hardware zoom/pan/tilt (persistent control handle); None = digital crop only
+        self.ptz = None
+
+        # Pre-save blur / exposure / frozen-frame checks
+        self.quality_gate = CaptureQualityGate(self.settings.get("quality_gate"))
+        # Multi-frame temporal denoise of stills (in-process engine only)
+        self.denoise = FrameStack(self.settings.get("temporal_denoise"))
+        # Save zoomed captures as the native-resolution crop instead of upscaling them
+        self.native_roi_capture = bool(self.settings.get("native_roi_capture"))
+        # Board shift / rotation against the product's TOP / BOTTOM reference image
+        self.placement = PlacementChecker(PLACEMENT_REFERENCE_DIR, self.settings.get("placement_check"))
+        if self.placement.enabled and not self.placement.config["sn_prefix_length"]:
+            self.placement.preload(self.placement.config["product"], capture_storage.ORIENTATIONS)
+        # Lens distortion correction, fused with the zoom crop (None = off or not calibrated)
+        self.lens_config = dict(DEFAULT_LENS_CONFIG)
+        self.lens_config.update(self.settings.get("lens_correction") or {})
+        self.lens = None
+        self.load_lens_calibration()
+
+        # Copies committed captures to secondary storage in the background (if configured)
+        self.replication = ReplicationWorker(self.capture_root, REPLICATION_OUTBOX_PATH,
+                                             self.settings.get("replication"))
+        self.replication.start()
+        # Thumbnails made at save time, LRU in memory + JPEG cache on disk
+        self.thumbnails = thumbnails.ThumbnailCache(
+            self.capture_root, THUMBNAIL_CACHE_DIR,
+            capacity=self.settings.get("gallery", {}).get("memory_capacity", 48))
+        # Capture-root usage ledger, quota / free-space floor and retention of replicated SNs
+        self.storage = StorageManager(
+            self.capture_root, STORAGE_LEDGER_PATH, self.settings.get("storage"),
+            is_replicated=self.replication.is_replicated if self.replication.enabled else None,
+            on_removed=self.thumbnails.discard)
+        self.storage.start()
+
+        # Other cameras kept opened and negotiated for fast switching (in-process only)
+        standby = self.settings.get("camera_standby", {})
+        self.standby = None
+        self.standby_indexes = list(standby.get("indexes") or [])
+        if standby.get("enabled") and not self.use_process_engine:
+            self.standby = StandbyPool(self._open_device, standby.get("keepalive_interval", 1.0))
+            self.standby.start()
+
+        self._preview_callbacks = []
+        self._frame_callbacks = []
+        self._status_callbacks = []
+
+        # Counters / histograms for fleet monitoring (Prometheus endpoint + JSON lines)
+        metrics_config = self.settings.get("metrics", {})
+        self.metrics = MetricsRegistry({"station": metrics_config.get("station") or platform.node()})
+        self._register_metrics()
+        self.metrics_exporter = MetricsExporter(self.metrics, metrics_config)
+        self.metrics_exporter.start()
+
+    def _watchdog_stats(self):
+        if self.engine_process is not None:
+            return self.engine_process.watchdog_stats or {}
+        return self.stream_watchdog.snapshot()
+
+    def _register_metrics(self):
+        """Hot-path counters plus callback gauges over state the engine already keeps"""
+        m = self.metrics
+
+        def stat(key):
+            return lambda: self._watchdog_stats().get(key)
+
+        self.preview_frames = m.counter("brio_preview_frames_total", "Preview frames published")
+        m.counter("brio_camera_frames_total", "Frames read from the camera", fn=stat("frames"))
+        m.counter("brio_camera_failed_reads_total", "Dropped frames: failed camera reads", fn=stat("failed_reads"))
+        m.counter("brio_camera_duplicate_frames_total", "Dropped frames: repeated identical frames",
+                  fn=stat("duplicate_frames"))
+        m.gauge("brio_camera_fps", "Camera frame rate (moving average)", fn=stat("fps"))
+        m.counter("brio_camera_reconnects_total", "Watchdog reconnects", fn=stat("reconnects"))
+        m.counter("brio_camera_downtime_seconds_total", "Time spent reconnecting", fn=stat("downtime_total"))
+        m.gauge("brio_camera_open_seconds", "Duration of the last camera open or switch",
+                fn=lambda: self.last_open_ms / 1000.0)
+        self.capture_results = {level: m.counter("brio_captures_total", "Capture attempts by result",
+                                                 labels={"result": level})
+                                for level in ("ok", "warn", "error", "cancelled")}
+        self.capture_seconds = m.histogram("brio_capture_seconds", "End-to-end capture latency")
+        self.capture_read_seconds = m.histogram("brio_capture_read_seconds",
+                                                "Full-resolution read incl. quality gate retries")
+        self.capture_save_seconds = m.histogram("brio_capture_save_seconds", "PNG encode and write time")
+        self.placement_flagged = m.counter("brio_placement_flagged_total",
+                                           "Captures with the board shifted or rotated beyond tolerance")
+        m.gauge("brio_replication_queue_depth", "Captures waiting to be replicated",
+                fn=lambda: self.replication.pending_count if self.replication.enabled else 0)
+        m.counter("brio_replication_bytes_total", "Bytes sent to secondary storage",
+                  fn=lambda: self.replication.bytes_sent)
+        m.gauge("brio_capture_root_bytes", "Bytes used by captures", fn=lambda: self.storage.used_bytes)
+        m.gauge("brio_disk_free_bytes", "Free space on the capture drive", fn=self.storage.free_bytes)
+
+    # --- callbacks ---
+
+    def add_preview_callback(self, callback):
+        """callback(frame_rgb): rendered preview (zoom / pan applied, preview size)."""
+        self._preview_callbacks.append(callback)
+
+    def add_frame_callback(self, callback):
+        """callback(frame_bgr): every raw camera frame (in-process stream only)."""
+        self._frame_callbacks.append(callback)
+
+    def add_status_callback(self, callback):
+        """callback(text, level) for connection, property and error messages."""
+        self._status_callbacks.append(callback)
+
+    def _status(self, text, level="info"):
+        for callback in self._status_callbacks:
+            try:
+                callback(text, level)
+            except Exception as e:
+                print(f"Status callback failed: {e}")
+
+    def _publish_preview(self, frame_rgb):
+        self.preview_frames.inc()
+        for callback in self._preview_callbacks:
+            try:
+                callback(frame_rgb)
+            except Exception as e:
+                print(f"Preview callback failed: {e}")
+
+    def _on_property_applied(self, name, requested, actual):
+        """Warn when the device reads back another value than requested (worker thread)"""
+        if actual is None or math.isclose(actual, float(requested), abs_tol=1e-3):
+            return
+        label = name.replace("_", " ").capitalize()
+        self._status(f"{label}: {requested:g} (camera: {actual:g})", "warn")
+
+    # --- device ---
+
+    def is_open(self):
+        """True when either the in-process capture or the engine process is usable"""
+        if self.engine_process is not None:
+            return self.engine_process.is_alive()
+        return bool(self.cap and getattr(self.cap, "isOpened", lambda: False)())
+
+    def _open_device(self, index):
+        """Open camera index with its active profile's stream mode and focus, warmed up.
+
+        Returns None if the device does not open. Also used by the standby pool.
+        """
+        # DirectShow on Windows for faster startup, buffer size 1 (latest frame only)
+        cap = self.open_capture(index)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        # Apply the device's active profile in one batch: stream mode (lower preview
+        # resolution for fast startup) and manual focus
+        device_id = camera_io.device_identity(cap, index)
+        profile = self.profile_store.get(device_id, self.profile_store.active_name(device_id))
+        camera_io.apply_stream_mode(cap, profile["preview_width"], profile["preview_height"],
+                                    profile["preview_fps"], profile["fourcc"])
+        camera_io.apply_manual_focus(cap, int(profile["focus_level"]))
+
+        # Minimal warm-up: discard only 3 frames quickly for faster startup
+        frame_count = 0
+        for _ in range(3):
+            ret, _ = cap.read()
+            if ret:
+                frame_count += 1
+        print(f"Warm-up complete (camera {index}): read {frame_count}/3 frames")
+        return cap
+
+    def open(self, camera_index=None):
+        """Open a camera and apply its active profile; returns False (see .error) on failure.
+
+        Any camera that is already open is stopped and released first (or parked in
+        standby), so this is also how to switch cameras.
+        """
+        start = time.perf_counter()
+        # Drain and release (or park) the current camera before switching index
+        self.close()
+        if camera_index is not None:
+            self.camera_index = int(camera_index)
+        self.error = None
+        if self.use_process_engine:
+            return self._open_process_engine()
+        try:
+            cap = self.standby.take(self.camera_index) if self.standby is not None else None
+            self.last_open_warm = cap is not None
+            if cap is None:
+                cap = self._open_device(self.camera_index)
+            if cap is None:
+                self.error = "Camera Not Found"
+                return False
+
+            self.device_id = camera_io.device_identity(cap, self.camera_index)
+            self.profile_name = self.profile_store.active_name(self.device_id)
+            profile = self.profile_store.get(self.device_id, self.profile_name)
+            self.capture_width, self.capture_height = profile["capture_width"], profile["capture_height"]
+            with self.cap_lock:
+                self.cap = cap
+
+            # Try to grab an immediate frame to show quick preview
+            try:
+                with self.cap_lock:
+                    ret, frame = self.cap.read()
+                if ret and self._preview_callbacks:
+                    self._publish_preview(imaging.render_preview(frame, 1.0, 0, 0))
+            except Exception:
+                pass
+
+            # Determine actual preview mode and remember it for the next warm start
+            mode = camera_io.read_stream_mode(self.cap)
+            self.camera_width, self.camera_height = mode["width"], mode["height"]
+            self.stream_fps, self.stream_fourcc = mode["fps"], mode["fourcc"]
+            self.preview_width, self.preview_height = self.camera_width, self.camera_height
+            if (profile["preview_width"], profile["preview_height"], profile["preview_fps"], profile["fourcc"]) != \
+                    (mode["width"], mode["height"], mode["fps"], mode["fourcc"]):
+                profile.update(preview_width=mode["width"], preview_height=mode["height"],
+                               preview_fps=mode["fps"], fourcc=mode["fourcc"])
+                self.profile_store.save(self.device_id, self.profile_name, profile)
+
+            # Restore the profile's view and reapply focus after resolution negotiation
+            self._open_ptz(with_cap=True)
+            self.set_view(profile)
+            self.profile = profile
+            self.last_open_ms = (time.perf_counter() - start) * 1000.0
+            print(f"Camera {self.camera_index} opened ({self.camera_width}×{self.camera_height}) in "
+                  f"{self.last_open_ms:.0f} ms{' from standby' if self.last_open_warm else ''}")
+            return True
+        except Exception as e:
+            self.error = f"Error: {e}"
+            return False
+
+    def _open_process_engine(self):
+        """Start the capture engine in a child process"""
+        engine = ProcessCaptureEngine(self.camera_index, self.settings.get("watchdog"))
+        if not engine.start():
+            self.error = engine.error or "Camera Not Found"
+            engine.stop()
+            return False
+
+        self.device_id = engine.device_id
+        self.profile_name = self.profile_store.active_name(self.device_id)
+        profile = self.profile_store.get(self.device_id, self.profile_name)
+        # The child streams and captures in the active profile's mode
+        if not self._configure_process_engine(engine, profile):
+            self.error = engine.error
+            engine.stop()
+            self.device_id = None
+            return False
+
+        self.engine_process = engine
+        print(f"Camera opened in engine process: {self.camera_width}×{self.camera_height}")
+        # Push the profile's view state to the engine
+        self._open_ptz(with_cap=False)
+        self.set_view(profile)
+        self.profile = profile
+        return True
+
+    def _configure_process_engine(self, engine, profile):
+        """Send a profile's stream mode and capture size to the engine process; False on failure"""
+        mode = engine.configure(profile["preview_width"], profile["preview_height"], profile["preview_fps"],
+                                profile["fourcc"], profile["capture_width"], profile["capture_height"])
+        if mode is None:
+            return False
+        self.camera_width, self.camera_height = mode["width"], mode["height"]
+        self.preview_width, self.preview_height = mode["width"], mode["height"]
+        self.stream_fps, self.stream_fourcc = mode["fps"], mode["fourcc"]
+        self.capture_width, self.capture_height = profile["capture_width"], profile["capture_height"]
+        return True
+
+    def close(self):
+        """Stop the stream and release the device (the profile keeps the last view)."""
+        if self.device_id:
+            try:
+                self.profile_store.save(self.device_id, self.profile_name, self.current_profile())
+            except Exception:
+                pass
+        self.stop_stream()
+        if self.ptz is not None:
+            self.ptz.stop()
+            self.ptz = None
+        # The preview thread is stopped, so nothing reads the old stream any more
+        with self.cap_lock:
+            cap, self.cap = self.cap, None
+        if cap is not None:
+            if self.standby is not None:
+                self.standby.give(self.camera_index, cap)
+            else:
+                cap.release()
+        if self.engine_process is not None:
+            self.engine_process.stop()
+            self.engine_process = None
+        self.device_id = None
+
+    def shutdown(self):
+        """close() and stop every background worker; the engine is not reusable after this."""
+        self.close()
+        self.metrics_exporter.stop()
+        if self.standby is not None:
+            self.standby.stop()
+        self.property_control.stop()
+        self.replication.stop()
+        self.storage.stop()
+
+    def configure_standby(self, detected_indexes):
+        """Keep the configured (or else all detected) other cameras open in standby."""
+        if self.standby is None:
+            return
+        self.standby.set_wanted(self.standby_indexes or detected_indexes)
+
+    def held_cameras(self):
+        """Indexes of cameras this engine has open (active and standby)."""
+        held = self.standby.held() if self.standby is not None else set()
+        if self.is_open():
+            held.add(self.camera_index)
+        return held
+
+    # --- stream ---
+
+    def start_stream(self):
+        if self.is_running or not self.is_open():
+            return
+        self.is_running = True
+        self._stream_stopped = stopped = threading.Event()
+        target = self._engine_stream_loop if self.engine_process is not None else self._stream_loop
+        self.stream_thread = threading.Thread(target=target, args=(stopped,), daemon=True)
+        self.stream_thread.start()
+
+    def stop_stream(self):
+        self.is_running = False
+        self._stream_stopped.set()
+        if self.stream_thread and self.stream_thread.is_alive() \
+                and self.stream_thread is not threading.current_thread():
+            self.stream_thread.join(timeout=1)
+        self.stream_thread = None
+
+    def _reconnect(self, reason, stopped):
+        """Release and reopen the camera with exponential backoff after a stall.
+
+        stopped is the stream's stop event: a stream stopped (or replaced by a camera
+        switch) while retrying gives up and never touches the new camera.
+        """
+        print(f"Stream watchdog: {reason}, reconnecting camera...")
+        self._status(f"Reconnecting camera ({reason})...", "warn")
+        self.stream_watchdog.stream_lost(reason)
+        camera_index = self.camera_index
+        with self.cap_lock:
+            if stopped.is_set():
+                return False
+            try:
+                self.cap.release()
+            except Exception:
+                pass
+
+        def open_source():
+            cap = self.open_capture(camera_index)
+            if not cap.isOpened():
+                cap.release()
+                return None
+            camera_io.apply_stream_mode(cap, self.preview_width, self.preview_height,
+                                        self.stream_fps, self.stream_fourcc)
+            ret, _ = cap.read()
+            if not ret:
+                cap.release()
+                return None
+            return cap
+
+        cap, attempts = reconnect_with_backoff(open_source, lambda: not stopped.is_set(), sleep=stopped.wait)
+        if cap is None:
+            return False
+        with self.cap_lock:
+            replaced = stopped.is_set()
+            if not replaced:
+                self.cap = cap
+        if replaced:
+            cap.release()
+            return False
+        self.reapply_properties()
+        if self.ptz is not None:
+            self.ptz.reapply()
+        downtime = self.stream_watchdog.stream_restored(attempts)
+        print(f"Camera reconnected after {downtime:.1f}s ({attempts} attempts)")
+        self._status("Camera Reconnected ✓", "ok")
+        return True
+
+    def _stream_loop(self, stopped):
+        """Read frames, feed the watchdog and publish previews until stopped is set"""
+        frame_display_count = 0
+        skip_counter = 0
+        watchdog = self.stream_watchdog
+        watchdog.start()
+
+        while not stopped.is_set() and self.cap:
+            try:
+                with self.cap_lock:
+                    if stopped.is_set():
+                        break
+                    ret, frame = self.cap.read()
+                if not ret or frame is None:
+                    watchdog.read_failed()
+                else:
+                    watchdog.frame_received(frame)
+
+                # Stalled, failing or frozen stream: reopen the device instead of giving up
+                reason = watchdog.stall_reason()
+                if reason:
+                    if not self._reconnect(reason, stopped):
+                        break
+                    continue
+
+                if not ret or frame is None:
+                    threading.Event().wait(0.1)
+                    continue
+
+                for callback in self._frame_callbacks:
+                    callback(frame)
+
+                # Skip frames for performance (only render every preview_every-th frame)
+                skip_counter += 1
+                if skip_counter < self.preview_every or not self._preview_callbacks:
+                    continue
+                skip_counter = 0
+                frame_display_count += 1
+                if frame_display_count == 1:
+                    print(f"First preview frame rendered: {frame.shape}")
+
+                # Apply digital zoom with pan offset, resize for preview and convert to RGB
+                self._publish_preview(self._render_preview(frame))
+            except Exception as e:
+                print(f"Preview exception: {str(e)}")
+                self._status(f"Preview Error: {str(e)[:30]}", "error")
+                # Repeated exceptions count towards a stall and end in a reconnect
+                watchdog.read_failed()
+                threading.Event().wait(0.5)
+
+    def _engine_stream_loop(self, stopped):
+        """Publish frames rendered by the engine process (only maps and forwards them)"""
+        last_seq = 0
+        while not stopped.is_set() and self.engine_process is not None:
+            try:
+                engine = self.engine_process
+                error, status = engine.poll_messages()
+                if error or not engine.is_alive():
+                    print(f"Engine process stopped: {error}")
+                    self._status(error or "Preview Error: engine stopped", "error")
+                    break
+                if status:
+                    print(f"Engine: {status}")
+                    self._status(status, "ok" if status.endswith("✓") else "warn")
+
+                latest = engine.latest_frame(last_seq)
+                if latest is None:
+                    threading.Event().wait(0.005)
+                    continue
+                last_seq, frame_rgb = latest
+                self._publish_preview(frame_rgb)
+            except Exception as e:
+                print(f"Preview exception: {str(e)}")
+                self._status(f"Preview Error: {str(e)[:30]}", "error")
+                threading.Event().wait(0.5)
+
+    # --- view and camera properties ---
+
+    def digital_view(self):
+        """(zoom, pan_x, pan_y) for the digital crop after hardware PTZ took its share"""
+        if self.ptz is not None:
+            return self.ptz.split_view(self.zoom, self.pan_x, self.pan_y)
+        return self.zoom, self.pan_x, self.pan_y
+
+    def set_zoom(self, zoom):
+        self.zoom = max(1.0, min(MAX_ZOOM, float(zoom)))
+        self._push_view()
+
+    def set_pan(self, pan_x, pan_y):
+        self.pan_x = max(-MAX_PAN, min(MAX_PAN, int(pan_x)))
+        self.pan_y = max(-MAX_PAN, min(MAX_PAN, int(pan_y)))
+        self._push_view()
+
+    def pan_by(self, dx, dy):
+        self.set_pan(self.pan_x + dx, self.pan_y + dy)
+
+    def _push_view(self):
+        """Push the zoom / pan state to hardware PTZ (if enabled) and the engine process.
+
+        Hardware writes are coalesced by the PTZ worker, so this is cheap enough to
+        call on every slider tick; whatever the sensor cannot do stays digital.
+        """
+        if self.ptz is not None:
+            self.ptz.request_view(self.zoom, self.pan_x, self.pan_y)
+        if self.engine_process is not None:
+            zoom, pan_x, pan_y = self.digital_view()
+            self.engine_process.set_zoom(zoom)
+            self.engine_process.set_pan(pan_x, pan_y)
+        self._warm_lens()
+
+    def _render_preview(self, frame):
+        """Zoomed RGB preview frame; with lens correction on the preview it is one remap"""
+        zoom, pan_x, pan_y = self.digital_view()
+        h, w = frame.shape[:2]
+        if self.lens_config["preview"] and self.lens_active() and self.lens.supports((w, h)):
+            crop = imaging.crop_rect(w, h, zoom, pan_x, pan_y)
+            return cv2.cvtColor(self.lens.apply(frame, crop, imaging.PREVIEW_SIZE), cv2.COLOR_BGR2RGB)
+        return imaging.render_preview(frame, zoom, pan_x, pan_y)
+
+    def set_view(self, profile):
+        """Apply a profile's zoom, pan, orientation and focus."""
+        self.zoom = max(1.0, min(MAX_ZOOM, float(profile["zoom"])))
+        self.pan_x, self.pan_y = int(profile["pan_x"]), int(profile["pan_y"])
+        self.orientation = profile.get("orientation", self.orientation)
+        self.focus_level = int(profile["focus_level"])
+        self._push_view()
+        self.reapply_properties()
+
+    def set_focus(self, level):
+        self.focus_level = int(level)
+        self.set_property("focus", self.focus_level)
+
+    def set_property(self, name, value):
+        """Queue a camera property write for the in-process worker or the engine process"""
+        if self.engine_process is not None:
+            self.engine_process.set_property(name, value)
+        else:
+            self.property_control.set(name, value)
+
+    def reapply_properties(self):
+        """Set manual focus again and re-queue exposure / gain / white balance.
+
+        Resolution switches and reconnects can reset them.
+        """
+        self.set_property("focus", self.focus_level)
+        if self.engine_process is None:
+            self.property_control.reapply()
+
+    def _open_ptz(self, with_cap):
+        """Open the hardware PTZ control channel if enabled and supported by the device"""
+        if not self.settings.get("hardware_ptz"):
+            return
+        if self.ptz is not None:
+            self.ptz.stop()
+            self.ptz = None
+        if with_cap:
+            backend = ptz_control.open_backend(self.camera_index, lambda: self.cap,
+                                               self.cap_lock, self.settings.get("ptz_ranges"))
+        else:
+            # The engine process owns the VideoCapture; only a separate V4L2 handle works
+            backend = ptz_control.open_backend(self.camera_index)
+        if backend is None:
+            return
+        ptz = ptz_control.PTZController(backend, max_pan=MAX_PAN)
+        if not ptz.ranges:
+            print("PTZ: device exposes no zoom/pan/tilt controls, using digital crop")
+            backend.close()
+            return
+        print(f"PTZ: hardware controls {sorted(ptz.ranges)} (up to {ptz.max_hardware_zoom:.1f}x)")
+        ptz.start()
+        self.ptz = ptz
+        self._push_view()
+
+    # --- profiles ---
+
+    def current_profile(self):
+        """Snapshot of the current view and stream mode as a profile dict"""
+        return {
+            "focus_level": self.focus_level,
+            "zoom": self.zoom,
+            "pan_x": self.pan_x,
+            "pan_y": self.pan_y,
+            "orientation": self.orientation,
+            "preview_width": self.preview_width,
+            "preview_height": self.preview_height,
+            "preview_fps": self.stream_fps,
+            "fourcc": self.stream_fourcc,
+            "capture_width": self.capture_width,
+            "capture_height": self.capture_height,
+        }
+
+    def select_profile(self, name):
+        """Switch to another saved profile without restarting the stream; returns it."""
+        profile = self.profile_store.get(self.device_id, name)
+        self.profile_name = name
+        self.profile_store.set_active(self.device_id, name)
+
+        # Switch stream mode in place if the profile uses a different one
+        if self.engine_process is None and self.cap is not None:
+            wanted = (profile["preview_width"], profile["preview_height"])
+            if wanted != (self.preview_width, self.preview_height):
+                with self.cap_lock:
+                    camera_io.apply_stream_mode(self.cap, wanted[0], wanted[1],
+                                                profile["preview_fps"], profile["fourcc"])
+                    mode = camera_io.read_stream_mode(self.cap)
+                self.preview_width, self.preview_height = mode["width"], mode["height"]
+                self.stream_fps, self.stream_fourcc = mode["fps"], mode["fourcc"]
+                self.camera_width, self.camera_height = mode["width"], mode["height"]
+        elif self.engine_process is not None:
+            wanted = (profile["preview_width"], profile["preview_height"], profile["capture_width"],
+                      profile["capture_height"])
+            if wanted != (self.preview_width, self.preview_height, self.capture_width, self.capture_height) \
+                    and not self._configure_process_engine(self.engine_process, profile):
+                print(f"Profile {name}: engine kept its stream mode ({self.engine_process.error})")
+        self.capture_width, self.capture_height = profile["capture_width"], profile["capture_height"]
+        self.set_view(profile)
+        self.profile = profile
+        return profile
+
+    def save_profile(self, name):
+        self.profile_name = name or DEFAULT_PROFILE_NAME
+        self.profile_store.save(self.device_id, self.profile_name, self.current_profile())
+
+    def profile_names(self):
+        return self.profile_store.names(self.device_id) if self.device_id else [DEFAULT_PROFILE_NAME]
+
+    # --- lens correction ---
+
+    def load_lens_calibration(self):
+        """(Re)load the lens calibration; returns it, or None when correction stays off"""
+        self.lens = None
+        if not self.lens_config["enabled"]:
+            return None
+        calibration = Calibration.load(LENS_CALIBRATION_PATH)
+        if calibration is None:
+            return None
+        self.lens = LensCorrector(calibration, self.lens_config["alpha"], self.lens_config["cache_mb"])
+        print(f"Lens correction: {calibration.image_size[0]}x{calibration.image_size[1]} calibration "
+              f"from {calibration.images} images, RMS {calibration.rms:.2f} px")
+        self._warm_lens()
+        return calibration
+
+    def full_sensor_view(self):
+        """True unless hardware PTZ has zoomed / moved the sensor window"""
+        return self.ptz is None or self.digital_view() == (self.zoom, self.pan_x, self.pan_y)
+
+    def lens_active(self):
+        """Whether frames are lens-corrected (the calibration describes the full sensor frame)"""
+        return self.lens is not None and self.full_sensor_view()
+
+    def _warm_lens(self):
+        """Build the capture remap maps for the current view in the background"""
+        if not self.lens_active():
+            return
+        w, h = self.capture_width, self.capture_height
+        zoom, pan_x, pan_y = self.digital_view()
+        crop = imaging.crop_rect(w, h, zoom, pan_x, pan_y)
+        native_roi = zoom > 1.0 and self.native_roi_capture
+        self.lens.warm((w, h), crop, (crop[2], crop[3]) if native_roi else (w, h))
+
+    def calibration_frames(self):
+        """Checkerboard stills collected for the next lens calibration"""
+        if not os.path.isdir(LENS_CALIBRATION_FRAMES_DIR):
+            return []
+        return sorted(os.path.join(LENS_CALIBRATION_FRAMES_DIR, name)
+                      for name in os.listdir(LENS_CALIBRATION_FRAMES_DIR) if name.lower().endswith(".png"))
+
+    def add_calibration_frame(self):
+        """Take a full-resolution checkerboard still; returns (board found, stills collected).
+
+        Stills are kept in LENS_CALIBRATION_FRAMES_DIR (never an SN folder) and only
+        when the board is found in them.
+        """
+        if not self.is_open() or not self.full_sensor_view():
+            return False, len(self.calibration_frames())
+        frame, _ = self._read_still(1.0, 0, 0)
+        try:
+            self.reapply_properties()
+        except Exception:
+            pass
+        found = frame is not None and lens_correction.find_corners(frame, self.lens_config["pattern"]) is not None
+        if found:
+            os.makedirs(LENS_CALIBRATION_FRAMES_DIR, exist_ok=True)
+            name = datetime.now().strftime("checkerboard_%Y%m%d_%H%M%S_%f.png")
+            cv2.imwrite(os.path.join(LENS_CALIBRATION_FRAMES_DIR, name), frame)
+        return found, len(self.calibration_frames())
+
+    def calibrate_lens(self):
+        """Calibrate from the collected stills, save the result and apply it.
+
+        Raises ValueError with too few usable stills. Used stills are moved to a
+        timestamped subfolder so the next calibration starts from scratch.
+        """
+        paths = self.calibration_frames()
+        calibration = lens_correction.calibrate(
+            lens_correction.load_images(LENS_CALIBRATION_FRAMES_DIR),
+            self.lens_config["pattern"], self.lens_config["square_size"])
+        calibration.save(LENS_CALIBRATION_PATH)
+        used_dir = os.path.join(LENS_CALIBRATION_FRAMES_DIR, datetime.now().strftime("%Y%m%d_%H%M%S"))
+        os.makedirs(used_dir, exist_ok=True)
+        for path in paths:
+            os.replace(path, os.path.join(used_dir, os.path.basename(path)))
+        self.load_lens_calibration()
+        return calibration
+
+    # --- capture ---
+
+    def sn_dir(self, sn):
+        return os.path.join(self.capture_root, capture_storage.safe_sn_name(sn))
+
+    def existing_capture(self, sn, orientation):
+        """Existing capture files for this SN and orientation (overwrite check)."""
+        sn_dir = self.sn_dir(sn)
+        if not os.path.exists(sn_dir):
+            return []
+        return capture_storage.find_orientation_files(sn_dir, capture_storage.safe_sn_name(sn),
+                                                      orientation.upper())
+
+    def _read_still(self, zoom, pan_x, pan_y):
+        """Full-resolution frame and its quality report (frame is None on failure)"""
+        gate = self.quality_gate
+        gate.last_report = None
+        self.denoise.last_report = None
+        report = None
+        frame = None
+        if self.engine_process is not None:
+            frame = self.engine_process.capture(gate.config)
+            if frame is not None and self.engine_process.last_quality_report:
+                report = QualityReport.from_dict(self.engine_process.last_quality_report)
+            return frame, report
+
+        if self.denoise.enabled:
+            frame = self._read_stacked()
+            if frame is not None:
+                if gate.enabled:
+                    report = gate.assess(imaging.apply_zoom_crop(frame, zoom, pan_x, pan_y))
+                return frame, report
+
+        try:
+            with self.cap_lock:
+                frame = camera_io.read_full_resolution(
+                    self.cap, self.capture_width, self.capture_height, self.preview_width, self.preview_height,
+                    accept=lambda f: gate.accepts(imaging.apply_zoom_crop(f, zoom, pan_x, pan_y)),
+                    max_retries=gate.retries)
+            report = gate.last_report
+        except Exception:
+            frame = None
+
+        if frame is None:
+            # Fallback to current preview resolution for capture
+            with self.cap_lock:
+                ret, frame = self.cap.read()
+            if not ret or frame is None:
+                return None, None
+            if gate.enabled:
+                report = gate.assess(imaging.apply_zoom_crop(frame, zoom, pan_x, pan_y))
+        return frame, report
+
+    def _read_stacked(self):
+        """Average of consecutive full-resolution frames (None if none could be read)"""
+        stack = self.denoise
+        stack.start()
+        try:
+            with self.cap_lock:
+                camera_io.read_full_resolution_frames(
+                    self.cap, self.capture_width, self.capture_height, self.preview_width, self.preview_height,
+                    stack.feed, stack.max_reads)
+        except Exception as e:
+            print(f"Multi-frame read failed: {e}")
+        return stack.result()
+
+    def capture(self, sn, orientation=None, overwrite=True):
+        """Capture, check and save one still for an SN; returns a CaptureResult.
+
+        overwrite is a bool or a callable(sn, orientation) -> bool asked when the SN
+        folder already holds an image for this orientation.
+        """
+        start = time.perf_counter()
+        sn = (sn or "").strip()
+        orientation = (orientation or self.orientation or "TOP").upper()
+        result = CaptureResult(sn, orientation)
+        if not self.is_open():
+            result.message = "Camera not connected"
+            return result
+        if not sn:
+            result.message = "Enter SN before capturing"
+            return result
+
+        # Keep replication off the disk / camera bus while the still is taken and written
+        self.replication.capture_started()
+        try:
+            self._capture(result, start, overwrite)
+        except Exception as e:
+            print(f"Capture error: {e}")
+            result.level, result.message = "error", f"Capture error: {str(e)[:30]}"
+        finally:
+            self.replication.capture_finished()
+            self._forget_removed(result.removed)
+            result.timings["total_ms"] = (time.perf_counter() - start) * 1000.0
+        self._record_capture(result)
+        return result
+
+    def _forget_removed(self, paths):
+        """Tell the storage ledger, thumbnail cache and replication about files a capture removed"""
+        if not paths:
+            return
+        try:
+            self.storage.files_removed(paths)
+            self.thumbnails.discard(paths)
+            # Superseded captures are deleted from the replication target as well
+            self.replication.remove(paths)
+        except Exception as e:
+            print(f"Could not record removed files: {e}")
+
+    def _record_capture(self, result):
+        self.capture_results[result.level].inc()
+        if result.placement is not None and not result.placement.ok:
+            self.placement_flagged.inc()
+        self.capture_seconds.observe(result.timings["total_ms"] / 1000.0)
+        if "read_ms" in result.timings:
+            self.capture_read_seconds.observe(result.timings["read_ms"] / 1000.0)
+        if "save_ms" in result.timings:
+            self.capture_save_seconds.observe(result.timings["save_ms"] / 1000.0)
+
+    def _capture(self, result, start, overwrite):
+        sn, orientation = result.sn, result.orientation
+        os.makedirs(self.capture_root, exist_ok=True)
+
+        # Refuse to capture onto a full disk; low-space warnings end up in the result
+        space_level, space_message = self.storage.check_before_capture(
+            self.capture_width * self.capture_height * 3)
+        if space_level == "block":
+            result.message = space_message
+            return
+
+        # Prepare SN folder; existing files for this orientation are replaced once the
+        # new still is saved, so a failed or rejected capture keeps the old image
+        safe_sn = capture_storage.safe_sn_name(sn)
+        sn_dir = os.path.join(self.capture_root, safe_sn)
+        try:
+            existing = self.existing_capture(sn, orientation)
+            if existing:
+                allowed = overwrite(sn, orientation) if callable(overwrite) else overwrite
+                if not allowed:
+                    result.level, result.message = "cancelled", "Capture cancelled (overwrite declined)"
+                    return
+            os.makedirs(sn_dir, exist_ok=True)
+        except Exception as e:
+            # If anything goes wrong during folder checks, abort
+            result.message = f"Folder error: {str(e)[:30]}"
+            return
+        result.timings["check_ms"] = (time.perf_counter() - start) * 1000.0
+
+        # Full-resolution still, re-read until the quality gate accepts it (retry mode)
+        zoom, pan_x, pan_y = self.digital_view()
+        t = time.perf_counter()
+        frame, report = self._read_still(zoom, pan_x, pan_y)
+        result.timings["read_ms"] = (time.perf_counter() - t) * 1000.0
+        if frame is None:
+            result.message = "Failed to capture frame"
+            return
+        result.report = report
+        denoise = result.denoise = self.denoise.last_report
+        if denoise is not None:
+            result.timings["denoise_ms"] = denoise.elapsed_ms
+            print(f"Capture denoise: {denoise.summary()}, {denoise.skipped} skipped, {denoise.elapsed_ms:.1f} ms")
+        if report is not None:
+            result.timings["qc_ms"] = report.elapsed_ms
+            print(f"Capture QC: {report.summary()} in {report.elapsed_ms:.1f} ms")
+        if not self.quality_gate.should_save(report):
+            result.message = f"Capture rejected - {report.summary()}"
+            return
+
+        # After any temporary resolution changes, make sure focus is re-applied
+        try:
+            self.reapply_properties()
+        except Exception:
+            pass
+
+        # Apply digital zoom with pan offset to full resolution frame
+        t = time.perf_counter()
+        h, w = frame.shape[:2]
+        crop = imaging.crop_rect(w, h, zoom, pan_x, pan_y)
+        native_roi = zoom > 1.0 and self.native_roi_capture
+        lens_corrected = self.lens_active() and self.lens.supports((w, h))
+        if lens_corrected:
+            # Undistort, crop and upscale in a single remap (maps prepared when the view changed)
+            frame = self.lens.apply(frame, crop, (crop[2], crop[3]) if native_roi else (w, h))
+        elif zoom > 1.0:
+            frame = imaging.apply_zoom_crop(frame, zoom, pan_x, pan_y)
+        # Placement check on the saved view runs on its own thread alongside the upscale
+        pending = None
+        if self.placement.enabled:
+            pending = self.placement.start(frame, self.placement.product_for(sn), orientation)
+        if zoom > 1.0 and not native_roi and not lens_corrected:
+            # Upscale back to original resolution if zoomed
+            frame = cv2.resize(frame, (w, h))
+        placement = pending.result() if pending is not None else None
+        result.timings["process_ms"] = (time.perf_counter() - t) * 1000.0
+        result.placement = placement
+        if placement is not None:
+            result.timings["placement_ms"] = placement.elapsed_ms
+            print(f"Capture {placement.summary()} in {placement.elapsed_ms:.1f} ms")
+        if not self.placement.should_save(placement):
+            result.message = f"Capture rejected - {placement.summary()}"
+            return
+
+        # Create filename with SN, orientation and timestamp
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = capture_storage.capture_filename(safe_sn, orientation, timestamp)
+        filepath = os.path.join(sn_dir, filename)
+
+        # Save the image with zoom / pan / crop recorded in a PNG text chunk
+        metadata = capture_metadata.build_metadata(
+            w, h, zoom, pan_x, pan_y, crop, native_roi,
+            sn=sn, orientation=orientation, timestamp=timestamp,
+            hardware_ptz=dict(self.ptz.applied) if self.ptz is not None else None,
+            placement=placement.as_dict() if placement is not None else None,
+            lens_corrected=lens_corrected,
+            denoise=denoise.as_dict() if denoise is not None else None)
+        t = time.perf_counter()
+        try:
+            written = capture_metadata.save_image(filepath, frame, metadata)
+        except Exception as e:
+            print(f"Save failed for {filepath}: {e}")
+            result.message = f"Save failed: {str(e)[:40]}"
+            return
+        result.timings["save_ms"] = (time.perf_counter() - t) * 1000.0
+        self.storage.file_written(filepath, written)
+
+        # The new file is in place: now drop the ones it replaces (a capture in the same
+        # second was overwritten by the rename already)
+        result.removed += capture_storage.remove_captures([p for p in existing if p != filepath])
+        # Ensure SN folder contains strictly only one TOP and one BOTTOM image each
+        try:
+            result.removed += capture_storage.enforce_sn_folder_rules(sn_dir, safe_sn)
+        except Exception:
+            pass
+
+        # Committed: hand the file to the replication outbox
+        self.replication.enqueue(filepath)
+
+        # Gallery thumbnail from the in-memory frame (the PNG is never re-read)
+        try:
+            self.thumbnails.add(filepath, frame, safe_sn, orientation)
+        except Exception as e:
+            print(f"Thumbnail update failed: {e}")
+
+        result.ok = True
+        result.path, result.filename = filepath, filename
+        result.bytes_written = written
+        result.frame = frame
+        notes = []
+        if report is not None and not report.ok:
+            notes.append(report.summary())
+        if placement is not None and not placement.ok:
+            notes.append(placement.summary())
+        if denoise is not None and not denoise.ok:
+            notes.append(denoise.summary())
+        if space_level == "warn":
+            notes.append(space_message)
+        if notes:
+            result.level, result.message = "warn", f"⚠ Captured: {filename} ({'; '.join(notes)})"
+        else:
+            result.level, result.message = "ok", f"✓ Captured: {filename}"
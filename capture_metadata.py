@@ -0,0 +1,120 @@
+"""Capture metadata embedded in PNG text chunks (or a JSON sidecar).
+
+Zoomed captures can be saved at native sensor resolution (just the crop) instead
+of being upscaled back to the full frame size. The zoom, pan, crop rectangle and
+sensor size are recorded with the file, so the full-size view can be rebuilt on
+demand with upscale_to_frame() (see tools/upscale_roi.py).
+
+PNG files get a single tEXt chunk with keyword "BrioCapture" holding JSON; it is
+inserted into the cv2.imencode output directly, so no extra encode pass is
+needed. Other formats get a "<file>.json" sidecar.
+"""
+import json
+import os
+import struct
+import zlib
+
+import cv2
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+METADATA_KEYWORD = b"BrioCapture"
+
+
+def _png_chunk(chunk_type, data):
+    return (struct.pack(">I", len(data)) + chunk_type + data +
+            struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+
+def embed_png_text(png_bytes, metadata):
+    """Return png_bytes with a BrioCapture tEXt chunk inserted after IHDR."""
+    if not png_bytes.startswith(PNG_SIGNATURE):
+        raise ValueError("Not a PNG stream")
+    # Signature (8) + IHDR chunk (4 length + 4 type + 13 data + 4 crc)
+    ihdr_end = len(PNG_SIGNATURE) + 25
+    text = json.dumps(metadata, separators=(",", ":")).encode("latin-1", "replace")
+    chunk = _png_chunk(b"tEXt", METADATA_KEYWORD + b"\x00" + text)
+    return png_bytes[:ihdr_end] + chunk + png_bytes[ihdr_end:]
+
+
+def read_png_text(png_bytes):
+    """Return the BrioCapture metadata dict from PNG bytes, or None."""
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(png_bytes):
+        length, chunk_type = struct.unpack(">I4s", png_bytes[pos:pos + 8])
+        if chunk_type == b"tEXt":
+            data = png_bytes[pos + 8:pos + 8 + length]
+            keyword, _, text = data.partition(b"\x00")
+            if keyword == METADATA_KEYWORD:
+                return json.loads(text.decode("latin-1"))
+        if chunk_type in (b"IDAT", b"IEND"):
+            # Our chunk always precedes the image data
+            break
+        pos += 12 + length
+    return None
+
+
+def read_metadata(path):
+    """Return capture metadata for path from its PNG text chunk or JSON sidecar."""
+    sidecar = path + ".json"
+    if os.path.exists(sidecar):
+        with open(sidecar, "r", encoding="utf-8") as f:
+            return json.load(f)
+    if path.lower().endswith(".png"):
+        with open(path, "rb") as f:
+            # Text chunk sits right after IHDR; the head of the file is enough
+            return read_png_text(f.read(64 * 1024))
+    return None
+
+
+def save_image(path, image, metadata=None, params=None):
+    """Encode image (format from extension), attach metadata and write it to path.
+
+    Raises OSError / ValueError if encoding or writing fails, unlike cv2.imwrite
+    which only returns False. The file is written to a temporary name and renamed
+    into place, so a full disk never leaves a truncated capture behind.
+    """
+    ext = os.path.splitext(path)[1] or ".png"
+    ok, encoded = cv2.imencode(ext, image, params or [])
+    if not ok:
+        raise ValueError(f"Could not encode image as {ext}")
+    data = encoded.tobytes()
+    if metadata is not None and ext.lower() == ".png":
+        data = embed_png_text(data, metadata)
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    if metadata is not None and ext.lower() != ".png":
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2)
+    return len(data)
+
+
+def build_metadata(sensor_w, sensor_h, zoom, pan_x, pan_y, crop, native_roi, **extra):
+    """Metadata describing how a saved capture maps onto the sensor frame."""
+    metadata = {
+        "sensor_size": [int(sensor_w), int(sensor_h)],
+        "zoom": round(float(zoom), 3),
+        "pan": [int(pan_x), int(pan_y)],
+        "crop": [int(v) for v in crop],
+        "native_roi": bool(native_roi),
+    }
+    metadata.update(extra)
+    return metadata
+
+
+def upscale_to_frame(image, metadata, interpolation=cv2.INTER_LINEAR):
+    """Upscale a native-resolution ROI back to the sensor frame size (on demand)."""
+    if not metadata or not metadata.get("native_roi"):
+        return image
+    w, h = metadata["sensor_size"]
+    if image.shape[1] == w and image.shape[0] == h:
+        return image
+    return cv2.resize(image, (w, h), interpolation=interpolation)
@@ -0,0 +1,150 @@
+"""Pre-save quality gate for captured frames.
+
+All checks run on a strided (decimated) grayscale copy of the frame so the whole
+assessment costs a few milliseconds even for 4K stills:
+
+- sharpness: variance of the Laplacian (low values mean motion blur / defocus)
+- exposure: fraction of clipped highlight and shadow pixels
+- frozen frame: CRC of the decimated pixels compared with the previous frame
+  (live sensor noise makes consecutive real frames differ, so an identical
+  fingerprint means the driver handed back a stale buffer)
+"""
+import time
+import zlib
+
+import cv2
+import numpy as np
+
+# Modes: "warn" saves and reports, "retry" reads further frames then saves with a
+# warning, "reject" reads further frames then refuses to save
+GATE_MODES = ("warn", "retry", "reject")
+
+DEFAULT_GATE_CONFIG = {
+    "enabled": False,
+    "mode": "warn",
+    "max_retries": 2,
+    "min_sharpness": 40.0,
+    "max_highlight_ratio": 0.05,
+    "max_shadow_ratio": 0.10,
+    "highlight_level": 250,
+    "shadow_level": 5,
+    # Target width of the decimated copy used for all checks
+    "decimate_width": 640,
+}
+
+
+class QualityReport:
+    """Result of one quality assessment."""
+
+    def __init__(self, sharpness, highlight_ratio, shadow_ratio, duplicate, elapsed_ms, problems):
+        self.sharpness = sharpness
+        self.highlight_ratio = highlight_ratio
+        self.shadow_ratio = shadow_ratio
+        self.duplicate = duplicate
+        self.elapsed_ms = elapsed_ms
+        self.problems = problems
+
+    @property
+    def ok(self):
+        return not self.problems
+
+    def summary(self):
+        """Short human readable description for the status bar."""
+        if self.ok:
+            return f"QC ok (sharpness {self.sharpness:.0f})"
+        return "QC: " + ", ".join(self.problems)
+
+    def as_dict(self):
+        return {
+            "sharpness": self.sharpness,
+            "highlight_ratio": self.highlight_ratio,
+            "shadow_ratio": self.shadow_ratio,
+            "duplicate": self.duplicate,
+            "elapsed_ms": self.elapsed_ms,
+            "problems": list(self.problems),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["sharpness"], data["highlight_ratio"], data["shadow_ratio"],
+                   data["duplicate"], data["elapsed_ms"], data["problems"])
+
+
+def decimate_gray(frame, target_width):
+    """Return a contiguous grayscale copy of frame, strided down to about target_width."""
+    step = max(1, frame.shape[1] // max(1, target_width))
+    small = np.ascontiguousarray(frame[::step, ::step])
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small
+
+
+class CaptureQualityGate:
+    """Checks frames against configured thresholds and remembers the last fingerprint."""
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_GATE_CONFIG)
+        if config:
+            self.config.update(config)
+        if self.config["mode"] not in GATE_MODES:
+            print(f"Quality gate: unknown mode {self.config['mode']!r}, using 'warn'")
+            self.config["mode"] = "warn"
+        self.last_fingerprint = None
+        self.last_report = None
+
+    @property
+    def enabled(self):
+        return bool(self.config["enabled"])
+
+    @property
+    def mode(self):
+        return self.config["mode"]
+
+    @property
+    def retries(self):
+        """Number of extra frames to try after a failed check."""
+        if not self.enabled or self.mode == "warn":
+            return 0
+        return max(0, int(self.config["max_retries"]))
+
+    def assess(self, frame):
+        """Assess a BGR (or gray) frame and return a QualityReport."""
+        start = time.perf_counter()
+        cfg = self.config
+        gray = decimate_gray(frame, cfg["decimate_width"])
+
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+        total = gray.size
+        highlight_ratio = np.count_nonzero(gray >= cfg["highlight_level"]) / total
+        shadow_ratio = np.count_nonzero(gray <= cfg["shadow_level"]) / total
+
+        fingerprint = (gray.shape, zlib.crc32(gray))
+        duplicate = fingerprint == self.last_fingerprint
+        self.last_fingerprint = fingerprint
+
+        problems = []
+        if sharpness < cfg["min_sharpness"]:
+            problems.append(f"blurry ({sharpness:.0f})")
+        if highlight_ratio > cfg["max_highlight_ratio"]:
+            problems.append(f"overexposed ({highlight_ratio:.0%})")
+        if shadow_ratio > cfg["max_shadow_ratio"]:
+            problems.append(f"underexposed ({shadow_ratio:.0%})")
+        if duplicate:
+            problems.append("frozen frame")
+
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        self.last_report = QualityReport(sharpness, highlight_ratio, shadow_ratio,
+                                         duplicate, elapsed_ms, problems)
+        return self.last_report
+
+    def accepts(self, frame):
+        """Assess frame and return True if it passes (always True when disabled)."""
+        if not self.enabled:
+            return True
+        return self.assess(frame).ok
+
+    def should_save(self, report):
+        """Whether a frame with this final report may be written to disk."""
+        if report is None or report.ok or not self.enabled:
+            return True
+        return self.mode != "reject"
@@ -0,0 +1,80 @@
+"""Per-SN capture folder rules, kept free of Tk so tools and benchmarks can use them.
+
+Captures live in <capture_root>/<SN>/ and are named SN_ORIENTATION_timestamp.png
+(archives re-encoded with tools/transcode_archive.py may use another image
+extension, with the capture metadata in a "<file>.json" sidecar).
+Each SN folder holds at most one TOP and one BOTTOM image.
+"""
+import glob
+import os
+import re
+
+ORIENTATIONS = ("TOP", "BOTTOM")
+# Image formats a capture may be stored in
+CAPTURE_EXTENSIONS = (".png", ".webp", ".tiff", ".jpg")
+CAPTURE_NAME = re.compile(r"^(?P<sn>.+)_(?P<orientation>TOP|BOTTOM)_(?P<timestamp>\d{8}_\d{6})(?P<ext>\.\w+)$")
+
+
+def safe_sn_name(sn):
+    """SN as used in folder and file names (spaces replaced with '_')."""
+    return sn.strip().replace(" ", "_")
+
+
+def capture_filename(safe_sn, orientation, timestamp, ext=".png"):
+    return f"{safe_sn}_{orientation}_{timestamp}{ext}"
+
+
+def parse_capture_filename(name):
+    """(sn, orientation, timestamp, ext) for a capture file name, or None."""
+    match = CAPTURE_NAME.match(name)
+    if not match or match["ext"].lower() not in CAPTURE_EXTENSIONS:
+        return None
+    return match["sn"], match["orientation"], match["timestamp"], match["ext"]
+
+
+def find_orientation_files(sn_dir, safe_sn, orientation):
+    """Existing capture files for one orientation in an SN folder."""
+    return [path for path in glob.glob(os.path.join(sn_dir, f"{safe_sn}_{orientation}_*"))
+            if os.path.splitext(path)[1].lower() in CAPTURE_EXTENSIONS]
+
+
+def remove_files(paths):
+    """Delete paths, ignoring failures; returns the paths actually removed."""
+    removed = []
+    for path in paths:
+        try:
+            os.remove(path)
+            removed.append(path)
+        except Exception:
+            pass
+    return removed
+
+
+def remove_captures(paths):
+    """Delete capture files together with their "<file>.json" sidecars; returns the paths removed."""
+    return remove_files(list(paths) + [p + ".json" for p in paths if os.path.exists(p + ".json")])
+
+
+def enforce_sn_folder_rules(sn_dir, safe_sn):
+    """Keep only the newest TOP and BOTTOM image and drop stray files.
+
+    Returns the list of removed paths.
+    """
+    removed = []
+    for ori in ORIENTATIONS:
+        matches = find_orientation_files(sn_dir, safe_sn, ori)
+        if len(matches) > 1:
+            # Keep newest, remove older
+            newest = max(matches, key=os.path.getmtime)
+            older = [m for m in matches if m != newest]
+            removed += remove_captures(older)
+
+    # Remove any stray files that don't match the expected patterns
+    prefixes = tuple(f"{safe_sn}_{ori}_" for ori in ORIENTATIONS)
+    stray = []
+    for f in os.listdir(sn_dir):
+        full = os.path.join(sn_dir, f)
+        if os.path.isfile(full) and not f.startswith(prefixes):
+            stray.append(full)
+    removed += remove_files(stray)
+    return removed
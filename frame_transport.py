@@ -0,0 +1,436 @@
+"""Process-isolated capture engine with shared-memory frame transport.
+
+The child process owns the camera: it reads, crops, resizes and colour-converts
+every frame and publishes the result into a SharedFrameRing. The UI process only
+maps the ring and hands the newest frame to Tk, so NumPy/OpenCV work no longer
+competes with Tk redraws for the GIL.
+
+Control commands (zoom, pan, camera properties, capture, stop) travel over a duplex
+multiprocessing Pipe as small tuples; full-resolution stills come back through a
+dedicated shared-memory block instead of being pickled through the pipe.
+"""
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import camera_io
+import imaging
+from capture_quality import CaptureQualityGate
+from property_control import apply_property
+from stream_watchdog import StreamWatchdog, reconnect_with_backoff
+
+# Per-slot header: [sequence, height, width, channels]
+_HEADER_FIELDS = 4
+
+
+class SharedFrameRing:
+    """Fixed-size ring of frame slots in shared memory with per-slot sequence numbers.
+
+    Single writer, any number of readers. The writer marks a slot with -1 while
+    filling it and publishes the new sequence number afterwards; readers check the
+    slot sequence before and after copying so a torn frame is never returned.
+    """
+
+    def __init__(self, name=None, slots=3, max_shape=(540, 960, 3), create=False):
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        self.slot_bytes = int(np.prod(self.max_shape))
+        header_bytes = (1 + slots * _HEADER_FIELDS) * 8
+        size = header_bytes + slots * self.slot_bytes
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.name = self.shm.name
+        self._owner = create
+
+        # header[0] is the latest published sequence, then one row per slot
+        self._header = np.ndarray((1 + slots * _HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+        self._slots = self._header[1:].reshape(slots, _HEADER_FIELDS)
+        self._data = np.ndarray((slots, self.slot_bytes), dtype=np.uint8,
+                                buffer=self.shm.buf, offset=header_bytes)
+        if create:
+            self._header[:] = 0
+            self._slots[:, 0] = -1
+
+    @property
+    def latest_seq(self):
+        return int(self._header[0])
+
+    def write(self, frame):
+        """Publish a uint8 frame; returns its sequence number."""
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame {frame.shape} does not fit ring slot {self.max_shape}")
+        seq = self.latest_seq + 1
+        slot = seq % self.slots
+        row = self._slots[slot]
+        row[0] = -1
+        self._data[slot, :frame.nbytes] = frame.reshape(-1)
+        h, w = frame.shape[:2]
+        row[1] = h
+        row[2] = w
+        row[3] = frame.shape[2] if frame.ndim == 3 else 1
+        row[0] = seq
+        self._header[0] = seq
+        return seq
+
+    def read_latest(self, after_seq=0):
+        """Return (seq, frame copy) for the newest frame newer than after_seq, else None."""
+        seq = self.latest_seq
+        if seq <= after_seq:
+            return None
+        slot = seq % self.slots
+        row = self._slots[slot]
+        if int(row[0]) != seq:
+            return None
+        h, w, c = int(row[1]), int(row[2]), int(row[3])
+        nbytes = h * w * c
+        frame = self._data[slot, :nbytes].copy()
+        if int(row[0]) != seq:
+            # Writer lapped us while copying
+            return None
+        shape = (h, w, c) if c > 1 else (h, w)
+        return seq, frame.reshape(shape)
+
+    def close(self):
+        # Drop numpy views before closing the mapping
+        self._header = self._slots = self._data = None
+        try:
+            self.shm.close()
+        except Exception:
+            pass
+        if self._owner:
+            try:
+                self.shm.unlink()
+            except Exception:
+                pass
+
+
+def _engine_main(conn, camera_index, preview_ring_name, watchdog_config=None):
+    """Child process entry point: own the camera and serve frames and commands.
+
+    The stream mode and still size come from the parent's "configure" command
+    (sent right after "opened" and again when the active profile changes), which
+    also names the still ring sized for that capture resolution. "configure" and
+    "capture" carry a request id that is echoed in the reply, so the parent can tell
+    a late reply to a request it gave up on from the one it is waiting for.
+    """
+    preview_ring = SharedFrameRing(preview_ring_name, slots=3, max_shape=(540, 960, 3))
+    still_ring = None
+    cap = None
+    gate = None
+    zoom, pan_x, pan_y = 1.0, 0, 0
+    # Last requested value per camera property (focus, exposure, ...)
+    props = {}
+    preview_w, preview_h = camera_io.PREVIEW_RESOLUTION
+    stream_fps, stream_fourcc = 0, ""
+    full_w, full_h = camera_io.CAPTURE_RESOLUTION
+    try:
+        cap = camera_io.open_video_capture(camera_index)
+        if not cap.isOpened():
+            conn.send(("error", "Camera Not Found"))
+            return
+        conn.send(("opened", camera_io.device_identity(cap, camera_index)))
+
+        def open_source():
+            source = camera_io.open_video_capture(camera_index)
+            if not source.isOpened():
+                source.release()
+                return None
+            camera_io.apply_stream_mode(source, preview_w, preview_h, stream_fps, stream_fourcc)
+            for prop_name, value in props.items():
+                apply_property(source, prop_name, value)
+            return source
+
+        watchdog = StreamWatchdog(**(watchdog_config or {}))
+        watchdog.start()
+        while True:
+            # Apply every pending command before the next read; property writes are
+            # coalesced so only the last value per property reaches the device
+            pending_props = {}
+            while conn.poll():
+                cmd = conn.recv()
+                name = cmd[0]
+                if name == "stop":
+                    return
+                elif name == "configure":
+                    request_id = cmd[1]
+                    preview_w, preview_h, stream_fps, stream_fourcc = cmd[2]
+                    full_w, full_h = cmd[3]
+                    if still_ring is None or still_ring.name != cmd[4]:
+                        if still_ring is not None:
+                            still_ring.close()
+                        still_ring = SharedFrameRing(cmd[4], slots=1, max_shape=(full_h, full_w, 3))
+                    mode = None
+                    if cap is not None:
+                        camera_io.apply_stream_mode(cap, preview_w, preview_h, stream_fps, stream_fourcc)
+                        for _ in range(3):
+                            cap.read()
+                        mode = camera_io.read_stream_mode(cap)
+                        # Keep what the device negotiated for the next reconnect
+                        stream_fps, stream_fourcc = mode["fps"], mode["fourcc"]
+                        pending_props.update(props)
+                    conn.send(("configured", request_id, mode))
+                elif name == "zoom":
+                    zoom = float(cmd[1])
+                elif name == "pan":
+                    pan_x, pan_y = int(cmd[1]), int(cmd[2])
+                elif name == "prop":
+                    pending_props[cmd[1]] = cmd[2]
+                    props[cmd[1]] = cmd[2]
+                elif name == "capture" and (cap is None or still_ring is None):
+                    conn.send(("captured", cmd[1], None, None))
+                elif name == "capture":
+                    request_id = cmd[1]
+                    # Quality checks run here so retries can read the next frames directly
+                    if gate is None or gate.config != cmd[2]:
+                        gate = CaptureQualityGate(cmd[2])
+                    gate.last_report = None
+                    z, px, py = zoom, pan_x, pan_y
+                    frame = camera_io.read_full_resolution(
+                        cap, full_w, full_h, preview_w, preview_h,
+                        accept=lambda f: gate.accepts(imaging.apply_zoom_crop(f, z, px, py)),
+                        max_retries=gate.retries)
+                    # Resolution switches can reset focus/exposure: restore them
+                    pending_props.update(props)
+                    report = gate.last_report.as_dict() if gate.last_report else None
+                    seq = None
+                    if frame is not None:
+                        try:
+                            seq = still_ring.write(np.ascontiguousarray(frame))
+                        except ValueError as e:
+                            # The device delivered more than the configured capture size
+                            print(f"Engine: {e}")
+                    conn.send(("captured", request_id, seq, report))
+
+            if cap is not None:
+                for prop_name, value in pending_props.items():
+                    apply_property(cap, prop_name, value)
+
+            if cap is None:
+                # Stream was lost: reopen with backoff, giving way to incoming commands
+                cap, attempts = reconnect_with_backoff(open_source, lambda: not conn.poll())
+                if cap is not None:
+                    watchdog.stream_restored(attempts)
+                    conn.send(("reconnected", watchdog.snapshot()))
+                continue
+
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                watchdog.read_failed()
+            else:
+                watchdog.frame_received(frame)
+
+            reason = watchdog.stall_reason()
+            if reason:
+                conn.send(("status", f"Reconnecting camera ({reason})..."))
+                watchdog.stream_lost(reason)
+                cap.release()
+                cap = None
+                continue
+
+            if not ret or frame is None:
+                time.sleep(0.1)
+                continue
+            preview_ring.write(imaging.render_preview(frame, zoom, pan_x, pan_y))
+    except (EOFError, BrokenPipeError):
+        pass
+    except Exception as e:
+        try:
+            conn.send(("error", f"Error: {e}"))
+        except Exception:
+            pass
+    finally:
+        if cap is not None:
+            cap.release()
+        preview_ring.close()
+        if still_ring is not None:
+            still_ring.close()
+
+
+class ProcessCaptureEngine:
+    """UI-side handle for the capture engine running in a child process."""
+
+    def __init__(self, camera_index, watchdog_config=None):
+        self.camera_index = camera_index
+        self.preview_ring = SharedFrameRing(slots=3, max_shape=(540, 960, 3), create=True)
+        # Created by configure(), sized for the capture resolution
+        self.still_ring = None
+        self.conn, child_conn = mp.Pipe(duplex=True)
+        self.process = mp.Process(
+            target=_engine_main,
+            args=(child_conn, camera_index, self.preview_ring.name, watchdog_config),
+            daemon=True,
+        )
+        self.camera_width = 0
+        self.camera_height = 0
+        # Stream mode negotiated by the last configure(): {width, height, fps, fourcc}
+        self.stream_mode = None
+        self.device_id = None
+        self.error = None
+        # Quality report (dict) for the most recent capture, if the gate ran
+        self.last_quality_report = None
+        # Watchdog counters reported by the child after its last reconnect
+        self.watchdog_stats = None
+        # Child messages that arrived while configure() / capture() waited for their reply
+        self._queued = []
+        # Id of the last configure / capture request; replies echo it
+        self._request_id = 0
+        # Serialises pipe use between the Tk thread, the preview thread and captures
+        self._conn_lock = threading.Lock()
+
+    def start(self, timeout=10.0):
+        """Start the child and wait for it to report the opened camera. Returns True on success.
+
+        Call configure() next; the child streams in the driver's default mode until then.
+        """
+        self.process.start()
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.conn.poll(0.1):
+                msg = self.conn.recv()
+                if msg[0] == "opened":
+                    self.device_id = msg[1]
+                    return True
+                if msg[0] == "error":
+                    self.error = msg[1]
+                    return False
+            if not self.process.is_alive():
+                break
+        self.error = self.error or "Camera engine did not start"
+        return False
+
+    def configure(self, width, height, fps, fourcc, capture_width, capture_height, timeout=10.0):
+        """Switch the child to a preview stream mode and still size; returns the negotiated mode.
+
+        The still ring is reallocated when the capture size changes. Returns None
+        (see .error) if the child does not answer in time or has no camera open.
+        """
+        shape = (int(capture_height), int(capture_width), 3)
+        reply = None
+        with self._conn_lock:
+            old_ring = None
+            if self.still_ring is None or self.still_ring.max_shape != shape:
+                old_ring, self.still_ring = self.still_ring, SharedFrameRing(slots=1, max_shape=shape, create=True)
+            self._request_id += 1
+            try:
+                self.conn.send(("configure", self._request_id, (int(width), int(height), fps or 0, fourcc or ""),
+                                (int(capture_width), int(capture_height)), self.still_ring.name))
+                reply = self._wait_for("configured", self._request_id, timeout)
+            except (EOFError, OSError):
+                pass
+            if old_ring is not None:
+                # The child has switched to the new ring (or is gone)
+                old_ring.close()
+        mode = reply[2] if reply else None
+        if not mode:
+            self.error = self.error or "Camera engine did not accept the stream mode"
+            return None
+        self.stream_mode = mode
+        self.camera_width, self.camera_height = mode["width"], mode["height"]
+        return mode
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def _send(self, *cmd):
+        with self._conn_lock:
+            try:
+                self.conn.send(cmd)
+            except (OSError, BrokenPipeError):
+                pass
+
+    def _wait_for(self, kind, request_id, timeout):
+        """Receive until the reply of kind to request_id arrives (caller holds _conn_lock).
+
+        Other messages are queued; replies to earlier, timed-out requests are dropped.
+        Returns the message, or None on timeout or a child error.
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not self.conn.poll(0.05):
+                continue
+            msg = self.conn.recv()
+            if msg[0] == kind:
+                if msg[1] == request_id:
+                    return msg
+                print(f"Engine: dropping late {kind!r} reply to request {msg[1]}")
+                continue
+            self._queued.append(msg)
+            if msg[0] == "error":
+                self.error = msg[1]
+                return None
+        return None
+
+    def set_zoom(self, zoom):
+        self._send("zoom", float(zoom))
+
+    def set_pan(self, pan_x, pan_y):
+        self._send("pan", int(pan_x), int(pan_y))
+
+    def set_property(self, name, value):
+        """Queue a camera property write (focus, exposure, gain, white_balance)."""
+        self._send("prop", name, value)
+
+    def poll_messages(self):
+        """Drain child messages; returns (error, status) strings reported since the last call."""
+        error = status = None
+        with self._conn_lock:
+            messages, self._queued = self._queued, []
+            try:
+                while self.conn.poll():
+                    messages.append(self.conn.recv())
+            except (EOFError, OSError):
+                error = self.error or "Camera engine stopped"
+        for msg in messages:
+            if msg[0] == "error":
+                self.error = error = msg[1]
+            elif msg[0] == "status":
+                status = msg[1]
+            elif msg[0] == "reconnected":
+                self.watchdog_stats = msg[1]
+                status = "Camera Reconnected ✓"
+        return error, status
+
+    def latest_frame(self, after_seq=0):
+        """Return (seq, RGB preview frame) newer than after_seq, else None."""
+        return self.preview_ring.read_latest(after_seq)
+
+    def capture(self, gate_config=None, timeout=5.0):
+        """Ask the child for a full-resolution BGR still; returns the frame or None.
+
+        gate_config is passed to a CaptureQualityGate in the child; its report is
+        left in last_quality_report.
+        """
+        seq = None
+        self.last_quality_report = None
+        with self._conn_lock:
+            self._request_id += 1
+            try:
+                self.conn.send(("capture", self._request_id, gate_config or {"enabled": False}))
+                msg = self._wait_for("captured", self._request_id, timeout)
+            except (EOFError, OSError):
+                return None
+            if msg is not None:
+                seq = msg[2]
+                self.last_quality_report = msg[3]
+            if seq is None or self.still_ring is None:
+                return None
+            # Still under the lock: configure() may swap the ring otherwise
+            result = self.still_ring.read_latest(seq - 1)
+        return result[1] if result else None
+
+    def stop(self, timeout=2.0):
+        """Stop the child process and release the shared memory."""
+        self._send("stop")
+        self.process.join(timeout=timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1.0)
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        self.preview_ring.close()
+        if self.still_ring is not None:
+            self.still_ring.close()
@@ -0,0 +1,38 @@
+"""Tk-free image helpers shared by the UI and the capture engine."""
+import cv2
+
+# Size of the frames shown in the preview label
+PREVIEW_SIZE = (960, 540)
+
+
+def crop_rect(w, h, zoom, pan_x, pan_y):
+    """Return (x, y, crop_w, crop_h) of the zoomed viewport, clamped to the frame."""
+    if zoom <= 1.0:
+        return 0, 0, w, h
+    crop_w = int(w / zoom)
+    crop_h = int(h / zoom)
+
+    # Calculate center with pan offset
+    x = (w - crop_w) // 2 + pan_x
+    y = (h - crop_h) // 2 + pan_y
+
+    # Clamp to valid bounds
+    x = max(0, min(x, w - crop_w))
+    y = max(0, min(y, h - crop_h))
+    return x, y, crop_w, crop_h
+
+
+def apply_zoom_crop(frame, zoom, pan_x, pan_y):
+    """Crop frame to the zoom/pan viewport (returns a view, no copy)."""
+    if zoom <= 1.0:
+        return frame
+    h, w = frame.shape[:2]
+    x, y, crop_w, crop_h = crop_rect(w, h, zoom, pan_x, pan_y)
+    return frame[y:y+crop_h, x:x+crop_w]
+
+
+def render_preview(frame, zoom, pan_x, pan_y, size=PREVIEW_SIZE):
+    """Crop, resize and convert a BGR camera frame to an RGB preview frame."""
+    frame = apply_zoom_crop(frame, zoom, pan_x, pan_y)
+    frame = cv2.resize(frame, size)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
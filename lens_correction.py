@@ -0,0 +1,244 @@
+"""Lens distortion correction with cached fixed-point remap maps.
+
+Calibration estimates the camera matrix and distortion coefficients from
+checkerboard stills (captured in the app or loaded from a folder, see
+tools/calibrate_lens.py) and is stored as JSON.
+
+LensCorrector fuses undistortion with the digital zoom: the crop rectangle and
+the output size are folded into the projection matrix passed to
+cv2.initUndistortRectifyMap, so one cv2.remap undistorts, crops and upscales a
+frame in a single pass, replacing the crop + resize the capture path did
+before. Maps are built once per (frame size, crop, output size) in fixed-point
+form (CV_16SC2 + interpolation table) and kept in an LRU cache bounded by
+memory; warm() builds the maps for a new view on a background thread so the
+next capture does not pay for it.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+DEFAULT_LENS_CONFIG = {
+    # Correction only happens once a calibration exists; False ignores it
+    "enabled": True,
+    # Also correct the live preview (costs about as much as the plain crop + resize)
+    "preview": False,
+    # 0 = crop to valid pixels only, 1 = keep every source pixel (black corners).
+    # Below 1 the capture shows less than the uncorrected preview unless "preview" is on
+    "alpha": 1.0,
+    # Inner corners of the checkerboard (columns, rows) and its square size (any unit)
+    "pattern": [9, 6],
+    "square_size": 1.0,
+    # Checkerboard stills needed before the in-app calibration runs
+    "min_images": 8,
+    # Memory budget for cached remap maps (a 4K map pair is about 50 MB)
+    "cache_mb": 256,
+}
+
+# Checkerboard detection runs on a copy about this wide; corners are refined at full size
+DETECT_WIDTH = 1280
+
+
+class Calibration:
+    """Camera matrix and distortion coefficients for one sensor resolution."""
+
+    def __init__(self, camera_matrix, dist_coeffs, image_size, rms=0.0, images=0):
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64).reshape(3, 3)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64).ravel()
+        self.image_size = (int(image_size[0]), int(image_size[1]))
+        self.rms = float(rms)
+        self.images = int(images)
+
+    def scaled(self, size):
+        """Camera matrix for frames of another size with the same field of view."""
+        sx = size[0] / self.image_size[0]
+        sy = size[1] / self.image_size[1]
+        matrix = self.camera_matrix.copy()
+        matrix[0, 0] *= sx
+        matrix[0, 2] = (matrix[0, 2] + 0.5) * sx - 0.5
+        matrix[1, 1] *= sy
+        matrix[1, 2] = (matrix[1, 2] + 0.5) * sy - 0.5
+        return matrix
+
+    def as_dict(self):
+        return {
+            "camera_matrix": self.camera_matrix.tolist(),
+            "dist_coeffs": self.dist_coeffs.tolist(),
+            "image_size": list(self.image_size),
+            "rms": self.rms,
+            "images": self.images,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, indent=2)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Calibration stored at path, or None if there is none."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(data["camera_matrix"], data["dist_coeffs"], data["image_size"],
+                       data.get("rms", 0.0), data.get("images", 0))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Lens: could not read calibration {path}: {e}")
+            return None
+
+
+def find_corners(image, pattern):
+    """Sub-pixel checkerboard corners in image, or None if the board isn't found."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    h, w = gray.shape
+    scale = min(1.0, DETECT_WIDTH / w)
+    small = cv2.resize(gray, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA) \
+        if scale < 1.0 else gray
+    flags = cv2.CALIB_CB_ADAPTIVE_THRESH | cv2.CALIB_CB_NORMALIZE_IMAGE | cv2.CALIB_CB_FAST_CHECK
+    found, corners = cv2.findChessboardCorners(small, tuple(pattern), flags=flags)
+    if not found:
+        return None
+    corners = (corners / scale).astype(np.float32)
+    window = max(5, int(round(5 / scale)))
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+    return cv2.cornerSubPix(gray, corners, (window, window), (-1, -1), criteria)
+
+
+def calibrate(images, pattern=(9, 6), square_size=1.0):
+    """Calibration from BGR checkerboard stills; raises ValueError if too few boards are found."""
+    cols, rows = pattern
+    board = np.zeros((cols * rows, 3), np.float32)
+    board[:, :2] = np.mgrid[0:cols, 0:rows].T.reshape(-1, 2) * float(square_size)
+    object_points, image_points = [], []
+    size = None
+    for image in images:
+        image_size = (image.shape[1], image.shape[0])
+        if size is None:
+            size = image_size
+        elif image_size != size:
+            raise ValueError(f"Calibration images differ in size ({image_size} vs {size})")
+        corners = find_corners(image, pattern)
+        if corners is not None:
+            object_points.append(board)
+            image_points.append(corners)
+    if len(image_points) < 3:
+        raise ValueError(f"Checkerboard found in only {len(image_points)} image(s); need at least 3")
+    rms, matrix, dist, _, _ = cv2.calibrateCamera(object_points, image_points, size, None, None)
+    return Calibration(matrix, dist, size, rms, len(image_points))
+
+
+def load_images(folder):
+    """BGR images from the top level of folder, sorted by name."""
+    images = []
+    for name in sorted(os.listdir(folder)):
+        if os.path.splitext(name)[1].lower() not in (".png", ".jpg", ".jpeg", ".bmp", ".tiff"):
+            continue
+        image = cv2.imread(os.path.join(folder, name), cv2.IMREAD_COLOR)
+        if image is not None:
+            images.append(image)
+    return images
+
+
+class LensCorrector:
+    """Undistort + crop + resize in one cv2.remap, with the maps cached per view."""
+
+    def __init__(self, calibration, alpha=1.0, cache_mb=256):
+        self.calibration = calibration
+        self.alpha = float(alpha)
+        self.cache_bytes = int(cache_mb * 1024 * 1024)
+        self._maps = OrderedDict()  # (size, crop, out_size) -> (map1, map2)
+        self._matrices = {}  # size -> (camera matrix, undistorted camera matrix)
+        self._building = set()
+        self._cond = threading.Condition()
+        self._pending = None
+        self._wake = threading.Event()
+        self._thread = None
+
+    def supports(self, size):
+        """Whether frames of this size cover the calibrated field of view (same aspect ratio)."""
+        w, h = self.calibration.image_size
+        return abs(size[0] * h - size[1] * w) <= 0.01 * w * h
+
+    def _matrices_for(self, size):
+        matrices = self._matrices.get(size)
+        if matrices is None:
+            matrix = self.calibration.scaled(size)
+            new_matrix, _ = cv2.getOptimalNewCameraMatrix(matrix, self.calibration.dist_coeffs, size, self.alpha)
+            matrices = self._matrices[size] = (matrix, new_matrix)
+        return matrices
+
+    def _build(self, size, crop, out_size):
+        matrix, new_matrix = self._matrices_for(size)
+        x, y, crop_w, crop_h = crop
+        sx, sy = crop_w / out_size[0], crop_h / out_size[1]
+        # Projection straight into the output: shift by the crop, scale to the output size
+        # (pixel centres aligned the way cv2.resize aligns them)
+        projection = np.array([
+            [new_matrix[0, 0] / sx, 0.0, (new_matrix[0, 2] - x + 0.5) / sx - 0.5],
+            [0.0, new_matrix[1, 1] / sy, (new_matrix[1, 2] - y + 0.5) / sy - 0.5],
+            [0.0, 0.0, 1.0],
+        ])
+        return cv2.initUndistortRectifyMap(matrix, self.calibration.dist_coeffs, None, projection,
+                                           out_size, cv2.CV_16SC2)
+
+    def maps(self, size, crop, out_size):
+        """Fixed-point remap maps for a frame size, crop rectangle and output size (cached)."""
+        key = (tuple(size), tuple(int(v) for v in crop), tuple(out_size))
+        with self._cond:
+            # Another thread (usually warm()) may be building this one already
+            self._cond.wait_for(lambda: key not in self._building)
+            maps = self._maps.get(key)
+            if maps is not None:
+                self._maps.move_to_end(key)
+                return maps
+            self._building.add(key)
+        maps = None
+        try:
+            maps = self._build(*key)
+        finally:
+            # Store before waiters wake up, so they find the maps instead of rebuilding them
+            with self._cond:
+                if maps is not None:
+                    self._maps[key] = maps
+                    used = sum(m1.nbytes + m2.nbytes for m1, m2 in self._maps.values())
+                    while len(self._maps) > 1 and used > self.cache_bytes:
+                        _, (m1, m2) = self._maps.popitem(last=False)
+                        used -= m1.nbytes + m2.nbytes
+                self._building.discard(key)
+                self._cond.notify_all()
+        return maps
+
+    def apply(self, frame, crop, out_size, interpolation=cv2.INTER_LINEAR):
+        """Undistorted crop of frame resized to out_size, in one remap."""
+        map1, map2 = self.maps((frame.shape[1], frame.shape[0]), crop, out_size)
+        return cv2.remap(frame, map1, map2, interpolation)
+
+    def warm(self, size, crop, out_size):
+        """Build maps for a view in the background; only the latest request is kept."""
+        with self._cond:
+            self._pending = (tuple(size), tuple(int(v) for v in crop), tuple(out_size))
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while self._wake.wait(5.0):
+            self._wake.clear()
+            with self._cond:
+                pending, self._pending = self._pending, None
+            if pending is None:
+                continue
+            try:
+                self.maps(*pending)
+            except Exception as e:
+                print(f"Lens: could not build remap maps: {e}")
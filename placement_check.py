@@ -0,0 +1,423 @@
+"""Board placement check against per-product TOP / BOTTOM reference images.
+
+References live in <reference_dir>/<product>/<ORIENTATION>.png (or directly in
+<reference_dir> when no product is set). Each one is reduced once to a small
+grayscale image plus an image pyramid, kept in memory and in a _cache folder
+next to it, so a check never decodes the full-resolution reference again.
+
+A check matches two patches of the reference (left and right of centre) in the
+captured view, coarse to fine: the whole frame is searched only at the top of
+the pyramid, with the patch rotated over the configured angle range; each finer
+level searches a few pixels around the position found above it (trying the half
+step angles either side of the best one, except on the largest level), and the
+peak is refined to sub-pixel with a parabola fit. The mean
+displacement of the two patches is the board shift; the change of the vector
+between them gives the rotation. With the default 640 px working width a check
+takes a few milliseconds and runs on its own thread (see start()), overlapping
+the capture's upscale.
+"""
+import math
+import os
+import threading
+import time
+
+import cv2
+
+# Modes: "warn" saves and flags the capture, "reject" refuses to save it
+PLACEMENT_MODES = ("warn", "reject")
+
+DEFAULT_PLACEMENT_CONFIG = {
+    "enabled": False,
+    "mode": "warn",
+    # Product name used for the reference folder; with sn_prefix_length > 0 the
+    # product is the first characters of the SN instead
+    "product": "",
+    "sn_prefix_length": 0,
+    # Tolerances in capture pixels / degrees, and the lowest match score accepted
+    "max_shift_px": 40.0,
+    "max_rotation_deg": 1.0,
+    "min_score": 0.5,
+    # Template angles tried at the top of the pyramid (+/- search range, step)
+    "rotation_search_deg": 5.0,
+    "rotation_step_deg": 1.0,
+    # Width of the working copy and number of pyramid levels above it
+    "work_width": 640,
+    "pyramid_levels": 3,
+}
+
+REFERENCE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tiff")
+# Template patches as (x0, y0, x1, y1) fractions of the reference
+PATCHES = ((0.08, 0.2, 0.44, 0.8), (0.56, 0.2, 0.92, 0.8))
+# Pixels searched around the position carried down from the coarser level
+REFINE_RADIUS = 3
+# Rotated templates are cached at this angle resolution (degrees)
+ANGLE_QUANTUM = 0.125
+
+
+class PlacementReport:
+    """Result of one placement check (shift in capture pixels, rotation in degrees)."""
+
+    def __init__(self, dx, dy, rotation, score, elapsed_ms, problems, reference=""):
+        self.dx = dx
+        self.dy = dy
+        self.rotation = rotation
+        self.score = score
+        self.elapsed_ms = elapsed_ms
+        self.problems = problems
+        self.reference = reference
+
+    @property
+    def ok(self):
+        return not self.problems
+
+    @property
+    def shift(self):
+        return math.hypot(self.dx, self.dy)
+
+    def summary(self):
+        """Short human readable description for the status bar."""
+        if self.ok:
+            return f"Placement ok ({self.shift:.0f} px, {self.rotation:+.1f}°)"
+        return "Placement: " + ", ".join(self.problems)
+
+    def as_dict(self):
+        return {
+            "dx": round(self.dx, 1),
+            "dy": round(self.dy, 1),
+            "rotation": round(self.rotation, 2),
+            "score": round(self.score, 3),
+            "elapsed_ms": round(self.elapsed_ms, 1),
+            "problems": list(self.problems),
+            "reference": self.reference,
+        }
+
+
+def _to_gray(image):
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def reduce_gray(image, width, height=None):
+    """Grayscale copy of image resized to width (and height, default: keep aspect)."""
+    h, w = image.shape[:2]
+    if height is None:
+        height = max(1, round(h * width / w))
+    # Nearest-neighbour down to twice the size first so INTER_AREA only averages 2x2
+    if w > width * 2 and h > height * 2:
+        image = cv2.resize(image, (width * 2, height * 2), interpolation=cv2.INTER_NEAREST)
+    return cv2.resize(_to_gray(image), (width, height), interpolation=cv2.INTER_AREA)
+
+
+def build_pyramid(gray, levels):
+    pyramid = [gray]
+    for _ in range(levels):
+        if min(pyramid[-1].shape[:2]) < 32:
+            break
+        pyramid.append(cv2.pyrDown(pyramid[-1]))
+    return pyramid
+
+
+def _subpixel(res, x, y):
+    """Refine an integer peak in a match result with a 1-D parabola per axis."""
+    def offset(a, b, c):
+        denom = float(a) - 2 * float(b) + float(c)
+        return 0.0 if denom == 0 else 0.5 * float(a - c) / denom
+
+    fx, fy = float(x), float(y)
+    if 0 < x < res.shape[1] - 1:
+        fx += offset(res[y, x - 1], res[y, x], res[y, x + 1])
+    if 0 < y < res.shape[0] - 1:
+        fy += offset(res[y - 1, x], res[y, x], res[y + 1, x])
+    return fx, fy
+
+
+class Reference:
+    """A reference image reduced to the working size, with its pyramid and patch templates."""
+
+    def __init__(self, path, gray, levels):
+        self.path = path
+        self.gray = gray
+        self.pyramid = build_pyramid(gray, levels)
+        h, w = gray.shape
+        # Per patch and pyramid level: (x0, y0, x1, y1) of the template
+        self.boxes = []
+        for x0, y0, x1, y1 in PATCHES:
+            self.boxes.append([(int(w * x0 / 2 ** level), int(h * y0 / 2 ** level),
+                                int(w * x1 / 2 ** level), int(h * y1 / 2 ** level))
+                               for level in range(len(self.pyramid))])
+        self._templates = {}
+        self.textured = all(float(self.template(i, 0, 0.0).std()) > 4.0 for i in range(len(PATCHES)))
+
+    @property
+    def size(self):
+        return self.gray.shape[1], self.gray.shape[0]
+
+    def template(self, patch, level, angle):
+        """Patch template at a pyramid level, rotated by angle about its centre (cached)."""
+        angle = round(angle / ANGLE_QUANTUM) * ANGLE_QUANTUM
+        key = (patch, level, angle)
+        cached = self._templates.get(key)
+        if cached is not None:
+            return cached
+        x0, y0, x1, y1 = self.boxes[patch][level]
+        image = self.pyramid[level]
+        if angle:
+            # Rotate a margin around the patch so the corners are filled with real pixels
+            m = int(max(x1 - x0, y1 - y0) * 0.3) + 2
+            ax0, ay0 = max(0, x0 - m), max(0, y0 - m)
+            area = image[ay0:min(image.shape[0], y1 + m), ax0:min(image.shape[1], x1 + m)]
+            center = ((x0 + x1) / 2 - ax0, (y0 + y1) / 2 - ay0)
+            rot = cv2.getRotationMatrix2D(center, -angle, 1.0)
+            area = cv2.warpAffine(area, rot, (area.shape[1], area.shape[0]), flags=cv2.INTER_LINEAR,
+                                  borderMode=cv2.BORDER_REPLICATE)
+            template = area[y0 - ay0:y1 - ay0, x0 - ax0:x1 - ax0].copy()
+        else:
+            template = image[y0:y1, x0:x1].copy()
+        self._templates[key] = template
+        return template
+
+
+class PendingCheck:
+    """A placement check running on its own thread; result() waits for it."""
+
+    def __init__(self, fn):
+        self._report = None
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, args=(fn,), daemon=True)
+        self._thread.start()
+
+    def _run(self, fn):
+        try:
+            self._report = fn()
+        except Exception as e:
+            print(f"Placement check failed: {e}")
+
+    def result(self, timeout=2.0):
+        """The report, None if there is no reference, or a "check timed out" report."""
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            elapsed_ms = (time.perf_counter() - self._start) * 1000.0
+            return PlacementReport(0.0, 0.0, 0.0, 0.0, elapsed_ms, ["check timed out"])
+        return self._report
+
+
+class PlacementChecker:
+    """Compares captured views with cached per-product reference images."""
+
+    def __init__(self, reference_dir, config=None):
+        self.reference_dir = reference_dir
+        self.config = dict(DEFAULT_PLACEMENT_CONFIG)
+        if config:
+            self.config.update(config)
+        if self.config["mode"] not in PLACEMENT_MODES:
+            print(f"Placement check: unknown mode {self.config['mode']!r}, using 'warn'")
+            self.config["mode"] = "warn"
+        self._cache = {}  # reference path -> (mtime, Reference)
+        self._lock = threading.Lock()
+        self._missing = set()
+
+    @property
+    def enabled(self):
+        return bool(self.config["enabled"])
+
+    @property
+    def mode(self):
+        return self.config["mode"]
+
+    def product_for(self, sn):
+        prefix = int(self.config["sn_prefix_length"])
+        if prefix > 0 and sn:
+            return sn.strip()[:prefix]
+        return self.config["product"]
+
+    # --- references ---
+
+    def _folder(self, product):
+        return os.path.join(self.reference_dir, product) if product else self.reference_dir
+
+    def reference_path(self, product, orientation):
+        """Path of the reference image for product / orientation, or None."""
+        folder = self._folder(product)
+        for ext in REFERENCE_EXTENSIONS:
+            path = os.path.join(folder, orientation.upper() + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _cache_path(self, path):
+        name = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(os.path.dirname(path), "_cache", f"{name}_{int(self.config['work_width'])}.png")
+
+    def _prepare(self, path, mtime):
+        """Reduced grayscale reference: from the _cache file if fresh, else from the original."""
+        cache_path = self._cache_path(path)
+        gray = None
+        try:
+            if os.path.getmtime(cache_path) >= mtime:
+                gray = cv2.imread(cache_path, cv2.IMREAD_GRAYSCALE)
+        except OSError:
+            pass
+        if gray is None:
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError(f"Could not read reference {path}")
+            gray = reduce_gray(image, int(self.config["work_width"]))
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                cv2.imwrite(cache_path, gray)
+            except Exception as e:
+                print(f"Placement check: could not cache {path}: {e}")
+        ref = Reference(path, gray, int(self.config["pyramid_levels"]))
+        # Rotated templates for the full-frame search at the top of the pyramid
+        angles, _ = self._angles()
+        for patch in range(len(PATCHES)):
+            for angle in angles:
+                ref.template(patch, len(ref.pyramid) - 1, angle)
+        return ref
+
+    def reference(self, product, orientation):
+        """Prepared Reference for product / orientation (cached), or None if there is none."""
+        path = self.reference_path(product, orientation)
+        if path is None:
+            key = (product, orientation.upper())
+            if key not in self._missing:
+                self._missing.add(key)
+                print(f"Placement check: no {orientation.upper()} reference for product '{product}'")
+            return None
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            ref = self._prepare(path, mtime)
+            self._cache[path] = (mtime, ref)
+        if not ref.textured:
+            print(f"Placement check: reference {path} has too little detail to match reliably")
+        return ref
+
+    def preload(self, product, orientations):
+        """Prepare references on a background thread so the first capture doesn't pay for it."""
+        def run():
+            for orientation in orientations:
+                try:
+                    self.reference(product, orientation)
+                except Exception as e:
+                    print(f"Placement check: {e}")
+        threading.Thread(target=run, daemon=True).start()
+
+    def set_reference(self, product, orientation, image):
+        """Store image (BGR) as the reference for product / orientation; returns its path."""
+        folder = self._folder(product)
+        os.makedirs(folder, exist_ok=True)
+        for ext in REFERENCE_EXTENSIONS:
+            old = os.path.join(folder, orientation.upper() + ext)
+            if os.path.exists(old):
+                os.remove(old)
+        path = os.path.join(folder, orientation.upper() + ".png")
+        tmp = path + ".tmp.png"
+        if not cv2.imwrite(tmp, image):
+            raise OSError(f"Could not write reference {path}")
+        os.replace(tmp, path)
+        self._missing.discard((product, orientation.upper()))
+        return path
+
+    # --- matching ---
+
+    def _angles(self):
+        search = abs(float(self.config["rotation_search_deg"]))
+        step = max(ANGLE_QUANTUM, float(self.config["rotation_step_deg"]))
+        n = int(search / step)
+        return [i * step for i in range(-n, n + 1)], step
+
+    def _locate(self, ref, pyramid, patch):
+        """Sub-pixel top-left (x, y) of a patch at level 0 and its match score."""
+        top = min(len(pyramid), len(ref.pyramid)) - 1
+        angles, step = self._angles()
+        best = None
+        for angle in angles:
+            res = cv2.matchTemplate(pyramid[top], ref.template(patch, top, angle), cv2.TM_CCOEFF_NORMED)
+            _, score, _, loc = cv2.minMaxLoc(res)
+            if best is None or score > best[0]:
+                best = (score, angle, loc, res)
+        score, angle, (rx, ry), res = best
+        x0 = y0 = 0
+        for level in range(top - 1, -1, -1):
+            image = pyramid[level]
+            step /= 2
+            ex, ey = (x0 + rx) * 2, (y0 + ry) * 2
+            bx0, by0, bx1, by1 = ref.boxes[patch][level]
+            tw, th = bx1 - bx0, by1 - by0
+            x0, y0 = max(0, ex - REFINE_RADIUS), max(0, ey - REFINE_RADIUS)
+            x1 = min(image.shape[1], ex + tw + REFINE_RADIUS)
+            y1 = min(image.shape[0], ey + th + REFINE_RADIUS)
+            if x1 - x0 < tw or y1 - y0 < th:
+                return None, 0.0
+            window = image[y0:y1, x0:x1]
+            best = None
+            # The full-size level is the expensive one: keep the angle found above
+            candidates = (angle - step, angle, angle + step) if level else (angle,)
+            for candidate in candidates:
+                res = cv2.matchTemplate(window, ref.template(patch, level, candidate), cv2.TM_CCOEFF_NORMED)
+                _, score, _, loc = cv2.minMaxLoc(res)
+                if best is None or score > best[0]:
+                    best = (score, candidate, loc, res)
+            score, angle, (rx, ry), res = best
+        fx, fy = _subpixel(res, rx, ry)
+        return (x0 + fx, y0 + fy), float(score)
+
+    def check(self, frame, product, orientation):
+        """Compare a captured view (BGR) with the reference; None if there is no reference."""
+        ref = self.reference(product, orientation)
+        if ref is None:
+            return None
+        start = time.perf_counter()
+        cfg = self.config
+        ref_w, ref_h = ref.size
+        frame_h, frame_w = frame.shape[:2]
+        problems = []
+        if abs(frame_w / frame_h - ref_w / ref_h) > 0.02:
+            problems.append("view size differs from reference")
+        pyramid = build_pyramid(reduce_gray(frame, ref_w, ref_h), len(ref.pyramid) - 1)
+
+        found = []
+        score = 1.0
+        for patch in range(len(PATCHES)):
+            pos, patch_score = self._locate(ref, pyramid, patch)
+            score = min(score, patch_score)
+            if pos is None:
+                break
+            found.append((pos, ref.boxes[patch][0][:2]))
+
+        dx = dy = rotation = 0.0
+        if len(found) == len(PATCHES):
+            (fl, rl), (fr, rr) = found
+            scale = frame_w / ref_w
+            dx = ((fl[0] - rl[0]) + (fr[0] - rr[0])) / 2 * scale
+            dy = ((fl[1] - rl[1]) + (fr[1] - rr[1])) / 2 * scale
+            rotation = math.degrees(math.atan2(fr[1] - fl[1], fr[0] - fl[0]) -
+                                    math.atan2(rr[1] - rl[1], rr[0] - rl[0]))
+        else:
+            score = 0.0
+
+        if score < cfg["min_score"]:
+            problems.append(f"board not found (score {score:.2f})")
+        else:
+            if math.hypot(dx, dy) > cfg["max_shift_px"]:
+                problems.append(f"shifted {math.hypot(dx, dy):.0f} px")
+            if abs(rotation) > cfg["max_rotation_deg"]:
+                problems.append(f"rotated {rotation:+.1f}°")
+
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        return PlacementReport(float(dx), float(dy), float(rotation), float(score), elapsed_ms, problems,
+                               os.path.basename(ref.path))
+
+    def start(self, frame, product, orientation):
+        """Run check() on a worker thread; returns a PendingCheck."""
+        return PendingCheck(lambda: self.check(frame, product, orientation))
+
+    def should_save(self, report):
+        """Whether a capture with this placement report may be written to disk."""
+        if report is None or report.ok or not self.enabled:
+            return True
+        return self.mode != "reject"
@@ -0,0 +1,226 @@
+"""Preview display backends: how a rendered RGB preview frame gets into Tk.
+
+Getting a NumPy frame on screen is one of the most expensive steps of the
+preview loop, and which way is fastest depends on the machine's Tk / Pillow
+build, so PreviewDisplay offers three and can pick one with a short
+micro-benchmark at startup:
+
+- label:  Image.fromarray -> new ImageTk.PhotoImage -> CTkLabel.configure
+          (the original path; a new Tk image per frame)
+- canvas: one persistent ImageTk.PhotoImage on a plain tk.Canvas, frames are
+          pasted into it (Pillow's C blit, no new Tk image or widget update)
+- ppm:    one persistent tk.PhotoImage on a Canvas fed raw PPM (RGB) or PGM
+          (gray) bytes, skipping PIL entirely
+
+draw() is called from wherever the app already updated the preview label;
+benchmark() / auto_select() run from the Tk main loop (root.after) and draw()
+drops frames while they hold the display.
+"""
+import threading
+import time
+import tkinter as tk
+
+import numpy as np
+from PIL import Image, ImageTk
+
+DEFAULT_DISPLAY_CONFIG = {
+    # "auto" benchmarks the backends at startup and keeps the fastest
+    "backend": "auto",
+    # Frames drawn per backend by the startup benchmark
+    "benchmark_frames": 10,
+}
+
+
+class LabelBackend:
+    """The original path: a new ImageTk.PhotoImage per frame shown in the CTkLabel."""
+
+    name = "label"
+
+    def __init__(self, label):
+        self.label = label
+        self.widget = label
+
+    def draw(self, frame_rgb):
+        photo = ImageTk.PhotoImage(Image.fromarray(frame_rgb))
+        self.label.configure(image=photo, text="")
+        self.label.image = photo
+
+    def clear(self, text):
+        self.label.configure(image="", text=text)
+        self.label.image = None
+
+
+class CanvasBackend:
+    """One persistent ImageTk.PhotoImage on a Canvas; each frame is pasted into it."""
+
+    name = "canvas"
+
+    def __init__(self, parent, bg, text_color):
+        self.canvas = tk.Canvas(parent, bg=bg, highlightthickness=0, bd=0)
+        self.widget = self.canvas
+        self.text_color = text_color
+        self.photo = None
+        self.size = None
+        self.item = self.canvas.create_image(0, 0, anchor="center")
+        self.text_item = None
+        self.canvas.bind("<Configure>", self._center)
+
+    def _center(self, event=None):
+        w, h = self.canvas.winfo_width(), self.canvas.winfo_height()
+        self.canvas.coords(self.item, w // 2, h // 2)
+        if self.text_item is not None:
+            self.canvas.coords(self.text_item, w // 2, h // 2)
+
+    def _new_photo(self, frame):
+        return ImageTk.PhotoImage("RGB", (frame.shape[1], frame.shape[0]), master=self.canvas)
+
+    def _put(self, frame):
+        self.photo.paste(Image.fromarray(frame))
+
+    def draw(self, frame_rgb):
+        size = (frame_rgb.shape[1], frame_rgb.shape[0])
+        if self.photo is None or size != self.size:
+            # Only a size change creates a new Tk image
+            self.photo = self._new_photo(frame_rgb)
+            self.size = size
+            self.canvas.itemconfigure(self.item, image=self.photo)
+            self._center()
+        if self.text_item is not None:
+            self.canvas.delete(self.text_item)
+            self.text_item = None
+        self._put(frame_rgb)
+
+    def clear(self, text):
+        self.canvas.itemconfigure(self.item, image="")
+        self.photo = None
+        self.size = None
+        if self.text_item is None:
+            self.text_item = self.canvas.create_text(0, 0, text=text, fill=self.text_color)
+        else:
+            self.canvas.itemconfigure(self.text_item, text=text)
+        self._center()
+
+
+def pnm_bytes(frame):
+    """Binary PPM (RGB) or PGM (gray) image of a uint8 frame."""
+    h, w = frame.shape[:2]
+    magic = b"P5" if frame.ndim == 2 else b"P6"
+    # join copies the pixels once (header + tobytes() would copy them twice)
+    return b"".join((b"%s %d %d 255\n" % (magic, w, h), memoryview(np.ascontiguousarray(frame)).cast("B")))
+
+
+class PpmBackend(CanvasBackend):
+    """A persistent tk.PhotoImage on a Canvas, written with raw PPM / PGM bytes."""
+
+    name = "ppm"
+
+    def _new_photo(self, frame):
+        return tk.PhotoImage(master=self.canvas, width=frame.shape[1], height=frame.shape[0])
+
+    def _put(self, frame):
+        self.photo.configure(data=pnm_bytes(frame), format="ppm")
+
+
+class PreviewDisplay:
+    """Draws preview frames with the selected backend and measures what it costs."""
+
+    def __init__(self, root, label, config=None, pack_options=None, placeholder="Camera Preview",
+                 bg="#262626", text_color="#888888"):
+        self.root = root
+        self.label = label
+        # How the preview widget is packed; the shown backend's widget takes its place
+        self.pack_options = pack_options or {"fill": "both", "expand": True}
+        self.config = dict(DEFAULT_DISPLAY_CONFIG)
+        self.config.update(config or {})
+        self.placeholder = placeholder
+        self.backends = {"label": LabelBackend(label)}
+        for cls in (CanvasBackend, PpmBackend):
+            try:
+                self.backends[cls.name] = cls(label.master, bg, text_color)
+            except Exception as e:
+                print(f"Preview display: {cls.name} backend unavailable: {e}")
+        self.backend = self.backends["label"]
+        # Moving average of the per-frame draw time (ms)
+        self.draw_ms = 0.0
+        self.benchmark_ms = {}
+        # Held while backends are switched or benchmarked; draw() skips frames then
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    def _show(self, backend):
+        if backend is self.backend:
+            return
+        self.backend.widget.pack_forget()
+        backend.widget.pack(**self.pack_options)
+        self.backend = backend
+
+    def select(self, name):
+        """Switch to a backend by name; returns False if it isn't available."""
+        backend = self.backends.get(name)
+        if backend is None:
+            return False
+        with self._lock:
+            self._show(backend)
+            self.draw_ms = 0.0
+        return True
+
+    def draw(self, frame_rgb):
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            start = time.perf_counter()
+            self.backend.draw(frame_rgb)
+            elapsed = (time.perf_counter() - start) * 1000.0
+            self.draw_ms = elapsed if not self.draw_ms else self.draw_ms * 0.9 + elapsed * 0.1
+        finally:
+            self._lock.release()
+
+    def clear(self, text=None):
+        with self._lock:
+            self.backend.clear(text if text is not None else self.placeholder)
+
+    def benchmark(self, size=(960, 540), frames=None):
+        """Milliseconds per frame for each backend, including the Tk redraw."""
+        frames = int(frames or self.config["benchmark_frames"])
+        w, h = size
+        base = np.zeros((h, w, 3), np.uint8)
+        base[:, :, 0] = np.linspace(0, 255, w, dtype=np.uint8)[None, :]
+        base[:, :, 1] = np.linspace(0, 255, h, dtype=np.uint8)[:, None]
+        results = {}
+        with self._lock:
+            original = self.backend
+            for name, backend in self.backends.items():
+                try:
+                    self._show(backend)
+                    backend.draw(base)
+                    self.root.update_idletasks()
+                    start = time.perf_counter()
+                    for i in range(frames):
+                        # Vary the content so nothing can be skipped as unchanged
+                        base[:, :, 2] = i * 16
+                        backend.draw(base)
+                        self.root.update_idletasks()
+                    results[name] = (time.perf_counter() - start) * 1000.0 / frames
+                except Exception as e:
+                    print(f"Preview display: {name} backend failed: {e}")
+                backend.clear(self.placeholder)
+            self._show(original)
+        self.benchmark_ms = results
+        return results
+
+    def auto_select(self):
+        """Apply the configured backend, benchmarking them first when it is 'auto'."""
+        wanted = self.config["backend"]
+        if wanted != "auto":
+            if not self.select(wanted):
+                print(f"Preview display: unknown backend {wanted!r}, using '{self.name}'")
+            return self.name
+        results = self.benchmark()
+        if results:
+            self.select(min(results, key=results.get))
+        print("Preview display: " + ", ".join(f"{name} {ms:.1f} ms" for name, ms in sorted(results.items()))
+              + f" -> {self.name}")
+        return self.name
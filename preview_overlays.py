@@ -0,0 +1,154 @@
+"""Preview-only exposure and focus aids: histogram, focus peaking, sharpness.
+
+OverlayAnalyzer takes a decimated copy of a preview frame at most every
+`interval` seconds and analyses it on its own worker thread. The preview loop
+only composites the latest cached results onto the frame it is about to show,
+so the per-frame cost is a mask resize and a small blend. Overlays are drawn on
+the preview copy only; saved captures never pass through here.
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+HIST_BINS = 64
+HIST_SIZE = (192, 96)  # width, height of the histogram box on the preview
+PEAKING_COLOR = (255, 40, 40)  # RGB
+
+
+class OverlayResult:
+    """Latest analysis: per-channel + luminance histograms, peaking mask, sharpness."""
+
+    def __init__(self, hist, peaking_mask, sharpness, seq):
+        self.hist = hist
+        self.peaking_mask = peaking_mask
+        self.sharpness = sharpness
+        self.seq = seq
+
+
+class OverlayAnalyzer:
+    """Throttled background analysis of preview frames."""
+
+    def __init__(self, interval=0.2, decimate_width=480, peaking_threshold=60, smoothing=0.5):
+        self.interval = interval
+        self.decimate_width = decimate_width
+        self.peaking_threshold = peaking_threshold
+        # Weight of the previous histogram when blending in a new one (incremental update)
+        self.smoothing = smoothing
+        self.show_histogram = False
+        self.show_peaking = False
+        self.result = None
+
+        self._pending = None
+        self._last_submit = 0.0
+        self._seq = 0
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+        # Compositing caches, rebuilt only when a new result arrives
+        self._hist_image = None
+        self._hist_seq = -1
+        self._mask_cache = (None, None, None)  # (seq, shape, upscaled uint8 mask)
+        self._color_plane = None  # solid PEAKING_COLOR frame used with cv2.copyTo
+
+    @property
+    def active(self):
+        return self.show_histogram or self.show_peaking
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    def submit(self, frame_rgb):
+        """Offer a preview frame; cheap no-op unless the throttle interval has passed."""
+        if not self.active:
+            return
+        now = time.monotonic()
+        if now - self._last_submit < self.interval or self._pending is not None:
+            return
+        self._last_submit = now
+        step = max(1, frame_rgb.shape[1] // self.decimate_width)
+        self._pending = np.ascontiguousarray(frame_rgb[::step, ::step])
+        self._wake.set()
+
+    def _run(self):
+        while self._running:
+            self._wake.wait()
+            self._wake.clear()
+            small, self._pending = self._pending, None
+            if small is None or not self._running:
+                continue
+            try:
+                self.result = self._analyze(small)
+            except Exception as e:
+                print(f"Overlay analysis failed: {e}")
+
+    def _analyze(self, small):
+        gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+        channels = [small[:, :, 0], small[:, :, 1], small[:, :, 2], gray]
+        hist = np.stack([cv2.calcHist([c], [0], None, [HIST_BINS], [0, 256]).ravel() for c in channels])
+        hist /= max(1.0, float(gray.size))
+        previous = self.result
+        if previous is not None and previous.hist.shape == hist.shape:
+            hist = self.smoothing * previous.hist + (1.0 - self.smoothing) * hist
+
+        lap = cv2.Laplacian(gray, cv2.CV_16S, ksize=3)
+        sharpness = float(lap.astype(np.float32).var())
+        mask = cv2.convertScaleAbs(lap) > self.peaking_threshold
+
+        self._seq += 1
+        return OverlayResult(hist, mask, sharpness, self._seq)
+
+    def _histogram_image(self, result):
+        if self._hist_seq == result.seq and self._hist_image is not None:
+            return self._hist_image
+        w, h = HIST_SIZE
+        image = np.zeros((h, w, 3), np.uint8)
+        xs = np.linspace(0, w - 1, HIST_BINS).astype(np.int32)
+        peak = max(1e-6, float(result.hist.max()))
+        colors = ((255, 80, 80), (80, 255, 80), (80, 140, 255), (230, 230, 230))
+        for curve, color in zip(result.hist, colors):
+            ys = (h - 1 - (curve / peak) * (h - 4)).astype(np.int32)
+            points = np.stack([xs, ys], axis=1).reshape(-1, 1, 2)
+            cv2.polylines(image, [points], False, color, 1)
+        self._hist_image, self._hist_seq = image, result.seq
+        return image
+
+    def _peaking_mask(self, result, shape):
+        seq, cached_shape, mask = self._mask_cache
+        if seq == result.seq and cached_shape == shape:
+            return mask
+        mask = cv2.resize(result.peaking_mask.astype(np.uint8), (shape[1], shape[0]),
+                          interpolation=cv2.INTER_NEAREST)
+        self._mask_cache = (result.seq, shape, mask)
+        return mask
+
+    def draw(self, frame_rgb):
+        """Return frame_rgb with the enabled overlays drawn (a copy if anything is drawn)."""
+        result = self.result
+        if result is None or not self.active:
+            return frame_rgb
+        frame = frame_rgb.copy()
+        if self.show_peaking:
+            if self._color_plane is None or self._color_plane.shape != frame.shape:
+                self._color_plane = np.empty_like(frame)
+                self._color_plane[:] = PEAKING_COLOR
+            # cv2.copyTo is far cheaper than boolean-mask assignment at preview size
+            cv2.copyTo(self._color_plane, self._peaking_mask(result, frame.shape[:2]), frame)
+        if self.show_histogram:
+            hist_image = self._histogram_image(result)
+            h, w = hist_image.shape[:2]
+            y, x = frame.shape[0] - h - 10, frame.shape[1] - w - 10
+            if x >= 0 and y >= 0:
+                roi = frame[y:y + h, x:x + w]
+                cv2.addWeighted(roi, 0.35, hist_image, 0.65, 0, dst=roi)
+        return frame
@@ -0,0 +1,138 @@
+"""Coalescing camera-property writer that runs off the UI thread.
+
+Slider callbacks only record the wanted value (last value wins per property) and
+wake the worker. The worker takes the capture lock, so writes land between two
+preview reads instead of blocking the Tk thread, applies every pending property
+in one pass and reads the value back from the device.
+"""
+import platform
+import threading
+
+import cv2
+
+import camera_io
+
+# Value that switches a property's automatic mode off (backend dependent for exposure)
+_AUTO_EXPOSURE_MANUAL = 0.25 if platform.system() == "Windows" else 1
+
+# name -> (property id, auto-mode property id or None, value that disables auto mode)
+PROPERTIES = {
+    "focus": (camera_io.FOCUS_PROP, camera_io.AUTOFOCUS_PROP, 0),
+    "exposure": (cv2.CAP_PROP_EXPOSURE, cv2.CAP_PROP_AUTO_EXPOSURE, _AUTO_EXPOSURE_MANUAL),
+    "gain": (cv2.CAP_PROP_GAIN, None, None),
+    "white_balance": (cv2.CAP_PROP_WB_TEMPERATURE, cv2.CAP_PROP_AUTO_WB, 0),
+}
+
+
+def apply_property(cap, name, value):
+    """Switch the property to manual, write value and return the value read back (or None)."""
+    prop, auto_prop, manual_value = PROPERTIES[name]
+    if auto_prop is not None:
+        try:
+            cap.set(auto_prop, manual_value)
+        except Exception:
+            pass
+    try:
+        cap.set(prop, value)
+        return cap.get(prop)
+    except Exception:
+        return None
+
+
+class CoalescingWriter:
+    """Background worker that applies the latest requested value per key in batches.
+
+    Subclasses implement apply_batch(batch) and return {key: value read back}.
+    """
+
+    def __init__(self, on_applied=None):
+        self.on_applied = on_applied
+        self.pending = {}
+        # Last requested value per key, re-applied by reapply()
+        self.requested = {}
+        # Value read back per key
+        self.applied = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=1)
+
+    def set(self, name, value):
+        """Queue a write; replaces any pending value for the same key."""
+        with self._lock:
+            self.pending[name] = value
+            self.requested[name] = value
+        self._wake.set()
+
+    def reapply(self):
+        """Queue every previously requested value again (e.g. after a mode switch)."""
+        with self._lock:
+            self.pending.update(self.requested)
+        if self.pending:
+            self._wake.set()
+
+    def apply_batch(self, batch):
+        raise NotImplementedError
+
+    def _run(self):
+        while self._running:
+            self._wake.wait()
+            self._wake.clear()
+            if not self._running:
+                break
+            with self._lock:
+                batch, self.pending = self.pending, {}
+            if not batch:
+                continue
+
+            try:
+                results = self.apply_batch(batch) or {}
+            except Exception as e:
+                print(f"{type(self).__name__}: write failed: {e}")
+                continue
+
+            for name, actual in results.items():
+                self.applied[name] = actual
+                if self.on_applied:
+                    try:
+                        self.on_applied(name, batch[name], actual)
+                    except Exception:
+                        pass
+
+
+class PropertyController(CoalescingWriter):
+    """Background worker applying the latest requested value of each camera property."""
+
+    def __init__(self, get_cap, cap_lock, on_applied=None):
+        super().__init__(on_applied)
+        # get_cap is called for every batch so a reconnected device is picked up
+        self.get_cap = get_cap
+        self.cap_lock = cap_lock
+
+    def set(self, name, value):
+        if name not in PROPERTIES:
+            raise KeyError(f"Unknown camera property: {name}")
+        super().set(name, value)
+
+    def apply_batch(self, batch):
+        results = {}
+        with self.cap_lock:
+            cap = self.get_cap()
+            if not (cap and cap.isOpened()):
+                return results
+            for name, value in batch.items():
+                results[name] = apply_property(cap, name, value)
+        return results
@@ -0,0 +1,236 @@
+"""Hardware zoom / pan / tilt through a persistent control handle.
+
+The old apply_zoom() spawned a v4l2-ctl or PowerShell subprocess per change. Here
+a backend keeps one handle to the device for the life of the stream:
+
+- V4L2ControlBackend (Linux): the /dev/videoN file descriptor, written with
+  VIDIOC_S_CTRL ioctls for zoom_absolute / pan_absolute / tilt_absolute
+- OpenCVControlBackend (Windows/DirectShow): CAP_PROP_ZOOM / PAN / TILT on the
+  already open VideoCapture
+- MockControlBackend: in-memory controls for tests and benchmarks
+
+PTZController coalesces rapid slider updates (last value wins) and applies them
+from a worker thread. Whatever the sensor cannot do is left to the existing
+digital crop: split_view() tells the caller how much zoom and pan remain digital.
+"""
+import os
+import platform
+import struct
+
+import cv2
+
+from property_control import CoalescingWriter
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+CONTROLS = ("zoom", "pan", "tilt")
+
+# V4L2 control ids (linux/v4l2-controls.h, camera class)
+V4L2_CID_PAN_ABSOLUTE = 0x009A0908
+V4L2_CID_TILT_ABSOLUTE = 0x009A0909
+V4L2_CID_ZOOM_ABSOLUTE = 0x009A090D
+V4L2_CTRL_FLAG_DISABLED = 0x0001
+
+_V4L2_CIDS = {
+    "zoom": V4L2_CID_ZOOM_ABSOLUTE,
+    "pan": V4L2_CID_PAN_ABSOLUTE,
+    "tilt": V4L2_CID_TILT_ABSOLUTE,
+}
+
+# struct v4l2_queryctrl / struct v4l2_control
+_QUERYCTRL_FMT = "<II32siiiiI2I"
+_CONTROL_FMT = "<Ii"
+
+
+def _iowr(nr, size):
+    return (3 << 30) | (size << 16) | (ord("V") << 8) | nr
+
+
+VIDIOC_G_CTRL = _iowr(27, struct.calcsize(_CONTROL_FMT))
+VIDIOC_S_CTRL = _iowr(28, struct.calcsize(_CONTROL_FMT))
+VIDIOC_QUERYCTRL = _iowr(36, struct.calcsize(_QUERYCTRL_FMT))
+
+
+class V4L2ControlBackend:
+    """Persistent V4L2 control handle on /dev/videoN."""
+
+    def __init__(self, device_index):
+        self.path = f"/dev/video{device_index}"
+        self.fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+
+    def query(self, name):
+        """Return (minimum, maximum, default) for a control, or None if unsupported."""
+        buf = bytearray(struct.pack(_QUERYCTRL_FMT, _V4L2_CIDS[name], 0, b"", 0, 0, 0, 0, 0, 0, 0))
+        try:
+            fcntl.ioctl(self.fd, VIDIOC_QUERYCTRL, buf)
+        except OSError:
+            return None
+        _, _, _, minimum, maximum, _, default, flags, _, _ = struct.unpack(_QUERYCTRL_FMT, buf)
+        if flags & V4L2_CTRL_FLAG_DISABLED:
+            return None
+        return minimum, maximum, default
+
+    def set(self, name, value):
+        fcntl.ioctl(self.fd, VIDIOC_S_CTRL, struct.pack(_CONTROL_FMT, _V4L2_CIDS[name], int(value)))
+
+    def get(self, name):
+        buf = bytearray(struct.pack(_CONTROL_FMT, _V4L2_CIDS[name], 0))
+        fcntl.ioctl(self.fd, VIDIOC_G_CTRL, buf)
+        return struct.unpack(_CONTROL_FMT, buf)[1]
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class OpenCVControlBackend:
+    """Zoom / pan / tilt through CAP_PROP_* on the open VideoCapture (DirectShow).
+
+    OpenCV cannot report control ranges, so they come from settings; a control is
+    treated as supported if the device reports a value for it.
+    """
+
+    _PROPS = {"zoom": cv2.CAP_PROP_ZOOM, "pan": cv2.CAP_PROP_PAN, "tilt": cv2.CAP_PROP_TILT}
+
+    def __init__(self, get_cap, cap_lock, ranges):
+        self.get_cap = get_cap
+        self.cap_lock = cap_lock
+        self.ranges = ranges
+
+    def query(self, name):
+        with self.cap_lock:
+            cap = self.get_cap()
+            if not (cap and cap.isOpened()):
+                return None
+            value = cap.get(self._PROPS[name])
+        if value is None or value < 0 or name not in self.ranges:
+            return None
+        minimum, maximum = self.ranges[name]
+        return minimum, maximum, value
+
+    def set(self, name, value):
+        with self.cap_lock:
+            cap = self.get_cap()
+            if cap and cap.isOpened():
+                cap.set(self._PROPS[name], value)
+
+    def get(self, name):
+        with self.cap_lock:
+            cap = self.get_cap()
+            return cap.get(self._PROPS[name]) if cap and cap.isOpened() else None
+
+    def close(self):
+        pass
+
+
+class MockControlBackend:
+    """In-memory control backend; records every write in `writes`."""
+
+    def __init__(self, ranges=None):
+        self.ranges = ranges if ranges is not None else {"zoom": (100, 500), "pan": (-36000, 36000),
+                                                         "tilt": (-36000, 36000)}
+        self.values = {name: (r[0] if name == "zoom" else 0) for name, r in self.ranges.items()}
+        self.writes = []
+
+    def query(self, name):
+        if name not in self.ranges:
+            return None
+        minimum, maximum = self.ranges[name]
+        return minimum, maximum, self.values[name]
+
+    def set(self, name, value):
+        minimum, maximum = self.ranges[name]
+        self.values[name] = max(minimum, min(maximum, int(value)))
+        self.writes.append((name, int(value)))
+
+    def get(self, name):
+        return self.values[name]
+
+    def close(self):
+        pass
+
+
+def open_backend(device_index, get_cap=None, cap_lock=None, ranges=None):
+    """Pick the control backend for this platform; returns None if none is usable."""
+    if platform.system() == "Linux" and fcntl is not None:
+        try:
+            return V4L2ControlBackend(device_index)
+        except OSError as e:
+            print(f"PTZ: cannot open /dev/video{device_index}: {e}")
+            return None
+    if get_cap is not None and cap_lock is not None:
+        return OpenCVControlBackend(get_cap, cap_lock, ranges or {})
+    return None
+
+
+class PTZController(CoalescingWriter):
+    """Maps UI zoom / pan onto hardware controls and applies them off the UI thread."""
+
+    def __init__(self, backend, max_pan=500, on_applied=None):
+        super().__init__(on_applied)
+        self.backend = backend
+        self.max_pan = max_pan
+        # name -> (minimum, maximum, default) for supported controls only
+        self.ranges = {}
+        for name in CONTROLS:
+            info = backend.query(name) if backend else None
+            if info and info[1] > info[0]:
+                self.ranges[name] = info
+
+    def supports(self, name):
+        return name in self.ranges
+
+    @property
+    def max_hardware_zoom(self):
+        """Largest zoom factor the sensor zoom control provides (1.0 if none)."""
+        if not self.supports("zoom"):
+            return 1.0
+        minimum, maximum, _ = self.ranges["zoom"]
+        # UVC zoom_absolute is proportional to magnification when minimum > 0 (Brio: 100..500)
+        return maximum / minimum if minimum > 0 else 1.0
+
+    def split_view(self, zoom, pan_x, pan_y):
+        """Return the (zoom, pan_x, pan_y) left for the digital crop after hardware PTZ."""
+        hw_zoom = min(zoom, self.max_hardware_zoom)
+        digital_zoom = zoom / hw_zoom if hw_zoom > 0 else zoom
+        hw_pan = self.supports("pan") and self.supports("tilt")
+        if hw_pan:
+            return digital_zoom, 0, 0
+        return digital_zoom, pan_x, pan_y
+
+    def request_view(self, zoom, pan_x, pan_y):
+        """Queue hardware writes for a UI zoom / pan state (coalesced)."""
+        if self.supports("zoom"):
+            minimum, maximum, _ = self.ranges["zoom"]
+            hw_zoom = min(zoom, self.max_hardware_zoom)
+            self.set("zoom", int(round(max(minimum, min(maximum, minimum * hw_zoom)))))
+        if self.supports("pan") and self.supports("tilt"):
+            # Positive pan_x moves right; positive pan_y moves down, UVC tilt is positive up
+            self.set("pan", self._scale("pan", pan_x))
+            self.set("tilt", self._scale("tilt", -pan_y))
+
+    def _scale(self, name, offset):
+        minimum, maximum, _ = self.ranges[name]
+        center = (minimum + maximum) / 2.0
+        fraction = max(-1.0, min(1.0, offset / float(self.max_pan)))
+        return int(round(center + fraction * (maximum - minimum) / 2.0))
+
+    def apply_batch(self, batch):
+        results = {}
+        for name, value in batch.items():
+            self.backend.set(name, value)
+            try:
+                results[name] = self.backend.get(name)
+            except Exception:
+                results[name] = None
+        return results
+
+    def stop(self):
+        super().stop()
+        if self.backend:
+            self.backend.close()
@@ -0,0 +1,410 @@
+"""Background replication of committed captures to secondary storage.
+
+Every saved capture is appended to a persistent outbox journal (JSON lines next
+to the station settings). A worker thread drains the outbox in batches, copies
+each file to the target while hashing it, verifies the copy by checksum and only
+then records it as done, so a restart resumes exactly where it stopped.
+
+Targets:
+- DirectoryTarget: a mounted share or local stand-in directory. Copies go to a
+  .part file first (resumed after a restart) and are renamed into place once the
+  checksum of the written file matches the source.
+- HttpTarget: PUT <url>/<SN>/<file> with an X-Checksum-SHA256 header; the server
+  must echo the checksum of what it stored (see tools/replication_sink.py).
+
+When a capture is superseded (the one-image-per-orientation rule), its replica
+is deleted from the target too: the removal is journalled like an upload and
+sent as a delete (file removal / HTTP DELETE) in the same batches.
+
+Transfers are throttled to max_bytes_per_sec and pause while a capture is being
+taken, so replication never competes with capture I/O.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+CHUNK_SIZE = 1024 * 1024
+
+DEFAULT_REPLICATION_CONFIG = {
+    "enabled": False,
+    # Directory path (mounted share) or http(s):// URL; empty = disabled
+    "target": "",
+    "batch_size": 8,
+    "max_bytes_per_sec": 20 * 1024 * 1024,
+    # Seconds to wait before retrying after a failed transfer
+    "retry_interval": 30.0,
+}
+
+
+def file_sha256(path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RateLimiter:
+    """Token bucket limiting throughput to rate bytes per second (0 = unlimited)."""
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate or 0)
+        self.clock = clock
+        self.sleep = sleep
+        self._allowance = self.rate
+        self._last = clock()
+
+    def consume(self, nbytes):
+        if self.rate <= 0:
+            return
+        now = self.clock()
+        self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+        self._last = now
+        self._allowance -= nbytes
+        if self._allowance < 0:
+            self.sleep(-self._allowance / self.rate)
+
+
+class DirectoryTarget:
+    """Replicate into a directory tree that mirrors the capture root."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def describe(self):
+        return self.root
+
+    def send(self, source, rel_path, read_chunks):
+        dest = os.path.join(self.root, rel_path)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        part = dest + ".part"
+
+        # Resume a partial copy from a previous run: re-hash what is there, append the rest
+        digest = hashlib.sha256()
+        offset = 0
+        if os.path.exists(part):
+            offset = os.path.getsize(part)
+            with open(source, "rb") as src, open(part, "rb") as existing:
+                for chunk in iter(lambda: existing.read(CHUNK_SIZE), b""):
+                    if chunk != src.read(len(chunk)):
+                        offset = 0
+                        digest = hashlib.sha256()
+                        break
+                    digest.update(chunk)
+
+        with open(part, "r+b" if offset else "wb") as out:
+            out.seek(offset)
+            out.truncate()
+            for chunk in read_chunks(source, offset):
+                out.write(chunk)
+                digest.update(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+
+        source_sum = digest.hexdigest()
+        if file_sha256(part) != source_sum:
+            os.remove(part)
+            raise IOError(f"checksum mismatch after copy: {rel_path}")
+        os.replace(part, dest)
+        return source_sum
+
+    def delete(self, rel_path):
+        """Remove a replica (and any partial copy); missing files are fine."""
+        dest = os.path.join(self.root, rel_path)
+        for path in (dest, dest + ".part"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class HttpTarget:
+    """Replicate by HTTP PUT; the response must carry the stored file's SHA-256."""
+
+    def __init__(self, url, timeout=30.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def describe(self):
+        return self.url
+
+    def send(self, source, rel_path, read_chunks):
+        source_sum = file_sha256(source)
+        request = urllib.request.Request(self._url(rel_path), data=read_chunks(source, 0), method="PUT")
+        request.add_header("Content-Length", str(os.path.getsize(source)))
+        request.add_header("Content-Type", "application/octet-stream")
+        request.add_header("X-Checksum-SHA256", source_sum)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            stored_sum = response.headers.get("X-Checksum-SHA256", "")
+        if stored_sum.lower() != source_sum:
+            raise IOError(f"checksum mismatch reported by {self.url}: {rel_path}")
+        return source_sum
+
+    def _url(self, rel_path):
+        return f"{self.url}/{urllib.parse.quote(rel_path.replace(os.sep, '/'))}"
+
+    def delete(self, rel_path):
+        """DELETE a replica; 404 (never stored or already gone) counts as done."""
+        request = urllib.request.Request(self._url(rel_path), method="DELETE")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                raise
+
+
+def open_target(target):
+    """DirectoryTarget or HttpTarget for a settings value; None if empty."""
+    if not target:
+        return None
+    if target.startswith(("http://", "https://")):
+        return HttpTarget(target)
+    return DirectoryTarget(target)
+
+
+class ReplicationOutbox:
+    """Append-only journal of queued / done captures, compacted on load."""
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = {}  # rel_path -> entry, insertion ordered
+        self.done = {}  # rel_path -> sha256
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    rel = record.get("rel")
+                    if record.get("op") == "queued":
+                        self.pending[rel] = record
+                        self.done.pop(rel, None)
+                    elif record.get("op") == "delete":
+                        # The replica stays "done" until the target confirms the delete
+                        self.pending.pop(rel, None)
+                        self.pending[rel] = record
+                    elif record.get("op") == "done":
+                        self.pending.pop(rel, None)
+                        self.done[rel] = record.get("sha256")
+                    elif record.get("op") == "dropped":
+                        self.pending.pop(rel, None)
+                    elif record.get("op") == "deleted":
+                        self.pending.pop(rel, None)
+                        self.done.pop(rel, None)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Replication: could not read outbox {self.path}: {e}")
+        self._compact()
+
+    def _compact(self):
+        records = [{"op": "done", "rel": rel, "sha256": s} for rel, s in self.done.items()]
+        records += list(self.pending.values())
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"Replication: could not compact outbox: {e}")
+
+    def _append(self, records):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def enqueue(self, path, rel):
+        record = {"op": "queued", "rel": rel, "path": path, "queued": time.time()}
+        with self._lock:
+            self.pending.pop(rel, None)
+            self.pending[rel] = record
+            self.done.pop(rel, None)
+            self._append([record])
+
+    def remove(self, rel):
+        """Forget a superseded capture: queue a delete if it was replicated, else drop it.
+
+        Returns True if a delete was queued.
+        """
+        with self._lock:
+            if rel in self.done:
+                record = {"op": "delete", "rel": rel, "queued": time.time()}
+                self.pending.pop(rel, None)
+                self.pending[rel] = record
+                self._append([record])
+                return True
+            if rel in self.pending:
+                self.pending.pop(rel)
+                self._append([{"op": "dropped", "rel": rel}])
+            return False
+
+    def next_batch(self, size):
+        with self._lock:
+            return list(self.pending.values())[:size]
+
+    def complete(self, done, dropped=(), deleted=()):
+        """Record a batch result: done is [(rel, sha256)], dropped and deleted are [rel]."""
+        records = [{"op": "done", "rel": rel, "sha256": s} for rel, s in done]
+        records += [{"op": "dropped", "rel": rel} for rel in dropped]
+        records += [{"op": "deleted", "rel": rel} for rel in deleted]
+        if not records:
+            return
+        with self._lock:
+            for rel, s in done:
+                self.pending.pop(rel, None)
+                self.done[rel] = s
+            for rel in dropped:
+                self.pending.pop(rel, None)
+            for rel in deleted:
+                self.pending.pop(rel, None)
+                self.done.pop(rel, None)
+            self._append(records)
+
+    def is_replicated(self, rel):
+        with self._lock:
+            return rel in self.done and rel not in self.pending
+
+
+class ReplicationWorker:
+    """Drains the outbox to a target in throttled, checksum-verified batches."""
+
+    def __init__(self, capture_root, outbox_path, config=None, target=None):
+        self.config = dict(DEFAULT_REPLICATION_CONFIG)
+        self.config.update(config or {})
+        self.capture_root = capture_root
+        self.outbox = ReplicationOutbox(outbox_path)
+        self.target = target if target is not None else open_target(self.config["target"])
+        self.limiter = RateLimiter(self.config["max_bytes_per_sec"])
+        self.last_error = None
+        self.bytes_sent = 0
+        self._idle = threading.Event()  # cleared while a capture is in progress
+        self._idle.set()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return bool(self.config["enabled"]) and self.target is not None
+
+    @property
+    def pending_count(self):
+        return len(self.outbox.pending)
+
+    def start(self):
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self.outbox.load()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        print(f"Replication: {self.pending_count} queued capture(s) -> {self.target.describe()}")
+
+    def stop(self):
+        self._running = False
+        self._idle.set()
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+
+    def relative_path(self, path):
+        return os.path.relpath(os.path.abspath(path), os.path.abspath(self.capture_root))
+
+    def enqueue(self, path):
+        """Queue a committed capture (persisted immediately, sent in the background)."""
+        if not self.enabled:
+            return
+        try:
+            self.outbox.enqueue(path, self.relative_path(path))
+        except Exception as e:
+            print(f"Replication: could not queue {path}: {e}")
+            return
+        self._wake.set()
+
+    def remove(self, paths):
+        """Delete the replicas of superseded captures from the target (in the background)."""
+        if not self.enabled:
+            return
+        queued = False
+        for path in paths:
+            try:
+                queued = self.outbox.remove(self.relative_path(path)) or queued
+            except Exception as e:
+                print(f"Replication: could not queue delete of {path}: {e}")
+        if queued:
+            self._wake.set()
+
+    def is_replicated(self, path):
+        return self.outbox.is_replicated(self.relative_path(path))
+
+    def capture_started(self):
+        """Pause transfers between chunks until capture_finished()."""
+        self._idle.clear()
+
+    def capture_finished(self):
+        self._idle.set()
+
+    def _read_chunks(self, source, offset):
+        with open(source, "rb") as f:
+            f.seek(offset)
+            while True:
+                self._idle.wait()
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                self.limiter.consume(len(chunk))
+                self.bytes_sent += len(chunk)
+                yield chunk
+
+    def _run(self):
+        while self._running:
+            batch = self.outbox.next_batch(int(self.config["batch_size"]))
+            if not batch:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            done, dropped, deleted, failed = [], [], [], False
+            for entry in batch:
+                if not self._running:
+                    break
+                rel = entry["rel"]
+                try:
+                    if entry.get("op") == "delete":
+                        self.target.delete(rel)
+                        deleted.append(rel)
+                    elif not os.path.exists(entry["path"]):
+                        # Superseded by a newer capture (one image per orientation rule)
+                        dropped.append(rel)
+                    else:
+                        done.append((rel, self.target.send(entry["path"], rel, self._read_chunks)))
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"Replication: {rel} failed: {e}")
+                    failed = True
+                    break
+            try:
+                self.outbox.complete(done, dropped, deleted)
+            except Exception as e:
+                print(f"Replication: could not update outbox: {e}")
+                failed = True
+
+            if failed and self._running:
+                # Target unreachable or flaky; keep the queue and retry later
+                self._wake.wait(float(self.config["retry_interval"]))
+                self._wake.clear()
@@ -0,0 +1,174 @@
+"""Station settings for the Brio capture app.
+
+Defaults live in DEFAULT_SETTINGS. A station can override any of them with an
+optional JSON file at C:/brio_captures/settings.json; nested sections are merged
+one level deep so a file only needs to list the keys it changes.
+"""
+import copy
+import json
+import os
+
+BASE_DIR = "C:/brio_captures"
+SETTINGS_PATH = os.path.join(BASE_DIR, "settings.json")
+# Persistent replication queue (see replication.ReplicationOutbox)
+REPLICATION_OUTBOX_PATH = os.path.join(BASE_DIR, "replication_outbox.jsonl")
+# On-disk gallery thumbnail cache (see thumbnails.ThumbnailCache)
+THUMBNAIL_CACHE_DIR = os.path.join(BASE_DIR, "thumbnails")
+# Capture-root usage ledger (see storage_manager.StorageManager)
+STORAGE_LEDGER_PATH = os.path.join(BASE_DIR, "storage_ledger.json")
+# Per-product TOP / BOTTOM reference images (see placement_check.PlacementChecker)
+PLACEMENT_REFERENCE_DIR = os.path.join(BASE_DIR, "references")
+# Lens calibration and the checkerboard stills it is made from (see lens_correction.py)
+LENS_CALIBRATION_PATH = os.path.join(BASE_DIR, "lens_calibration.json")
+LENS_CALIBRATION_FRAMES_DIR = os.path.join(BASE_DIR, "calibration")
+
+DEFAULT_SETTINGS = {
+    # Root folder for per-SN capture subfolders
+    "capture_root": "C:/brio_captures/captures",
+    # Run camera I/O and frame processing in a child process (see frame_transport.py)
+    "process_engine": False,
+    # Save zoomed captures as the native-resolution crop (zoom/pan/crop recorded in
+    # the PNG) instead of upscaling them back to the sensor size
+    "native_roi_capture": False,
+    # Pre-save capture checks (see capture_quality.DEFAULT_GATE_CONFIG for all keys).
+    # Opt-in: once enabled, "warn" only flags captures, "retry" / "reject" change what is saved
+    "quality_gate": {
+        "enabled": False,
+        "mode": "warn",
+        "max_retries": 2,
+        "min_sharpness": 40.0,
+        "max_highlight_ratio": 0.05,
+        "max_shadow_ratio": 0.10,
+    },
+    # Average several consecutive frames into each still (see temporal_denoise.py).
+    # rejection "none", "sigma" (drop outlier pixel values) or "median"
+    "temporal_denoise": {
+        "enabled": False,
+        "frames": 8,
+        "rejection": "none",
+        "max_shift_px": 1.5,
+    },
+    # Board shift / rotation check against the product's reference image (see
+    # placement_check.DEFAULT_PLACEMENT_CONFIG for all keys). mode "warn" or "reject"
+    "placement_check": {
+        "enabled": False,
+        "mode": "warn",
+        "product": "",
+        "sn_prefix_length": 0,
+        "max_shift_px": 40.0,
+        "max_rotation_deg": 1.0,
+        "min_score": 0.5,
+    },
+    # Lens distortion correction of captures (and optionally the preview), active once
+    # lens_calibration.json exists (see lens_correction.DEFAULT_LENS_CONFIG).
+    # alpha 1.0 keeps the field of view, so captures frame like the uncorrected preview
+    "lens_correction": {
+        "enabled": True,
+        "preview": False,
+        "alpha": 1.0,
+        "pattern": [9, 6],
+        "min_images": 8,
+    },
+    # Slider ranges (min, max) for camera properties; Brio values under DirectShow
+    "camera_properties": {
+        "exposure": [-11, -2],
+        "gain": [0, 255],
+        "white_balance": [2000, 7500],
+    },
+    # Use the camera's own zoom/pan/tilt controls (V4L2 ioctls on Linux, DirectShow
+    # properties on Windows); the digital crop covers anything the sensor can't do
+    "hardware_ptz": False,
+    # Control ranges (min, max) for the DirectShow path, which cannot query them
+    "ptz_ranges": {
+        "zoom": [100, 500],
+        "pan": [-36000, 36000],
+        "tilt": [-36000, 36000],
+    },
+    # Keep other cameras opened with their stream mode negotiated so switching to them
+    # is instant (see camera_standby.py). indexes [] = every detected camera
+    "camera_standby": {
+        "enabled": False,
+        "indexes": [],
+        "keepalive_interval": 1.0,
+    },
+    # How preview frames are put on screen (see preview_display.py): "label", "canvas",
+    # "ppm", or "auto" to benchmark them at startup and keep the fastest
+    "preview_display": {
+        "backend": "auto",
+        "benchmark_frames": 10,
+    },
+    # Preview overlays (see preview_overlays.OverlayAnalyzer): analysis rate limit in
+    # seconds, width of the decimated analysis copy, focus-peaking edge threshold
+    "overlays": {
+        "interval": 0.2,
+        "decimate_width": 480,
+        "peaking_threshold": 60,
+    },
+    # Copy every committed capture to secondary storage (see replication.py). target is a
+    # directory (mounted share) or an http(s):// URL; max_bytes_per_sec 0 = unthrottled
+    "replication": {
+        "enabled": False,
+        "target": "",
+        "batch_size": 8,
+        "max_bytes_per_sec": 20 * 1024 * 1024,
+        "retry_interval": 30.0,
+    },
+    # Capture-root quota, free-space floor and retention (see storage_manager.py). Only
+    # replicated SN folders are deleted unless delete_unreplicated is set
+    "storage": {
+        "quota_gb": 0,
+        "min_free_gb": 5.0,
+        "warn_free_gb": 20.0,
+        "retention_days": 0,
+        "delete_unreplicated": False,
+        "save_interval": 60.0,
+    },
+    # Recent-captures gallery: thumbnails shown next to the current SN's TOP / BOTTOM,
+    # and how many thumbnails stay decoded in memory
+    "gallery": {
+        "recent_count": 4,
+        "memory_capacity": 48,
+    },
+    # Station metrics (see station_metrics.py): Prometheus text on http://bind:port/metrics
+    # and a JSON-lines snapshot every interval seconds, rotated at max_bytes
+    "metrics": {
+        "enabled": False,
+        "station": "",
+        "bind": "127.0.0.1",
+        "port": 9464,
+        "jsonl_path": "C:/brio_captures/metrics/metrics.jsonl",
+        "interval": 30.0,
+        "max_bytes": 10 * 1024 * 1024,
+        "backups": 5,
+    },
+    # Preview stream watchdog (see stream_watchdog.StreamWatchdog)
+    "watchdog": {
+        "stall_timeout": 3.0,
+        "max_failed_reads": 10,
+        "max_duplicate_frames": 60,
+    },
+}
+
+
+def load_settings(path=SETTINGS_PATH):
+    """Return DEFAULT_SETTINGS merged with the JSON file at path (if present)."""
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+    except FileNotFoundError:
+        return settings
+    except Exception as e:
+        print(f"Settings: could not read {path}: {e}")
+        return settings
+
+    if not isinstance(overrides, dict):
+        print(f"Settings: ignoring {path} (expected a JSON object)")
+        return settings
+
+    for key, value in overrides.items():
+        if isinstance(settings.get(key), dict) and isinstance(value, dict):
+            settings[key].update(value)
+        else:
+            settings[key] = value
+    return settings
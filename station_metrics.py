@@ -0,0 +1,257 @@
+"""Station metrics: counters, gauges and histograms exported for fleet monitoring.
+
+The hot path stays cheap: Counter.inc() is a plain attribute add (each counter
+has a single writer thread, so no lock is needed), Histogram.observe() only
+appends to a deque (atomic in CPython) and values that already exist elsewhere
+(watchdog frame counts, replication queue depth, disk usage) are read by
+callback gauges at export time only. Samples are folded into histogram buckets
+by whoever exports them.
+
+MetricsExporter serves the registry in Prometheus text format on a local HTTP
+port (GET /metrics) and appends a JSON snapshot every `interval` seconds to a
+JSON-lines file that is rotated by size.
+"""
+import bisect
+import collections
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds (preview frames up to slow 4K PNG saves)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DEFAULT_METRICS_CONFIG = {
+    "enabled": False,
+    "bind": "127.0.0.1",
+    "port": 9464,
+    # JSON-lines snapshot file ("" = no file) and how often a line is written
+    "jsonl_path": "",
+    "interval": 30.0,
+    "max_bytes": 10 * 1024 * 1024,
+    "backups": 5,
+}
+
+
+def _escape(text, quotes=True):
+    """Escape for the Prometheus text format: backslash, newline and (in label values) quotes."""
+    text = str(text).replace("\\", "\\\\").replace("\n", "\\n")
+    return text.replace('"', '\\"') if quotes else text
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Counter:
+    """Monotonic counter; inc() must only be called from one thread."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=None, fn=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        # Optional callback returning the current total (counts kept elsewhere)
+        self.fn = fn
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def read(self):
+        return self.fn() if self.fn is not None else self.value
+
+    def samples(self):
+        return [(self.name, self.labels, self.read())]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, set directly or read from a callback."""
+
+    kind = "gauge"
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """Latency histogram; observe() appends to a deque and buckets are folded on export."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=None, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._pending = collections.deque()
+        self._fold_lock = threading.Lock()
+
+    def observe(self, value):
+        self._pending.append(value)
+
+    def _fold(self):
+        with self._fold_lock:
+            while True:
+                try:
+                    value = self._pending.popleft()
+                except IndexError:
+                    break
+                self.counts[bisect.bisect_left(self.buckets, value)] += 1
+                self.sum += value
+                self.count += 1
+
+    def samples(self):
+        self._fold()
+        samples = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            samples.append((self.name + "_bucket", dict(self.labels, le=f"{bound:g}"), cumulative))
+        samples.append((self.name + "_bucket", dict(self.labels, le="+Inf"), self.count))
+        samples.append((self.name + "_sum", self.labels, self.sum))
+        samples.append((self.name + "_count", self.labels, self.count))
+        return samples
+
+
+class MetricsRegistry:
+    """Named metrics with constant labels (e.g. the station name) added on export."""
+
+    def __init__(self, const_labels=None):
+        self.const_labels = const_labels or {}
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=None, fn=None):
+        return self._add(Counter(name, help_text, labels, fn))
+
+    def gauge(self, name, help_text, labels=None, fn=None):
+        return self._add(Gauge(name, help_text, labels, fn))
+
+    def histogram(self, name, help_text, labels=None, buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def _collect(self):
+        for metric in list(self._metrics):
+            try:
+                yield metric, metric.samples()
+            except Exception as e:
+                print(f"Metrics: {metric.name} failed: {e}")
+
+    def render_prometheus(self):
+        lines = []
+        described = set()
+        for metric, samples in self._collect():
+            if metric.name not in described:
+                described.add(metric.name)
+                lines.append(f"# HELP {metric.name} {_escape(metric.help, quotes=False)}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{_format_labels(dict(self.const_labels, **labels))} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Flat {sample name with labels: value} dict for the JSON-lines file."""
+        values = {}
+        for metric, samples in self._collect():
+            for name, labels, value in samples:
+                if value is not None:
+                    values[name + _format_labels(labels)] = value
+        return values
+
+
+class MetricsExporter:
+    """Serves /metrics over HTTP and writes rotated JSON-lines snapshots."""
+
+    def __init__(self, registry, config=None):
+        self.registry = registry
+        self.config = dict(DEFAULT_METRICS_CONFIG)
+        self.config.update(config or {})
+        self._server = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not self.config["enabled"]:
+            return
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self.config["bind"], int(self.config["port"])), MetricsHandler)
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            print(f"Metrics: serving http://{self.config['bind']}:{self.config['port']}/metrics")
+        except OSError as e:
+            print(f"Metrics: could not listen on port {self.config['port']}: {e}")
+            self._server = None
+
+        if self.config["jsonl_path"]:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+
+    def _rotate(self, path):
+        backups = int(self.config["backups"])
+        for n in range(backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{n}"):
+                os.replace(f"{path}.{n}", f"{path}.{n + 1}")
+        if backups > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+
+    def write_snapshot(self):
+        path = self.config["jsonl_path"]
+        record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "labels": self.registry.const_labels,
+                  "metrics": self.registry.snapshot()}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) >= self.config["max_bytes"]:
+            self._rotate(path)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _run(self):
+        while not self._stop.wait(float(self.config["interval"])):
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                print(f"Metrics: could not write snapshot: {e}")
+        try:
+            self.write_snapshot()
+        except Exception:
+            pass
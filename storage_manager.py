@@ -0,0 +1,302 @@
+"""Capture-root disk quota, free-space floor and age-based retention.
+
+Usage is tracked incrementally: the capture path reports every file it writes
+and every file it deletes, and StorageManager keeps a per-file ledger (relative
+path -> [bytes, mtime]) that is saved to JSON in the background. The tree is
+walked only once, when no ledger exists yet; writes and deletes reported while
+the worker loads or scans are kept when its result is merged in.
+
+After each write a worker thread checks the quota (bytes used by captures) and
+the free-space floor of the capture drive. Under pressure, and for SN folders
+older than retention_days, whole SN folders are deleted oldest first, but only
+if every file in them has already been replicated (see replication.py), unless
+delete_unreplicated is set.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+
+GB = 1024 ** 3
+
+DEFAULT_STORAGE_CONFIG = {
+    # Maximum bytes of captures under the capture root (0 = no quota)
+    "quota_gb": 0,
+    # Free space to keep on the capture drive; retention frees space below this
+    "min_free_gb": 5.0,
+    # Warn before capture below this much free space
+    "warn_free_gb": 20.0,
+    # Delete replicated SN folders older than this many days (0 = keep)
+    "retention_days": 0,
+    # Allow quota / retention to delete captures that were never replicated
+    "delete_unreplicated": False,
+    # Seconds between ledger saves while it has unsaved changes
+    "save_interval": 60.0,
+}
+
+
+class StorageManager:
+    """Incremental capture-root usage accounting with quota and retention."""
+
+    def __init__(self, capture_root, ledger_path, config=None, is_replicated=None, on_removed=None,
+                 clock=time.time):
+        self.config = dict(DEFAULT_STORAGE_CONFIG)
+        self.config.update(config or {})
+        self.capture_root = capture_root
+        self.ledger_path = ledger_path
+        # is_replicated(path) -> bool; on_removed(paths) after retention deletes files
+        self.is_replicated = is_replicated
+        self.on_removed = on_removed
+        self.clock = clock
+        self.files = {}  # rel path -> [bytes, mtime]
+        self.used_bytes = 0
+        self.last_write_bytes = 0
+        self.last_error = None
+        self._dirty = False
+        # Rel paths updated while the worker loads / scans the ledger (None = not tracking)
+        self._touched = None
+        self._last_save = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    # --- ledger ---
+
+    def _rel(self, path):
+        return os.path.relpath(os.path.abspath(path), os.path.abspath(self.capture_root)).replace(os.sep, "/")
+
+    def load(self):
+        """Load the ledger; returns False if the tree has to be scanned instead."""
+        try:
+            with open(self.ledger_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            files = {rel: list(entry) for rel, entry in data.get("files", {}).items()}
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Storage: could not read ledger {self.ledger_path}: {e}")
+            return False
+        self._install(files, dirty=False)
+        return True
+
+    def scan(self):
+        """Rebuild the ledger by walking the capture root (first run only)."""
+        files = {}
+        for dirpath, _, names in os.walk(self.capture_root):
+            for name in names:
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                files[self._rel(full)] = [st.st_size, st.st_mtime]
+        self._install(files, dirty=True)
+
+    def _install(self, files, dirty):
+        """Replace the ledger with files, keeping entries updated since tracking started."""
+        with self._lock:
+            if self._touched:
+                for rel in self._touched:
+                    if rel in self.files:
+                        files[rel] = self.files[rel]
+                    else:
+                        files.pop(rel, None)
+                dirty = True
+            self._touched = None
+            self.files = files
+            self.used_bytes = sum(entry[0] for entry in files.values())
+            self._dirty = self._dirty or dirty
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"files": dict(self.files), "saved": self.clock()}
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.ledger_path) or ".", exist_ok=True)
+            tmp = self.ledger_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.ledger_path)
+            self._last_save = self.clock()
+        except Exception as e:
+            with self._lock:
+                self._dirty = True
+            print(f"Storage: could not save ledger: {e}")
+
+    def file_written(self, path, nbytes):
+        """Account for a capture (or sidecar) just written."""
+        rel = self._rel(path)
+        with self._lock:
+            previous = self.files.get(rel)
+            self.used_bytes += nbytes - (previous[0] if previous else 0)
+            self.files[rel] = [nbytes, self.clock()]
+            self._dirty = True
+            if self._touched is not None:
+                self._touched.add(rel)
+        self.last_write_bytes = nbytes
+        self._wake.set()
+
+    def file_replaced(self, old_path, new_path, nbytes):
+        """Account for a capture re-encoded in place or under a new name (keeps its mtime)."""
+        old_rel, new_rel = self._rel(old_path), self._rel(new_path)
+        with self._lock:
+            previous = self.files.pop(old_rel, None)
+            overwritten = self.files.pop(new_rel, None)
+            self.used_bytes += nbytes - sum(entry[0] for entry in (previous, overwritten) if entry)
+            kept = previous or overwritten  # overwritten only: the update is being replayed
+            self.files[new_rel] = [nbytes, kept[1] if kept else self.clock()]
+            self._dirty = True
+            if self._touched is not None:
+                self._touched.update((old_rel, new_rel))
+
+    def files_removed(self, paths):
+        """Account for deleted files (unknown paths are ignored)."""
+        with self._lock:
+            for path in paths:
+                rel = self._rel(path)
+                entry = self.files.pop(rel, None)
+                if entry:
+                    self.used_bytes -= entry[0]
+                    self._dirty = True
+                if self._touched is not None:
+                    self._touched.add(rel)
+
+    # --- limits ---
+
+    def free_bytes(self):
+        try:
+            return shutil.disk_usage(self.capture_root).free
+        except OSError:
+            return None
+
+    def expected_write_bytes(self, frame_bytes=0):
+        """Likely size of the next capture: last write, else average ledger image, else frame_bytes."""
+        if self.last_write_bytes:
+            return self.last_write_bytes
+        with self._lock:
+            sizes = [entry[0] for rel, entry in self.files.items() if not rel.endswith(".json")]
+        if sizes:
+            return sum(sizes) // len(sizes)
+        return frame_bytes
+
+    def check_before_capture(self, frame_bytes=0):
+        """Return (level, message): level is 'ok', 'warn' or 'block'.
+
+        frame_bytes (the raw still size) bounds the expected file size until a
+        capture has been written or the ledger knows any.
+        """
+        free = self.free_bytes()
+        expected = max(self.expected_write_bytes(frame_bytes), 1) * 2
+        if free is not None and free < expected:
+            return "block", f"Disk full: {free / GB:.1f} GB free"
+        quota = self.config["quota_gb"] * GB
+        if quota and self.used_bytes + expected > quota:
+            return "warn", f"Capture quota nearly used ({self.used_bytes / GB:.1f} / {quota / GB:.0f} GB)"
+        if free is not None and free < self.config["warn_free_gb"] * GB:
+            return "warn", f"Low disk space: {free / GB:.1f} GB free"
+        return "ok", ""
+
+    def sn_folders(self):
+        """[(newest mtime, sn, bytes, [rel paths])] for every SN folder, oldest first."""
+        folders = {}
+        with self._lock:
+            for rel, (size, mtime) in self.files.items():
+                sn = rel.split("/", 1)[0] if "/" in rel else ""
+                if not sn:
+                    continue
+                newest, total, rels = folders.get(sn, (0.0, 0, []))
+                rels.append(rel)
+                folders[sn] = (max(newest, mtime), total + size, rels)
+        return sorted((newest, sn, total, rels) for sn, (newest, total, rels) in folders.items())
+
+    def _deletable(self, rels):
+        if self.config["delete_unreplicated"]:
+            return True
+        if self.is_replicated is None:
+            return False
+        return all(self.is_replicated(os.path.join(self.capture_root, rel)) for rel in rels
+                   if not rel.endswith(".json"))
+
+    def _remove_sn(self, sn, rels):
+        removed = [os.path.join(self.capture_root, rel) for rel in rels]
+        shutil.rmtree(os.path.join(self.capture_root, sn), ignore_errors=True)
+        self.files_removed(removed)
+        print(f"Storage: removed SN folder {sn} ({len(rels)} file(s))")
+        if self.on_removed:
+            try:
+                self.on_removed(removed)
+            except Exception:
+                pass
+
+    def enforce(self):
+        """Apply retention, quota and free-space floor; returns the SN folders removed."""
+        quota = self.config["quota_gb"] * GB
+        floor = self.config["min_free_gb"] * GB
+        max_age = self.config["retention_days"] * 86400
+        now = self.clock()
+        freed = 0
+        removed = []
+        free = self.free_bytes()
+        for newest, sn, total, rels in self.sn_folders():
+            expired = max_age and now - newest > max_age
+            over_quota = quota and self.used_bytes > quota
+            low_space = free is not None and free + freed < floor
+            if not (expired or over_quota or low_space):
+                if not max_age:
+                    break  # oldest first: nothing further down is expired either
+                continue
+            if not self._deletable(rels):
+                continue
+            self._remove_sn(sn, rels)
+            freed += total
+            removed.append(sn)
+        return removed
+
+    # --- worker ---
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+        self.save()
+
+    def request_enforce(self):
+        self._wake.set()
+
+    def _run(self):
+        # Captures may be written while the ledger is read or the tree is walked
+        with self._lock:
+            self._touched = set()
+        if not self.load():
+            try:
+                self.scan()
+                print(f"Storage: indexed {len(self.files)} file(s), {self.used_bytes / GB:.2f} GB")
+            except Exception as e:
+                print(f"Storage: initial scan failed: {e}")
+        with self._lock:
+            self._touched = None
+        self._wake.set()
+        while self._running:
+            self._wake.wait(float(self.config["save_interval"]))
+            self._wake.clear()
+            if not self._running:
+                break
+            try:
+                self.enforce()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Storage: retention failed: {e}")
+            if self.clock() - self._last_save >= float(self.config["save_interval"]):
+                self.save()
@@ -0,0 +1,178 @@
+"""Stream health watchdog and reconnect helpers.
+
+StreamWatchdog is fed every read result from the preview loop. It tracks frame
+cadence, inter-frame gaps and repeated (frozen) frames and reports a stall reason
+once the stream looks dead. The loop then releases the device and calls
+reconnect_with_backoff() to reopen it.
+
+Nothing here touches OpenCV devices directly: the clock, the sleep function and
+the source factory are injected, so a fake source that stalls on purpose can
+drive the whole recovery path without a camera.
+"""
+import collections
+import time
+import zlib
+
+import numpy as np
+
+
+def frame_fingerprint(frame, step=16):
+    """Cheap CRC of a strided sample of frame, used to spot repeated buffers."""
+    sample = np.ascontiguousarray(frame[::step, ::step])
+    return zlib.crc32(sample)
+
+
+class Backoff:
+    """Exponential backoff delays: initial, initial*factor, ... capped at maximum."""
+
+    def __init__(self, initial=0.5, factor=2.0, maximum=10.0):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self._next = initial
+
+    def next(self):
+        delay = self._next
+        self._next = min(self._next * self.factor, self.maximum)
+        return delay
+
+    def reset(self):
+        self._next = self.initial
+
+
+def reconnect_with_backoff(open_source, keep_trying, backoff=None, sleep=time.sleep):
+    """Call open_source() until it returns a source or keep_trying() turns False.
+
+    open_source must return a ready (opened and configured) source or None.
+    Returns (source or None, number of attempts).
+    """
+    backoff = backoff or Backoff()
+    attempts = 0
+    while keep_trying():
+        attempts += 1
+        try:
+            source = open_source()
+        except Exception as e:
+            print(f"Reconnect attempt {attempts} failed: {e}")
+            source = None
+        if source is not None:
+            return source, attempts
+        delay = backoff.next()
+        print(f"Reconnect attempt {attempts} failed, retrying in {delay:.1f}s")
+        sleep(delay)
+    return None, attempts
+
+
+class StreamWatchdog:
+    """Tracks frame cadence and decides when a stream has stalled."""
+
+    def __init__(self, stall_timeout=3.0, max_failed_reads=10, max_duplicate_frames=30,
+                 clock=time.monotonic, history=50):
+        self.stall_timeout = stall_timeout
+        self.max_failed_reads = max_failed_reads
+        self.max_duplicate_frames = max_duplicate_frames
+        self.clock = clock
+
+        self.frames = 0
+        self.failed_reads = 0
+        self.duplicate_frames = 0
+        self.consecutive_failures = 0
+        self.consecutive_duplicates = 0
+        self.last_frame_time = None
+        self.last_gap = 0.0
+        self.max_gap = 0.0
+        self.mean_gap = 0.0  # exponential moving average of inter-frame gaps
+        self._last_fingerprint = None
+
+        self.reconnects = 0
+        self.downtime_total = 0.0
+        self._down_since = None
+        self._lost_reason = ""
+        # Recent reconnect events: dicts with time, reason, downtime and attempts
+        self.events = collections.deque(maxlen=history)
+
+    def start(self):
+        """Start (or restart) cadence tracking from now."""
+        self.last_frame_time = self.clock()
+        self.consecutive_failures = 0
+        self.consecutive_duplicates = 0
+        self._last_fingerprint = None
+
+    def frame_received(self, frame):
+        """Record a successful read."""
+        now = self.clock()
+        if self.last_frame_time is not None:
+            gap = now - self.last_frame_time
+            self.last_gap = gap
+            self.max_gap = max(self.max_gap, gap)
+            self.mean_gap = gap if self.frames == 0 else 0.9 * self.mean_gap + 0.1 * gap
+        self.last_frame_time = now
+        self.frames += 1
+        self.consecutive_failures = 0
+
+        fingerprint = frame_fingerprint(frame)
+        if fingerprint == self._last_fingerprint:
+            self.duplicate_frames += 1
+            self.consecutive_duplicates += 1
+        else:
+            self.consecutive_duplicates = 0
+        self._last_fingerprint = fingerprint
+
+    def read_failed(self):
+        """Record a failed read (or an exception in the read loop)."""
+        self.failed_reads += 1
+        self.consecutive_failures += 1
+
+    def stall_reason(self):
+        """Return a short reason string if the stream looks dead, else None."""
+        if self.consecutive_failures >= self.max_failed_reads:
+            return f"{self.consecutive_failures} failed reads"
+        if self.consecutive_duplicates >= self.max_duplicate_frames:
+            return f"frozen for {self.consecutive_duplicates} frames"
+        if self.last_frame_time is not None:
+            silent = self.clock() - self.last_frame_time
+            if silent > self.stall_timeout:
+                return f"no frames for {silent:.1f}s"
+        return None
+
+    @property
+    def fps(self):
+        return 1.0 / self.mean_gap if self.mean_gap > 0 else 0.0
+
+    def stream_lost(self, reason):
+        """Mark the start of downtime."""
+        if self._down_since is None:
+            self._down_since = self.clock()
+        self._lost_reason = reason
+
+    def stream_restored(self, attempts=1):
+        """Mark the end of downtime after a successful reconnect."""
+        now = self.clock()
+        downtime = now - self._down_since if self._down_since is not None else 0.0
+        self._down_since = None
+        self.reconnects += 1
+        self.downtime_total += downtime
+        self.events.append({
+            "time": time.time(),
+            "reason": self._lost_reason,
+            "downtime": downtime,
+            "attempts": attempts,
+        })
+        self.start()
+        return downtime
+
+    def snapshot(self):
+        """Current counters as a plain dict (for metrics and status)."""
+        downtime = self.downtime_total
+        if self._down_since is not None:
+            downtime += self.clock() - self._down_since
+        return {
+            "frames": self.frames,
+            "failed_reads": self.failed_reads,
+            "duplicate_frames": self.duplicate_frames,
+            "fps": self.fps,
+            "last_gap": self.last_gap,
+            "max_gap": self.max_gap,
+            "reconnects": self.reconnects,
+            "downtime_total": downtime,
+        }
@@ -0,0 +1,243 @@
+"""Multi-frame temporal denoise for still captures.
+
+FrameStack averages consecutive full-resolution frames into one still. Frames
+are streamed into a preallocated float32 sum (cv2.accumulate), so memory does
+not grow with the frame count; only a decimated gray copy of the first frame
+is kept for the alignment check, which skips frames whose content moved
+(phase correlation against the first frame) and stale duplicate buffers.
+
+Rejection modes:
+- none:   plain mean
+- sigma:  pixel values further than `sigma` noise deviations from a reference
+          (median of the first three frames) are left out (flicker, specular
+          glints); keeps a per-pixel count
+- median: medians of non-overlapping triples of frames are averaged (two
+          frames are held back at a time); removes impulse noise
+The per-pixel noise level is estimated from the strided gray copies (which,
+unlike an averaged thumbnail, keep the sensor noise), so the report can show
+the expected improvement.
+"""
+import time
+
+import cv2
+import numpy as np
+
+from capture_quality import decimate_gray
+
+REJECTION_MODES = ("none", "sigma", "median")
+
+DEFAULT_DENOISE_CONFIG = {
+    "enabled": False,
+    # Frames averaged per capture (use multiples of 3 with "median")
+    "frames": 8,
+    "rejection": "none",
+    # "sigma" mode: reject values further than this many noise deviations from the reference
+    "sigma": 3.0,
+    # Skip frames shifted more than this (capture pixels) against the first frame
+    "max_shift_px": 1.5,
+    # Stop after reading frames * max_read_factor frames, however many were kept
+    "max_read_factor": 2,
+    # Width of the gray copy used for the alignment check and noise estimate
+    "align_width": 960,
+}
+
+
+class DenoiseReport:
+    """What went into one multi-frame still."""
+
+    def __init__(self, rejection, requested, used, skipped, noise, elapsed_ms):
+        self.rejection = rejection
+        self.requested = requested
+        self.used = used
+        self.skipped = skipped
+        # Estimated per-pixel noise (gray levels) of a single frame
+        self.noise = noise
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def ok(self):
+        return self.used >= max(2, self.requested // 2)
+
+    @property
+    def noise_after(self):
+        return self.noise / np.sqrt(max(1, self.used))
+
+    def summary(self):
+        if not self.ok:
+            return f"board moving ({self.used}/{self.requested} frames used)"
+        return f"{self.used} frames averaged (noise {self.noise:.1f} -> ~{self.noise_after:.1f})"
+
+    def as_dict(self):
+        return {
+            "rejection": self.rejection,
+            "frames": self.used,
+            "requested": self.requested,
+            "skipped": self.skipped,
+            "noise": round(float(self.noise), 2),
+            "elapsed_ms": round(self.elapsed_ms, 1),
+        }
+
+
+def _median3(a, b, c):
+    """Per-pixel median of three uint8 frames."""
+    return cv2.max(cv2.min(a, b), cv2.min(cv2.max(a, b), c))
+
+
+class FrameStack:
+    """Streaming average of aligned frames into a preallocated float32 buffer."""
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_DENOISE_CONFIG)
+        if config:
+            self.config.update(config)
+        if self.config["rejection"] not in REJECTION_MODES:
+            print(f"Denoise: unknown rejection {self.config['rejection']!r}, using 'none'")
+            self.config["rejection"] = "none"
+        self.sum = None
+        self.count = None
+        self.last_report = None
+        self._reset_state()
+
+    @property
+    def enabled(self):
+        return bool(self.config["enabled"]) and self.frames > 1
+
+    @property
+    def frames(self):
+        return max(1, int(self.config["frames"]))
+
+    @property
+    def max_reads(self):
+        return self.frames * max(1, int(self.config["max_read_factor"]))
+
+    def _reset_state(self):
+        self.used = 0
+        self.skipped = 0
+        self.weight = 0
+        self._reference = None
+        self._reference_f = None
+        self._window = None
+        self._step = 1
+        self._last_small = None
+        self._noise = []
+        self._held = []
+        self._median = None
+        self._start = None
+
+    def start(self):
+        """Begin a new still (buffers are reused if the frame size stays the same)."""
+        self._reset_state()
+        self.last_report = None
+        self._start = time.perf_counter()
+
+    def _allocate(self, frame):
+        if self.sum is None or self.sum.shape != frame.shape:
+            self.sum = np.zeros(frame.shape, np.float32)
+            self.count = np.zeros(frame.shape[:2], np.float32)
+        else:
+            self.sum.fill(0)
+            self.count.fill(0)
+
+    def _aligned(self, frame):
+        """Whether frame lines up with the first frame (and isn't a stale duplicate)."""
+        small = decimate_gray(frame, self.config["align_width"])
+        if self._reference is None:
+            self._step = max(1, frame.shape[1] // max(1, self.config["align_width"]))
+            self._reference = small
+            self._reference_f = small.astype(np.float32)
+            self._window = cv2.createHanningWindow((small.shape[1], small.shape[0]), cv2.CV_32F)
+            self._last_small = small
+            return True
+        if small.shape != self._reference.shape or np.array_equal(small, self._last_small):
+            return False
+        self._last_small = small
+        (dx, dy), _ = cv2.phaseCorrelate(self._reference_f, small.astype(np.float32),
+                                         self._window)
+        if np.hypot(dx, dy) * self._step > self.config["max_shift_px"]:
+            return False
+        if len(self._noise) < 3:
+            # The strided copies keep per-pixel noise: std of a difference / sqrt(2)
+            diff = cv2.subtract(small, self._reference, dtype=cv2.CV_16S)
+            self._noise.append(float(np.std(diff)) / np.sqrt(2.0))
+        return True
+
+    def _accumulate(self, frame):
+        rejection = self.config["rejection"]
+        if rejection == "median":
+            self._held.append(frame)
+            if len(self._held) < 3:
+                return
+            frame = _median3(*self._held)
+            self._held = []
+        elif rejection == "sigma":
+            if self._median is None:
+                self._held.append(frame)
+                if len(self._held) < 3:
+                    return
+                self._median = _median3(*self._held)
+                held, self._held = self._held, []
+                for frame in held:
+                    self._accumulate_clipped(frame)
+                return
+            self._accumulate_clipped(frame)
+            return
+        cv2.accumulate(frame, self.sum)
+        self.weight += 1
+
+    def _accumulate_clipped(self, frame):
+        """Accumulate the pixels of frame that are close to the median reference."""
+        deviation = cv2.absdiff(frame, self._median)
+        if deviation.ndim == 3:
+            deviation = cv2.cvtColor(deviation, cv2.COLOR_BGR2GRAY)
+        # Difference of two noisy values: sqrt(2) x the single-frame noise
+        noise = min(self._noise) if self._noise else 2.0
+        limit = max(3.0, self.config["sigma"] * noise * np.sqrt(2.0))
+        keep = cv2.compare(deviation, limit, cv2.CMP_LE)
+        cv2.accumulate(frame, self.sum, mask=keep)
+        cv2.add(self.count, 1.0, dst=self.count, mask=keep)
+        self.weight += 1
+
+    def feed(self, frame):
+        """Add one frame; returns True once enough frames are in."""
+        if frame is None:
+            return False
+        if self._start is None:
+            self.start()
+        if self.used == 0:
+            self._allocate(frame)
+            self._aligned(frame)  # first frame becomes the alignment reference
+        elif frame.shape != self.sum.shape or not self._aligned(frame):
+            self.skipped += 1
+            return False
+        self._accumulate(frame)
+        self.used += 1
+        return self.used >= self.frames
+
+    def result(self):
+        """The averaged uint8 frame (None if nothing was fed); sets last_report."""
+        if self.used == 0:
+            return None
+        sigma = self.config["rejection"] == "sigma"
+        # Frames left over from an incomplete triple count like the others
+        for frame in self._held:
+            cv2.accumulate(frame, self.sum)
+            if sigma:
+                cv2.add(self.count, 1.0, dst=self.count)
+            self.weight += 1
+        self._held = []
+        if sigma:
+            # Pixels rejected in every frame take the reference value
+            empty = cv2.compare(self.count, 0.0, cv2.CMP_EQ)
+            cv2.max(self.count, 1.0, dst=self.count)
+            count = self.count if self.sum.ndim == 2 else cv2.merge([self.count] * self.sum.shape[2])
+            frame = cv2.convertScaleAbs(cv2.divide(self.sum, count))
+            if self._median is not None and cv2.countNonZero(empty):
+                frame[empty > 0] = self._median[empty > 0]
+        else:
+            frame = cv2.convertScaleAbs(self.sum, alpha=1.0 / self.weight)
+        noise = float(np.median(self._noise)) if self._noise else 0.0
+        elapsed_ms = (time.perf_counter() - self._start) * 1000.0 if self._start else 0.0
+        self.last_report = DenoiseReport(self.config["rejection"], self.frames, self.used, self.skipped,
+                                         noise, elapsed_ms)
+        self._start = None
+        return frame
@@ -0,0 +1,101 @@
+"""PTZController against the in-memory MockControlBackend.
+
+Run from the repository root:
+    python -m unittest discover -s tests
+"""
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from ptz_control import MockControlBackend, PTZController  # noqa: E402
+
+
+class PTZControllerTest(unittest.TestCase):
+    def setUp(self):
+        # Brio-like ranges: zoom 100..500 (1x..5x optical), pan / tilt in arc seconds
+        self.backend = MockControlBackend()
+        self.applied = []
+        self.done = threading.Event()
+        self.controller = PTZController(self.backend, max_pan=500, on_applied=self.on_applied)
+
+    def tearDown(self):
+        self.controller.stop()
+
+    def on_applied(self, name, requested, actual):
+        self.applied.append((name, requested, actual))
+        self.done.set()
+
+    def wait_applied(self, count):
+        """Wait until count controls were written back by the worker."""
+        for _ in range(100):
+            if len(self.applied) >= count:
+                return
+            self.done.wait(0.05)
+            self.done.clear()
+        self.fail(f"only {len(self.applied)} of {count} controls applied")
+
+    def test_ranges_come_from_the_backend(self):
+        self.assertEqual(self.controller.max_hardware_zoom, 5.0)
+        self.assertTrue(self.controller.supports("pan"))
+        zoom_only = PTZController(MockControlBackend({"zoom": (100, 300)}))
+        self.assertEqual(zoom_only.max_hardware_zoom, 3.0)
+        self.assertFalse(zoom_only.supports("pan"))
+        self.assertEqual(PTZController(MockControlBackend({})).max_hardware_zoom, 1.0)
+
+    def test_split_view_leaves_the_rest_digital(self):
+        # Within the optical range everything is hardware, pan included
+        self.assertEqual(self.controller.split_view(3.0, 120, -40), (1.0, 0, 0))
+        # Beyond it the sensor does 5x and the crop does the rest
+        zoom, pan_x, pan_y = self.controller.split_view(8.0, 120, -40)
+        self.assertAlmostEqual(zoom, 1.6)
+        self.assertEqual((pan_x, pan_y), (0, 0))
+        # Without pan / tilt controls the pan stays digital
+        zoom_only = PTZController(MockControlBackend({"zoom": (100, 300)}))
+        zoom, pan_x, pan_y = zoom_only.split_view(4.5, 120, -40)
+        self.assertAlmostEqual(zoom, 1.5)
+        self.assertEqual((pan_x, pan_y), (120, -40))
+        # No controls at all: the digital crop does everything
+        self.assertEqual(PTZController(MockControlBackend({})).split_view(2.0, 10, 20), (2.0, 10, 20))
+
+    def test_request_view_clamps_to_control_ranges(self):
+        self.controller.request_view(9.0, 2000, -2000)
+        self.assertEqual(self.controller.pending, {"zoom": 500, "pan": 36000, "tilt": 36000})
+        self.controller.request_view(1.0, 0, 0)
+        self.assertEqual(self.controller.pending, {"zoom": 100, "pan": 0, "tilt": 0})
+        self.controller.request_view(2.0, 250, 250)
+        self.assertEqual(self.controller.pending, {"zoom": 200, "pan": 18000, "tilt": -18000})
+
+    def test_burst_is_coalesced_into_one_write_per_control(self):
+        # A slider drag: many view updates before the worker gets to run
+        for step in range(50):
+            self.controller.request_view(1.0 + step * 0.05, step * 10, -step * 5)
+        self.controller.start()
+        self.wait_applied(3)
+
+        self.assertEqual(len(self.backend.writes), 3)
+        self.assertEqual(sorted(name for name, _ in self.backend.writes), ["pan", "tilt", "zoom"])
+        self.assertEqual(self.backend.values["zoom"], round(100 * (1.0 + 49 * 0.05)))
+        self.assertEqual(self.backend.values["pan"], self.controller._scale("pan", 490))
+        self.assertEqual(self.backend.values["tilt"], self.controller._scale("tilt", 245))
+        self.assertEqual(self.controller.applied["zoom"], self.backend.values["zoom"])
+
+    def test_reapply_restores_the_view_after_a_reconnect(self):
+        self.controller.start()
+        self.controller.request_view(2.5, 100, 0)
+        self.wait_applied(3)
+        wanted = dict(self.backend.values)
+
+        # A reopened device comes back at its defaults
+        self.backend.values = {"zoom": 100, "pan": 0, "tilt": 0}
+        self.backend.writes.clear()
+        self.controller.reapply()
+        self.wait_applied(6)
+
+        self.assertEqual(self.backend.values, wanted)
+        self.assertEqual(len(self.backend.writes), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
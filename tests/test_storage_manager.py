@@ -0,0 +1,66 @@
+"""StorageManager ledger rebuilds racing with capture writes.
+
+Run from the repository root:
+    python -m unittest discover -s tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import storage_manager  # noqa: E402
+from storage_manager import StorageManager  # noqa: E402
+
+
+class ScanMergeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, "captures")
+        os.makedirs(os.path.join(self.root, "SN1"))
+        for name in ("old.png", "gone.png"):
+            with open(os.path.join(self.root, "SN1", name), "wb") as f:
+                f.write(b"x" * 100)
+        self.storage = StorageManager(self.root, os.path.join(self.tmp, "ledger.json"), clock=lambda: 5.0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.root, "SN1", name)
+
+    def test_updates_during_scan_are_kept(self):
+        real_walk = os.walk
+
+        def walk_with_capture(root):
+            # The capture path reports files while the worker is still walking the tree
+            entries = list(real_walk(root))
+            with open(self.path("new.png"), "wb") as f:
+                f.write(b"y" * 300)
+            self.storage.file_written(self.path("new.png"), 300)
+            self.storage.file_written(self.path("old.png"), 250)
+            os.remove(self.path("gone.png"))
+            self.storage.files_removed([self.path("gone.png")])
+            return iter(entries)
+
+        with self.storage._lock:
+            self.storage._touched = set()
+        with mock.patch.object(storage_manager.os, "walk", walk_with_capture):
+            self.storage.scan()
+
+        self.assertEqual(self.storage.files, {"SN1/old.png": [250, 5.0], "SN1/new.png": [300, 5.0]})
+        self.assertEqual(self.storage.used_bytes, 550)
+        self.assertIsNone(self.storage._touched)
+
+    def test_scan_without_tracking_replaces_the_ledger(self):
+        self.storage.files = {"SN9/stale.png": [10, 1.0]}
+        self.storage.scan()
+        self.assertEqual(sorted(self.storage.files), ["SN1/gone.png", "SN1/old.png"])
+        self.assertEqual(self.storage.used_bytes, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
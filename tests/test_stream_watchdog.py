@@ -0,0 +1,275 @@
+"""Stall detection and reconnect tests driven by a fake camera that stalls on purpose.
+
+Run from the repository root:
+    python -m unittest discover -s tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import capture_engine  # noqa: E402
+from camera_profiles import ProfileStore  # noqa: E402
+from settings import DEFAULT_SETTINGS  # noqa: E402
+from stream_watchdog import Backoff, StreamWatchdog, reconnect_with_backoff  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class StallingSource:
+    """VideoCapture stand-in: delivers `frames` distinct frames, then stalls.
+
+    stall="fail" makes every later read fail, stall="freeze" keeps returning the
+    last frame (a frozen driver buffer).
+    """
+
+    def __init__(self, frames=5, stall="fail", opened=True, shape=(48, 64, 3)):
+        self.frames = frames
+        self.stall = stall
+        self.opened = opened
+        self.shape = shape
+        self.reads = 0
+        self.released = False
+        self._last = None
+        self._props = {}
+
+    def isOpened(self):
+        return self.opened and not self.released
+
+    def read(self):
+        self.reads += 1
+        if self.released:
+            return False, None
+        if self.reads <= self.frames:
+            self._last = np.full(self.shape, self.reads % 256, np.uint8)
+            return True, self._last.copy()
+        if self.stall == "freeze" and self._last is not None:
+            return True, self._last.copy()
+        return False, None
+
+    def grab(self):
+        return self.read()[0]
+
+    def set(self, prop, value):
+        self._props[prop] = value
+        return True
+
+    def get(self, prop):
+        return self._props.get(prop, 0)
+
+    def getBackendName(self):
+        return "FAKE"
+
+    def release(self):
+        self.released = True
+
+
+class StreamWatchdogTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.watchdog = StreamWatchdog(stall_timeout=3.0, max_failed_reads=4, max_duplicate_frames=5,
+                                       clock=self.clock)
+        self.watchdog.start()
+
+    def feed(self, source, reads):
+        for _ in range(reads):
+            ret, frame = source.read()
+            if ret:
+                self.watchdog.frame_received(frame)
+            else:
+                self.watchdog.read_failed()
+            self.clock.advance(0.033)
+
+    def test_healthy_stream_is_not_stalled(self):
+        self.feed(StallingSource(frames=100), 50)
+        self.assertIsNone(self.watchdog.stall_reason())
+        self.assertEqual(self.watchdog.frames, 50)
+        self.assertAlmostEqual(self.watchdog.fps, 1 / 0.033, delta=1.0)
+
+    def test_failed_reads_stall(self):
+        source = StallingSource(frames=3, stall="fail")
+        self.feed(source, 6)
+        self.assertIsNone(self.watchdog.stall_reason())
+        self.feed(source, 1)
+        self.assertEqual(self.watchdog.stall_reason(), "4 failed reads")
+        self.assertEqual(self.watchdog.snapshot()["failed_reads"], 4)
+
+    def test_frame_resets_failure_count(self):
+        source = StallingSource(frames=100)
+        for _ in range(3):
+            self.watchdog.read_failed()
+        self.feed(source, 1)
+        self.watchdog.read_failed()
+        self.assertIsNone(self.watchdog.stall_reason())
+
+    def test_frozen_frames_stall(self):
+        source = StallingSource(frames=2, stall="freeze")
+        self.feed(source, 6)
+        self.assertIsNone(self.watchdog.stall_reason())
+        self.feed(source, 1)
+        self.assertEqual(self.watchdog.stall_reason(), "frozen for 5 frames")
+        self.assertEqual(self.watchdog.snapshot()["duplicate_frames"], 5)
+
+    def test_silence_stalls_after_timeout(self):
+        self.feed(StallingSource(frames=10), 10)
+        self.clock.advance(2.9)
+        self.assertIsNone(self.watchdog.stall_reason())
+        self.clock.advance(0.5)
+        self.assertTrue(self.watchdog.stall_reason().startswith("no frames for"))
+
+    def test_downtime_is_accounted(self):
+        self.watchdog.stream_lost("4 failed reads")
+        self.clock.advance(2.5)
+        self.assertAlmostEqual(self.watchdog.snapshot()["downtime_total"], 2.5)
+        self.assertAlmostEqual(self.watchdog.stream_restored(attempts=3), 2.5)
+        snapshot = self.watchdog.snapshot()
+        self.assertEqual(snapshot["reconnects"], 1)
+        self.assertAlmostEqual(snapshot["downtime_total"], 2.5)
+        self.assertEqual(self.watchdog.events[-1]["reason"], "4 failed reads")
+        self.assertEqual(self.watchdog.events[-1]["attempts"], 3)
+        # Cadence tracking restarts from the reconnect
+        self.assertIsNone(self.watchdog.stall_reason())
+
+
+class ReconnectTest(unittest.TestCase):
+    def test_backoff_grows_to_maximum(self):
+        backoff = Backoff(initial=0.5, factor=2.0, maximum=3.0)
+        self.assertEqual([backoff.next() for _ in range(5)], [0.5, 1.0, 2.0, 3.0, 3.0])
+        backoff.reset()
+        self.assertEqual(backoff.next(), 0.5)
+
+    def test_reconnect_retries_until_source_opens(self):
+        sources = [None, StallingSource(opened=False), RuntimeError("device busy"), StallingSource()]
+        delays = []
+
+        def open_source():
+            source = sources.pop(0)
+            if isinstance(source, Exception):
+                raise source
+            return source if source is not None and source.isOpened() else None
+
+        source, attempts = reconnect_with_backoff(open_source, lambda: True, Backoff(0.5, 2.0, 10.0),
+                                                  sleep=delays.append)
+        self.assertIsInstance(source, StallingSource)
+        self.assertEqual(attempts, 4)
+        self.assertEqual(delays, [0.5, 1.0, 2.0])
+
+    def test_reconnect_gives_up_when_told_to(self):
+        delays = []
+        keep_trying = iter([True, True, False])
+        source, attempts = reconnect_with_backoff(lambda: None, lambda: next(keep_trying), sleep=delays.append)
+        self.assertIsNone(source)
+        self.assertEqual(attempts, 2)
+        self.assertEqual(len(delays), 2)
+
+
+class EngineReconnectTest(unittest.TestCase):
+    """The preview loop of CaptureEngine recovers from a stalling source on its own."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        paths = {name: os.path.join(self.tmp, name.lower()) for name in (
+            "REPLICATION_OUTBOX_PATH", "STORAGE_LEDGER_PATH", "THUMBNAIL_CACHE_DIR", "PLACEMENT_REFERENCE_DIR",
+            "LENS_CALIBRATION_PATH", "LENS_CALIBRATION_FRAMES_DIR")}
+        patcher = mock.patch.multiple(capture_engine, **paths)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        settings = {key: (dict(value) if isinstance(value, dict) else value)
+                    for key, value in DEFAULT_SETTINGS.items()}
+        settings["capture_root"] = os.path.join(self.tmp, "captures")
+        settings["process_engine"] = False
+        settings["camera_standby"] = {"enabled": False}
+        settings["watchdog"] = {"stall_timeout": 5.0, "max_failed_reads": 3, "max_duplicate_frames": 5}
+
+        # First source stalls after a few frames; reopening fails once, then a healthy one opens
+        self.sources = [StallingSource(frames=4, stall="fail"), StallingSource(opened=False),
+                        StallingSource(frames=10 ** 6)]
+        self.opened = []
+        self.engine = capture_engine.CaptureEngine(settings, process_engine=False, open_capture=self.open_capture)
+        self.engine.profile_store = ProfileStore(os.path.join(self.tmp, "profiles.json"))
+        self.statuses = []
+        self.engine.add_status_callback(lambda text, level: self.statuses.append((text, level)))
+
+    def tearDown(self):
+        self.engine.shutdown()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def open_capture(self, index, timeout=1.0):
+        source = self.sources.pop(0) if self.sources else StallingSource(opened=False)
+        if callable(source):
+            source = source()
+        self.opened.append(source)
+        return source
+
+    def wait_for(self, condition, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if condition():
+                return True
+            threading.Event().wait(0.02)
+        return False
+
+    def test_stalled_stream_is_reopened(self):
+        self.assertTrue(self.engine.open(0), self.engine.error)
+        first = self.engine.cap
+        self.engine.start_stream()
+
+        self.assertTrue(self.wait_for(lambda: self.engine.stream_watchdog.reconnects == 1))
+        self.assertTrue(first.released)
+        self.assertIs(self.engine.cap, self.opened[-1])
+        self.assertEqual(len(self.opened), 3)
+        self.assertEqual(self.engine.stream_watchdog.events[-1]["attempts"], 2)
+        self.assertIn(("Camera Reconnected ✓", "ok"), self.statuses)
+        # Frames flow again from the new source
+        frames = self.engine.stream_watchdog.frames
+        self.assertTrue(self.wait_for(lambda: self.engine.stream_watchdog.frames > frames + 5))
+        self.assertIsNone(self.engine.stream_watchdog.stall_reason())
+
+    def test_stale_reconnect_does_not_replace_new_camera(self):
+        # The reopen blocks until the operator has already switched to another camera
+        entered, release = threading.Event(), threading.Event()
+        late = StallingSource(frames=10 ** 6)
+        switched = StallingSource(frames=10 ** 6)
+
+        def slow_open():
+            entered.set()
+            release.wait(10.0)
+            return late
+
+        self.sources = [StallingSource(frames=4, stall="fail"), slow_open, switched]
+        self.assertTrue(self.engine.open(0), self.engine.error)
+        self.engine.start_stream()
+        self.assertTrue(entered.wait(10.0))
+
+        # Camera switch while the old stream thread is still stuck in its reconnect
+        self.assertTrue(self.engine.open(0), self.engine.error)
+        self.engine.start_stream()
+        self.assertIs(self.engine.cap, switched)
+        release.set()
+
+        self.assertTrue(self.wait_for(lambda: late.released))
+        self.assertIs(self.engine.cap, switched)
+        self.assertFalse(switched.released)
+        self.assertEqual(self.engine.stream_watchdog.reconnects, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+"""Capture thumbnails for the in-app recent-captures gallery.
+
+Thumbnails are made at write time from the in-memory frame, so a saved PNG is
+never decoded again just to show it. The newest ones stay in a bounded LRU
+memory cache; every thumbnail is also written as a small JPEG to an on-disk
+cache, with an index of recent captures, so older entries and entries from a
+previous session load from there. Nothing here reads full-resolution files.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+THUMBNAIL_SIZE = (128, 72)
+
+
+def make_thumbnail(frame_bgr, size=THUMBNAIL_SIZE):
+    """RGB thumbnail fitting inside size, from a BGR frame of any resolution."""
+    h, w = frame_bgr.shape[:2]
+    scale = min(size[0] / float(w), size[1] / float(h))
+    out_w, out_h = max(1, int(w * scale)), max(1, int(h * scale))
+    # Strided decimation first so INTER_AREA only averages a few pixels per output pixel
+    step = max(1, min(w // (out_w * 2), h // (out_h * 2)))
+    small = frame_bgr[::step, ::step]
+    thumb = cv2.resize(small, (out_w, out_h), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB)
+
+
+class ThumbnailCache:
+    """LRU memory cache of RGB thumbnails backed by a JPEG cache directory.
+
+    Keys are capture paths relative to the capture root. The capture index (newest
+    last, at most index_limit entries) is kept in index.json in the cache directory;
+    thumbnails that fall out of it are deleted so the disk cache stays bounded too.
+    """
+
+    def __init__(self, capture_root, cache_dir, capacity=48, index_limit=500, size=THUMBNAIL_SIZE):
+        self.capture_root = capture_root
+        self.cache_dir = cache_dir
+        self.capacity = capacity
+        self.index_limit = index_limit
+        self.size = size
+        self._memory = OrderedDict()
+        self._recent = []  # [{"rel", "sn", "orientation"}], newest last
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            self._recent = [e for e in entries if isinstance(e, dict) and e.get("rel")]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Thumbnails: could not read {self._index_path}: {e}")
+
+    def _save_index(self):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = self._index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._recent, f)
+            os.replace(tmp, self._index_path)
+        except Exception as e:
+            print(f"Thumbnails: could not write index: {e}")
+
+    def key(self, path):
+        return os.path.relpath(os.path.abspath(path), os.path.abspath(self.capture_root)).replace(os.sep, "/")
+
+    def _disk_path(self, rel):
+        return os.path.join(self.cache_dir, rel.replace("/", "__") + ".jpg")
+
+    def _remember(self, rel, thumb):
+        self._memory[rel] = thumb
+        self._memory.move_to_end(rel)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def add(self, path, frame_bgr, sn, orientation):
+        """Store the thumbnail for a just-saved capture and make it the newest entry."""
+        rel = self.key(path)
+        thumb = make_thumbnail(frame_bgr, self.size)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            ok, encoded = cv2.imencode(".jpg", cv2.cvtColor(thumb, cv2.COLOR_RGB2BGR),
+                                       [cv2.IMWRITE_JPEG_QUALITY, 85])
+            if ok:
+                encoded.tofile(self._disk_path(rel))
+        except Exception as e:
+            print(f"Thumbnails: could not cache {rel}: {e}")
+
+        with self._lock:
+            self._remember(rel, thumb)
+            # An SN holds one image per orientation: the new one replaces any older entry
+            dropped = [e for e in self._recent if e["rel"] != rel
+                       and e.get("sn") == sn and e.get("orientation") == orientation]
+            self._recent = [e for e in self._recent if e["rel"] != rel and e not in dropped]
+            self._recent.append({"rel": rel, "sn": sn, "orientation": orientation})
+            dropped += self._recent[:-self.index_limit]
+            self._recent = self._recent[-self.index_limit:]
+            self._save_index()
+        for entry in dropped:
+            self._memory.pop(entry["rel"], None)
+            try:
+                os.remove(self._disk_path(entry["rel"]))
+            except OSError:
+                pass
+        return thumb
+
+    def discard(self, paths):
+        """Forget thumbnails for removed capture files."""
+        rels = {self.key(p) for p in paths}
+        if not rels:
+            return
+        with self._lock:
+            for rel in rels:
+                self._memory.pop(rel, None)
+                try:
+                    os.remove(self._disk_path(rel))
+                except OSError:
+                    pass
+            before = len(self._recent)
+            self._recent = [e for e in self._recent if e["rel"] not in rels]
+            if len(self._recent) != before:
+                self._save_index()
+
+    def rename(self, old_path, new_path):
+        """Keep a thumbnail when its capture is rewritten under a new name (same image)."""
+        old, new = self.key(old_path), self.key(new_path)
+        if old == new:
+            return
+        with self._lock:
+            thumb = self._memory.pop(old, None)
+            if thumb is not None:
+                self._remember(new, thumb)
+            try:
+                os.replace(self._disk_path(old), self._disk_path(new))
+            except OSError:
+                pass
+            changed = False
+            for entry in self._recent:
+                if entry["rel"] == old:
+                    entry["rel"] = new
+                    changed = True
+            if changed:
+                self._save_index()
+
+    def get(self, rel):
+        """RGB thumbnail for a key from memory or the disk cache; None if neither has it."""
+        with self._lock:
+            thumb = self._memory.get(rel)
+            if thumb is not None:
+                self._memory.move_to_end(rel)
+                return thumb
+        try:
+            data = np.fromfile(self._disk_path(rel), dtype=np.uint8)
+            image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        except Exception:
+            image = None
+        if image is None:
+            return None
+        thumb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        with self._lock:
+            self._remember(rel, thumb)
+        return thumb
+
+    def recent(self, n=None):
+        """Recent capture entries, newest first."""
+        with self._lock:
+            entries = list(reversed(self._recent))
+        return entries[:n] if n else entries
+
+    def for_sn(self, sn):
+        """{orientation: entry} for the SN's captures known to the index."""
+        return {e["orientation"]: e for e in self.recent() if e.get("sn") == sn}
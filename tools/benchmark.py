@@ -0,0 +1,392 @@
+"""Camera-free benchmarks for the preview and capture pipelines.
+
+Runs on synthetic 1080p/4K frames (or frames recorded from a folder of
+captures) and measures:
+
+- preview throughput across the zoom slider range (crop + resize + BGR->RGB)
+- zoom + pan crop cost on full 4K stills
+- lens correction: building the remap maps and the fused undistort + crop remap
+- pre-save quality gate cost
+- multi-frame denoise per rejection mode (8 noisy 4K frames into one still)
+- placement check against a reference (shifted / rotated board)
+- capture encode and write latency per format, and the full save_image path
+- the SN folder overwrite check and retention rules on a large capture tree
+- the metrics hot path (counter increment + histogram observe per frame)
+
+Results are written as JSON. With --baseline the run is compared against an
+earlier result file and the script exits with status 1 if any metric's median
+got slower by more than --threshold (default 15%), so it can gate a rollout.
+
+Usage:
+    python tools/benchmark.py --output bench.json
+    python tools/benchmark.py --frames C:/brio_captures/captures/SN123 --output bench.json
+    python tools/benchmark.py --baseline bench_prev.json --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import capture_metadata  # noqa: E402
+import capture_storage  # noqa: E402
+import imaging  # noqa: E402
+import station_metrics  # noqa: E402
+from capture_quality import CaptureQualityGate  # noqa: E402
+from lens_correction import Calibration, LensCorrector  # noqa: E402
+from placement_check import PlacementChecker  # noqa: E402
+from temporal_denoise import REJECTION_MODES, FrameStack  # noqa: E402
+
+RESOLUTIONS = {"1080p": (1920, 1080), "4k": (3840, 2160)}
+ZOOM_STEPS = (1.0, 1.5, 2.0, 3.0, 4.0, 5.0)
+ENCODE_FORMATS = {
+    "png_default": (".png", []),
+    "png_c0": (".png", [cv2.IMWRITE_PNG_COMPRESSION, 0]),
+    "png_c3": (".png", [cv2.IMWRITE_PNG_COMPRESSION, 3]),
+    "png_c9": (".png", [cv2.IMWRITE_PNG_COMPRESSION, 9]),
+    "jpg_q95": (".jpg", [cv2.IMWRITE_JPEG_QUALITY, 95]),
+    "tiff": (".tiff", []),
+}
+
+
+def synthetic_frame(width, height, seed=0):
+    """Deterministic board-like test frame: gradient, traces, pads and sensor noise."""
+    rng = np.random.default_rng(seed)
+    frame = np.zeros((height, width, 3), np.uint8)
+    frame[:] = (40, 90, 30)
+    gradient = np.linspace(0, 60, width, dtype=np.float32)
+    frame = cv2.add(frame, np.dstack([gradient[None, :].repeat(height, 0).astype(np.uint8)] * 3))
+    for _ in range(200):
+        x1, y1 = int(rng.integers(0, width)), int(rng.integers(0, height))
+        x2, y2 = int(rng.integers(0, width)), int(rng.integers(0, height))
+        cv2.line(frame, (x1, y1), (x2, y1), (60, 160, 200), int(rng.integers(1, 6)))
+        cv2.line(frame, (x2, y1), (x2, y2), (60, 160, 200), int(rng.integers(1, 6)))
+    for _ in range(300):
+        x, y = int(rng.integers(0, width - 40)), int(rng.integers(0, height - 40))
+        w, h = int(rng.integers(8, 40)), int(rng.integers(8, 40))
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (180, 180, 190), -1)
+    noise = rng.normal(0, 4, frame.shape).astype(np.int16)
+    return np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def load_frames(folder, width, height, limit=4):
+    """Load up to `limit` recorded frames from folder, resized to width x height."""
+    frames = []
+    for path in sorted(Path(folder).rglob("*")):
+        if path.suffix.lower() not in (".png", ".jpg", ".jpeg", ".bmp", ".tiff"):
+            continue
+        image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if image is None:
+            continue
+        if image.shape[1] != width or image.shape[0] != height:
+            image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        frames.append(image)
+        if len(frames) >= limit:
+            break
+    return frames
+
+
+def measure(fn, repeat, warmup=1):
+    """Time fn() `repeat` times; returns summary stats in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    samples.sort()
+    return {
+        "mean_ms": sum(samples) / len(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min_ms": samples[0],
+        "runs": len(samples),
+    }
+
+
+def bench_preview(frames_by_res, repeat):
+    results = {}
+    for res_name, frames in frames_by_res.items():
+        for zoom in ZOOM_STEPS:
+            i = [0]
+
+            def run():
+                frame = frames[i[0] % len(frames)]
+                i[0] += 1
+                imaging.render_preview(frame, zoom, 120, -80)
+
+            stats = measure(run, repeat)
+            stats["fps"] = 1000.0 / stats["p50_ms"] if stats["p50_ms"] else 0.0
+            results[f"preview_{res_name}_zoom_{zoom:.1f}"] = stats
+    return results
+
+
+def bench_transform(frames, repeat):
+    """Zoom + pan crop of a 4K still, with and without upscaling back to full size."""
+    results = {}
+    frame = frames[0]
+    h, w = frame.shape[:2]
+    for zoom in (2.0, 3.0, 5.0):
+        results[f"transform_4k_crop_zoom_{zoom:.1f}"] = measure(
+            lambda: np.ascontiguousarray(imaging.apply_zoom_crop(frame, zoom, 200, 150)), repeat)
+        results[f"transform_4k_upscale_zoom_{zoom:.1f}"] = measure(
+            lambda: cv2.resize(imaging.apply_zoom_crop(frame, zoom, 200, 150), (w, h)), max(3, repeat // 4))
+    return results
+
+
+def bench_lens(frames, repeat):
+    """Fused undistort + zoom crop + upscale remap of a 4K still, and building its maps."""
+    frame = frames[0]
+    h, w = frame.shape[:2]
+    matrix = [[w * 0.75, 0, w / 2], [0, w * 0.75, h / 2], [0, 0, 1]]
+    calibration = Calibration(matrix, [-0.2, 0.05, 0.0, 0.0, 0.0], (w, h))
+    crop = imaging.crop_rect(w, h, 2.0, 200, 150)
+    results = {"lens_4k_build_maps": measure(
+        lambda: LensCorrector(calibration).maps((w, h), crop, (w, h)), max(3, repeat // 4))}
+    lens = LensCorrector(calibration)
+    results["lens_4k_remap_zoom_2.0"] = measure(lambda: lens.apply(frame, crop, (w, h)), max(3, repeat // 4))
+    results["lens_4k_remap_native_roi_2.0"] = measure(lambda: lens.apply(frame, crop, crop[2:]), repeat)
+    return results
+
+
+def bench_quality_gate(frames, repeat):
+    gate = CaptureQualityGate()
+    i = [0]
+
+    def run():
+        gate.assess(frames[i[0] % len(frames)])
+        i[0] += 1
+
+    return {"quality_gate_4k": measure(run, repeat)}
+
+
+def bench_denoise(frames, repeat):
+    """Stacking 8 noisy 4K frames (alignment check, accumulation and the final still)."""
+    rng = np.random.default_rng(0)
+    noisy = [cv2.add(frames[0], rng.integers(0, 12, frames[0].shape, dtype=np.uint8)) for _ in range(8)]
+    results = {}
+    for rejection in REJECTION_MODES:
+        stack = FrameStack({"enabled": True, "frames": len(noisy), "rejection": rejection})
+
+        def run():
+            stack.start()
+            for frame in noisy:
+                stack.feed(frame)
+            stack.result()
+
+        results[f"denoise_4k_8_frames_{rejection}"] = measure(run, max(3, repeat // 10))
+    return results
+
+
+def bench_placement(frames, repeat, work_dir):
+    """Placement check of a shifted and rotated board against a cached reference."""
+    checker = PlacementChecker(os.path.join(work_dir, "references"), {"enabled": True})
+    reference = frames[0]
+    checker.set_reference("", "TOP", reference)
+    h, w = reference.shape[:2]
+    rot = cv2.getRotationMatrix2D((w / 2, h / 2), 1.5, 1.0)
+    rot[:, 2] += (60, -30)
+    moved = cv2.warpAffine(reference, rot, (w, h), borderMode=cv2.BORDER_REPLICATE)
+    checker.reference("", "TOP")
+    return {"placement_check_4k": measure(lambda: checker.check(moved, "", "TOP"), repeat)}
+
+
+def bench_encode(frames, repeat, work_dir):
+    """Encode and write latency per format for a full 4K still and a 3x native ROI.
+
+    save_* is the capture path end to end: capture_metadata.save_image (encode,
+    metadata tEXt chunk or sidecar, temporary file and rename).
+    """
+    results = {}
+    frame = frames[0]
+    h, w = frame.shape[:2]
+    roi = np.ascontiguousarray(imaging.apply_zoom_crop(frame, 3.0, 0, 0))
+    for label, image, zoom in (("4k", frame, 1.0), ("roi3x", roi, 3.0)):
+        metadata = capture_metadata.build_metadata(w, h, zoom, 0, 0, imaging.crop_rect(w, h, zoom, 0, 0),
+                                                   zoom > 1.0, sn="BENCH", orientation="TOP")
+        for fmt, (ext, params) in ENCODE_FORMATS.items():
+            ok, encoded = cv2.imencode(ext, image, params)
+            if not ok:
+                continue
+            data = encoded.tobytes()
+            path = os.path.join(work_dir, f"bench_{label}_{fmt}{ext}")
+
+            def write():
+                with open(path, "wb") as f:
+                    f.write(data)
+
+            encode_stats = measure(lambda: cv2.imencode(ext, image, params), repeat)
+            encode_stats["bytes"] = len(data)
+            results[f"encode_{label}_{fmt}"] = encode_stats
+            results[f"write_{label}_{fmt}"] = measure(write, repeat)
+            save_path = os.path.join(work_dir, f"bench_save_{label}_{fmt}{ext}")
+            results[f"save_{label}_{fmt}"] = measure(
+                lambda: capture_metadata.save_image(save_path, image, metadata, params), repeat)
+    return results
+
+
+def bench_retention(repeat, work_dir, tree_size, stray_files):
+    """Overwrite check and SN folder rules inside a capture root with tree_size SN folders."""
+    root = os.path.join(work_dir, "captures")
+    for n in range(tree_size):
+        sn = f"SN{n:06d}"
+        sn_dir = os.path.join(root, sn)
+        os.makedirs(sn_dir, exist_ok=True)
+        for ori in capture_storage.ORIENTATIONS:
+            Path(sn_dir, capture_storage.capture_filename(sn, ori, "20250101_000000")).touch()
+
+    target = "SN000000"
+    sn_dir = os.path.join(root, target)
+
+    def overwrite_check():
+        capture_storage.find_orientation_files(sn_dir, target, "TOP")
+
+    def retention():
+        # Recreate the clutter the rules have to clean up, then enforce them
+        for i in range(stray_files):
+            Path(sn_dir, f"stray_{i}.tmp").touch()
+        Path(sn_dir, capture_storage.capture_filename(target, "TOP", f"20250102_{len(os.listdir(sn_dir)):06d}")).touch()
+        capture_storage.enforce_sn_folder_rules(sn_dir, target)
+
+    return {
+        f"retention_overwrite_check_{tree_size}_sn": measure(overwrite_check, repeat),
+        f"retention_rules_{tree_size}_sn_{stray_files}_stray": measure(retention, repeat),
+    }
+
+
+def bench_metrics(frames_by_res, repeat):
+    """Preview render with and without the per-frame metrics updates the engine makes."""
+    registry = station_metrics.MetricsRegistry()
+    counter = registry.counter("bench_frames_total", "frames")
+    histogram = registry.histogram("bench_frame_seconds", "frame time")
+    frame = frames_by_res["1080p"][0]
+
+    def plain():
+        imaging.render_preview(frame, 2.0, 0, 0)
+
+    def with_metrics():
+        imaging.render_preview(frame, 2.0, 0, 0)
+        counter.inc()
+        histogram.observe(0.01)
+
+    def hot_path_1000():
+        for _ in range(1000):
+            counter.inc()
+            histogram.observe(0.01)
+        registry.render_prometheus()
+
+    return {
+        "metrics_preview_1080p_plain": measure(plain, repeat),
+        "metrics_preview_1080p_with_metrics": measure(with_metrics, repeat),
+        "metrics_hot_path_1000_updates": measure(hot_path_1000, repeat),
+    }
+
+
+def run_all(args):
+    if args.frames:
+        frames_by_res = {name: load_frames(args.frames, w, h) for name, (w, h) in RESOLUTIONS.items()}
+        if not all(frames_by_res.values()):
+            raise SystemExit(f"No readable images found in {args.frames}")
+        source = os.path.abspath(args.frames)
+    else:
+        frames_by_res = {name: [synthetic_frame(w, h, seed) for seed in range(2)]
+                         for name, (w, h) in RESOLUTIONS.items()}
+        source = "synthetic"
+
+    repeat = args.repeat
+    slow_repeat = max(3, repeat // 5)
+    work_dir = tempfile.mkdtemp(prefix="brio_bench_")
+    results = {}
+    try:
+        print("Preview throughput...")
+        results.update(bench_preview(frames_by_res, repeat))
+        print("Zoom/pan transform...")
+        results.update(bench_transform(frames_by_res["4k"], repeat))
+        print("Lens correction...")
+        results.update(bench_lens(frames_by_res["4k"], repeat))
+        print("Quality gate...")
+        results.update(bench_quality_gate(frames_by_res["4k"], repeat))
+        print("Multi-frame denoise...")
+        results.update(bench_denoise(frames_by_res["4k"], repeat))
+        print("Placement check...")
+        results.update(bench_placement(frames_by_res["4k"], repeat, work_dir))
+        print("Encode / write per format...")
+        results.update(bench_encode(frames_by_res["4k"], slow_repeat, work_dir))
+        print("Metrics hot path...")
+        results.update(bench_metrics(frames_by_res, repeat))
+        print("SN folder retention...")
+        results.update(bench_retention(repeat, work_dir, args.tree_size, args.stray_files))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "cpu_count": os.cpu_count(),
+            "frames": source,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Return a list of (metric, baseline_ms, current_ms) that regressed beyond threshold."""
+    regressions = []
+    for name, stats in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        if stats["p50_ms"] > base["p50_ms"] * (1.0 + threshold):
+            regressions.append((name, base["p50_ms"], stats["p50_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="bench_output.json", help="where to write JSON results")
+    parser.add_argument("--frames", help="folder of recorded frames to use instead of synthetic ones")
+    parser.add_argument("--repeat", type=int, default=30, help="iterations per fast metric")
+    parser.add_argument("--tree-size", type=int, default=2000, help="SN folders in the retention test tree")
+    parser.add_argument("--stray-files", type=int, default=50, help="stray files cleaned per retention run")
+    parser.add_argument("--baseline", help="earlier result JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown (0.15 = 15%%)")
+    args = parser.parse_args(argv)
+
+    report = run_all(args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    width = max(len(name) for name in report["results"])
+    for name, stats in sorted(report["results"].items()):
+        extra = f"  {stats['fps']:.0f} fps" if "fps" in stats else ""
+        print(f"{name:<{width}}  p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms{extra}")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"REGRESSIONS (> {args.threshold:.0%} slower than {args.baseline}):")
+            for name, base, cur in regressions:
+                print(f"  {name}: {base:.2f} ms -> {cur:.2f} ms")
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
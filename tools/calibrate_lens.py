@@ -0,0 +1,71 @@
+"""Estimate the lens calibration from a folder of checkerboard images.
+
+Takes full-resolution stills of a printed checkerboard (different positions,
+tilts and distances, covering the corners of the frame), finds the inner
+corners, estimates the camera matrix and distortion coefficients and writes
+them to C:/brio_captures/lens_calibration.json, where the capture app picks
+them up on its next start. The same stills can be taken in the app with the
+📐 Lens button, which calibrates by itself once enough are collected.
+
+With --check DIR an undistorted copy of every input image is written to DIR
+for a visual check (straight lines should stay straight).
+
+Usage:
+    python tools/calibrate_lens.py FOLDER [--pattern 9x6] [--square-size 25] [--check DIR]
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import cv2
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import lens_correction  # noqa: E402
+from settings import LENS_CALIBRATION_PATH, load_settings  # noqa: E402
+
+
+def main(argv=None):
+    lens_config = dict(lens_correction.DEFAULT_LENS_CONFIG)
+    lens_config.update(load_settings().get("lens_correction") or {})
+    parser = argparse.ArgumentParser(description="Lens calibration from checkerboard images")
+    parser.add_argument("folder")
+    parser.add_argument("--pattern", default="x".join(str(n) for n in lens_config["pattern"]),
+                        help="inner corners as COLSxROWS")
+    parser.add_argument("--square-size", type=float, default=lens_config["square_size"])
+    parser.add_argument("--alpha", type=float, default=lens_config["alpha"])
+    parser.add_argument("--output", default=LENS_CALIBRATION_PATH)
+    parser.add_argument("--check", default=None, help="write undistorted copies of the images here")
+    args = parser.parse_args(argv)
+
+    pattern = tuple(int(n) for n in args.pattern.lower().split("x"))
+    images = lens_correction.load_images(args.folder)
+    if not images:
+        print(f"No images found in {args.folder}")
+        return 1
+    try:
+        calibration = lens_correction.calibrate(images, pattern, args.square_size)
+    except ValueError as e:
+        print(f"Calibration failed: {e}")
+        return 1
+    calibration.save(args.output)
+    matrix = calibration.camera_matrix
+    print(f"Checkerboard found in {calibration.images}/{len(images)} images")
+    print(f"RMS reprojection error {calibration.rms:.3f} px (below ~0.5 px is good)")
+    print(f"fx {matrix[0, 0]:.1f}  fy {matrix[1, 1]:.1f}  cx {matrix[0, 2]:.1f}  cy {matrix[1, 2]:.1f}")
+    print("Distortion " + " ".join(f"{k:.5f}" for k in calibration.dist_coeffs))
+    print(f"Saved: {args.output}")
+
+    if args.check:
+        os.makedirs(args.check, exist_ok=True)
+        corrector = lens_correction.LensCorrector(calibration, args.alpha)
+        for i, image in enumerate(images):
+            h, w = image.shape[:2]
+            out_path = os.path.join(args.check, f"undistorted_{i:03d}.png")
+            cv2.imwrite(out_path, corrector.apply(image, (0, 0, w, h), (w, h)))
+        print(f"Undistorted copies written to {args.check}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Minimal HTTP replication target for testing the replication worker.
+
+Accepts PUT /<SN>/<file>, stores the body under OUTPUT_DIR and answers with the
+SHA-256 of what it wrote in the X-Checksum-SHA256 header, which is what
+replication.HttpTarget verifies. DELETE /<SN>/<file> removes a superseded
+replica (404 if it is not there). Point the station at it with
+"replication": {"enabled": true, "target": "http://127.0.0.1:8765"}.
+
+Usage:
+    python tools/replication_sink.py OUTPUT_DIR [PORT]
+"""
+import hashlib
+import os
+import sys
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(root):
+    root = os.path.abspath(root)
+
+    class SinkHandler(BaseHTTPRequestHandler):
+        def _dest(self):
+            """Absolute path for the request, or None (400 sent) if it leaves the output directory."""
+            rel = urllib.parse.unquote(self.path.lstrip("/"))
+            dest = os.path.abspath(os.path.join(root, rel))
+            if not dest.startswith(root + os.sep):
+                self.send_error(400, "path outside output directory")
+                return None
+            return dest
+
+        def do_PUT(self):
+            dest = self._dest()
+            if dest is None:
+                return
+            remaining = int(self.headers.get("Content-Length", 0))
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            digest = hashlib.sha256()
+            tmp = dest + ".part"
+            with open(tmp, "wb") as f:
+                while remaining > 0:
+                    chunk = self.rfile.read(min(remaining, 1024 * 1024))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    digest.update(chunk)
+                    remaining -= len(chunk)
+            if remaining:
+                os.remove(tmp)
+                self.send_error(400, "truncated upload")
+                return
+            os.replace(tmp, dest)
+            self.send_response(201)
+            self.send_header("X-Checksum-SHA256", digest.hexdigest())
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_DELETE(self):
+            dest = self._dest()
+            if dest is None:
+                return
+            try:
+                os.remove(dest)
+            except FileNotFoundError:
+                self.send_error(404, "no such replica")
+                return
+            self.send_response(204)
+            self.end_headers()
+
+    return SinkHandler
+
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return 1
+    port = int(argv[1]) if len(argv) > 1 else 8765
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(argv[0]))
+    print(f"Replication sink on http://127.0.0.1:{port} -> {os.path.abspath(argv[0])}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,322 @@
+"""Re-encode archived captures in parallel, verifying every file before replacing it.
+
+Walks the capture root (<root>/<SN>/SN_ORIENTATION_timestamp.png) and re-encodes
+each capture to the chosen format / compression level in a process pool. Every
+output is written to a temporary file, read back, decoded and compared with the
+original pixels (exact for lossless formats, --min-psnr for lossy ones) before
+it atomically replaces the original. The file keeps its name (apart from the
+extension), its modification time and its BrioCapture metadata (PNG text chunk,
+or a .json sidecar for other formats). Outputs that would not be smaller are
+left alone unless --force is given.
+
+SN folders are only touched where they follow the one-image-per-orientation
+rule; folders with several captures for an orientation are reported and
+skipped. Progress goes to a JSON-lines checkpoint, so an interrupted run
+continues where it stopped. The storage ledger, gallery thumbnails and the
+replication outbox are updated for every rewritten file (also when the run is
+interrupted; files whose update never got recorded are caught up on the next
+run), so run it with the capture app closed.
+
+Usage:
+    python tools/transcode_archive.py --format png --level 9
+    python tools/transcode_archive.py --format webp --workers 8
+    python tools/transcode_archive.py --format jpg --level 95 --min-psnr 42 --root D:/captures
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import capture_metadata  # noqa: E402
+import capture_storage  # noqa: E402
+from replication import ReplicationOutbox  # noqa: E402
+from settings import (BASE_DIR, REPLICATION_OUTBOX_PATH, STORAGE_LEDGER_PATH,  # noqa: E402
+                      THUMBNAIL_CACHE_DIR, load_settings)
+from storage_manager import StorageManager  # noqa: E402
+from thumbnails import ThumbnailCache  # noqa: E402
+
+CHECKPOINT_PATH = os.path.join(BASE_DIR, "transcode_checkpoint.jsonl")
+
+# name -> (extension, default level, lossless with the default level)
+FORMATS = {
+    "png": (".png", 9, True),
+    "webp": (".webp", 101, True),
+    "tiff": (".tiff", None, True),
+    "jpg": (".jpg", 95, False),
+}
+
+
+def encode_params(fmt, level):
+    """cv2.imencode parameters and whether the result is lossless."""
+    level = FORMATS[fmt][1] if level is None else level
+    if fmt == "png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(level)], True
+    if fmt == "webp":
+        # Quality above 100 selects lossless WebP
+        return [cv2.IMWRITE_WEBP_QUALITY, int(level)], int(level) > 100
+    if fmt == "tiff":
+        # LZW
+        return [cv2.IMWRITE_TIFF_COMPRESSION, 5], True
+    return [cv2.IMWRITE_JPEG_QUALITY, int(level)], False
+
+
+def target_signature(fmt, level):
+    return f"{fmt}:{FORMATS[fmt][1] if level is None else level}"
+
+
+def find_captures(root, ext):
+    """Yield (source path, target path) per capture; report folders that break the rules."""
+    skipped = []
+    for sn_dir in sorted(Path(root).iterdir()):
+        if not sn_dir.is_dir():
+            continue
+        groups = {}
+        for path in sn_dir.iterdir():
+            parsed = capture_storage.parse_capture_filename(path.name)
+            if parsed is None or parsed[0] != sn_dir.name:
+                continue
+            groups.setdefault(parsed[1], []).append(path)
+        for orientation, paths in sorted(groups.items()):
+            stems = {p.with_suffix("").name for p in paths}
+            if len(stems) > 1:
+                skipped.append(f"{sn_dir.name}: {len(paths)} {orientation} captures")
+                continue
+            # Same capture in two formats = a run interrupted between writing the new
+            # file and removing the old one: finish it from the original
+            sources = [p for p in paths if p.suffix.lower() != ext] or paths
+            yield str(sources[0]), str(sources[0].with_suffix(ext))
+    for message in skipped:
+        print(f"Skipped (one image per orientation rule): {message}")
+
+
+def _write_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp
+
+
+def transcode_one(task):
+    """Re-encode one capture (runs in a pool worker); returns a checkpoint record."""
+    source, target, params, lossless, min_psnr, force = task
+    record = {"source": source, "target": target, "status": "failed"}
+    start = time.perf_counter()
+    tmp = None
+    try:
+        st = os.stat(source)
+        original = cv2.imdecode(np.fromfile(source, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if original is None:
+            raise ValueError("could not decode original")
+        metadata = capture_metadata.read_metadata(source)
+        ext = os.path.splitext(target)[1].lower()
+        ok, encoded = cv2.imencode(ext, original, params)
+        if not ok:
+            raise ValueError(f"could not encode as {ext}")
+        data = encoded.tobytes()
+        if metadata is not None and ext == ".png":
+            data = capture_metadata.embed_png_text(data, metadata)
+        record["before"], record["after"] = st.st_size, len(data)
+        # A target already next to the source means an interrupted run: always finish it
+        finishing = target != source and os.path.exists(target)
+        if len(data) >= st.st_size and not (force or finishing):
+            record["status"] = "kept"
+            return record
+
+        # Verify what actually reached the disk before it replaces anything
+        tmp = _write_atomic(target, data)
+        decoded = cv2.imdecode(np.fromfile(tmp, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if decoded is None or decoded.shape != original.shape or decoded.dtype != original.dtype:
+            raise ValueError("output does not decode to the original image size")
+        if lossless:
+            if not np.array_equal(decoded, original):
+                raise ValueError("output pixels differ from the original")
+        else:
+            psnr = float(cv2.PSNR(decoded, original))
+            record["psnr"] = round(psnr, 2)
+            if psnr < min_psnr:
+                raise ValueError(f"PSNR {psnr:.1f} dB below {min_psnr} dB")
+
+        os.replace(tmp, target)
+        tmp = None
+        os.utime(target, (st.st_atime, st.st_mtime))
+        if metadata is not None and ext != ".png":
+            sidecar_tmp = _write_atomic(target + ".json", json.dumps(metadata, indent=2).encode("utf-8"))
+            os.replace(sidecar_tmp, target + ".json")
+        elif os.path.exists(target + ".json"):
+            # Metadata now lives in the PNG text chunk
+            os.remove(target + ".json")
+        if target != source:
+            os.remove(source)
+            if os.path.exists(source + ".json"):
+                os.remove(source + ".json")
+        record["status"] = "done"
+    except Exception as e:
+        record["error"] = str(e)
+    finally:
+        if tmp is not None:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        record["ms"] = round((time.perf_counter() - start) * 1000.0, 1)
+    return record
+
+
+def _init_worker():
+    # One OpenCV thread per process: the pool provides the parallelism
+    cv2.setNumThreads(1)
+
+
+def load_checkpoint(path, signature):
+    """(source paths already handled for this target format, done records not yet synced).
+
+    A "synced" record follows each done record once the station state (ledger,
+    thumbnails, outbox) has been updated for it; done records without one, of any
+    format, are returned so an interrupted run can catch up.
+    """
+    handled = set()
+    unsynced = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line
+                key = (record.get("source"), record.get("target"))
+                if record.get("status") == "synced":
+                    unsynced.pop(key, None)
+                    continue
+                if record.get("status") == "done":
+                    unsynced[key] = record
+                if record.get("signature") == signature and record.get("status") in ("done", "kept"):
+                    handled.add(record["source"])
+    except FileNotFoundError:
+        pass
+    return handled, list(unsynced.values())
+
+
+def update_station_state(root, records):
+    """Bring the storage ledger, gallery index and replication outbox up to date."""
+    done = [r for r in records if r["status"] == "done"]
+    if not done:
+        return
+    storage = StorageManager(root, STORAGE_LEDGER_PATH)
+    if storage.load():
+        for r in done:
+            storage.file_replaced(r["source"], r["target"], r["after"])
+            if os.path.exists(r["target"] + ".json"):
+                storage.file_written(r["target"] + ".json", os.path.getsize(r["target"] + ".json"))
+            if r["source"] != r["target"]:
+                storage.files_removed([r["source"] + ".json"])
+        storage.save()
+
+    renamed = [r for r in done if r["source"] != r["target"]]
+    if renamed:
+        thumbs = ThumbnailCache(root, THUMBNAIL_CACHE_DIR)
+        for r in renamed:
+            thumbs.rename(r["source"], r["target"])
+    if os.path.exists(REPLICATION_OUTBOX_PATH):
+        # The secondary copy has other bytes (and maybe the old name): queue the new file,
+        # and the removal of a renamed original, for the next app start
+        outbox = ReplicationOutbox(REPLICATION_OUTBOX_PATH)
+        outbox.load()
+        for r in done:
+            outbox.enqueue(r["target"], os.path.relpath(os.path.abspath(r["target"]), os.path.abspath(root)))
+            if r["source"] != r["target"]:
+                outbox.remove(os.path.relpath(os.path.abspath(r["source"]), os.path.abspath(root)))
+
+
+def sync_station_state(root, records, checkpoint):
+    """update_station_state() for done records, then mark them synced in the checkpoint."""
+    done = [r for r in records if r["status"] == "done"]
+    if not done:
+        return
+    update_station_state(root, done)
+    for r in done:
+        checkpoint.write(json.dumps({"status": "synced", "source": r["source"], "target": r["target"]}) + "\n")
+    checkpoint.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-encode archived captures in parallel with verification")
+    parser.add_argument("--root", default=None, help="capture root (default: from station settings)")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="png")
+    parser.add_argument("--level", type=int, default=None,
+                        help="PNG compression 0-9, WebP quality (101 = lossless) or JPEG quality")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--min-psnr", type=float, default=45.0, help="lowest PSNR accepted for lossy formats")
+    parser.add_argument("--force", action="store_true", help="replace files even if the output is not smaller")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be transcoded")
+    args = parser.parse_args(argv)
+
+    root = args.root or load_settings()["capture_root"]
+    if not os.path.isdir(root):
+        print(f"Capture root not found: {root}")
+        return 1
+    ext = FORMATS[args.format][0]
+    params, lossless = encode_params(args.format, args.level)
+    signature = target_signature(args.format, args.level)
+    handled, unsynced = load_checkpoint(args.checkpoint, signature)
+
+    tasks = [(source, target, params, lossless, args.min_psnr, args.force)
+             for source, target in find_captures(root, ext) if source not in handled]
+    print(f"{len(tasks)} capture(s) to transcode to {signature}"
+          + (f", {len(handled)} already done" if handled else "") + f" with {args.workers} worker(s)")
+    if args.dry_run:
+        for task in tasks:
+            print(f"  {task[0]} -> {task[1]}")
+        return 0
+
+    os.makedirs(os.path.dirname(args.checkpoint) or ".", exist_ok=True)
+    if unsynced:
+        # An earlier run stopped after rewriting these files but before updating the station state
+        print(f"Updating station state for {len(unsynced)} file(s) from an interrupted run")
+        with open(args.checkpoint, "a", encoding="utf-8") as checkpoint:
+            sync_station_state(root, unsynced, checkpoint)
+    if not tasks:
+        return 0
+
+    records = []
+    counts = {"done": 0, "kept": 0, "failed": 0}
+    before = after = 0
+    start = time.perf_counter()
+    with open(args.checkpoint, "a", encoding="utf-8") as checkpoint:
+        try:
+            with multiprocessing.Pool(max(1, args.workers), initializer=_init_worker) as pool:
+                for record in pool.imap_unordered(transcode_one, tasks):
+                    record["signature"] = signature
+                    checkpoint.write(json.dumps(record) + "\n")
+                    checkpoint.flush()
+                    records.append(record)
+                    counts[record["status"]] += 1
+                    if record["status"] == "done":
+                        before += record["before"]
+                        after += record["after"]
+                    elif record["status"] == "failed":
+                        print(f"Failed: {record['source']}: {record.get('error')}")
+                    n = len(records)
+                    if n % 50 == 0 or n == len(tasks):
+                        print(f"  {n}/{len(tasks)} ({n / (time.perf_counter() - start):.1f} files/s)")
+        finally:
+            # Also after Ctrl-C: the files written so far are already on disk
+            sync_station_state(root, records, checkpoint)
+    elapsed = time.perf_counter() - start
+    print(f"Done in {elapsed:.1f} s: {counts['done']} transcoded, {counts['kept']} kept (no gain), "
+          f"{counts['failed']} failed; {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""Upscale native-resolution ROI captures back to the full sensor frame size.
+
+Captures saved with `native_roi_capture` enabled hold only the zoomed crop; the
+zoom, pan and crop rectangle are recorded in the PNG. This script rebuilds the
+full-size view on demand and writes it to a separate output folder (never into
+the SN folders, whose retention rules only allow one TOP and one BOTTOM image).
+
+Usage:
+    python tools/upscale_roi.py OUTPUT_DIR CAPTURE.png [CAPTURE.png ...]
+"""
+import os
+import sys
+from pathlib import Path
+
+import cv2
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import capture_metadata  # noqa: E402
+
+
+def main(argv):
+    if len(argv) < 2:
+        print(__doc__)
+        return 1
+    out_dir = Path(argv[0])
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    for path in argv[1:]:
+        metadata = capture_metadata.read_metadata(path)
+        if not metadata or not metadata.get("native_roi"):
+            print(f"Skipped (not a native ROI capture): {path}")
+            continue
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            print(f"Could not read: {path}")
+            continue
+        full = capture_metadata.upscale_to_frame(image, metadata, cv2.INTER_CUBIC)
+        out_path = str(out_dir / os.path.basename(path))
+        capture_metadata.save_image(out_path, full, dict(metadata, native_roi=False, upscaled_from_roi=True))
+        print(f"Upscaled {image.shape[1]}x{image.shape[0]} -> {full.shape[1]}x{full.shape[0]}: {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))